@@ -103,7 +103,7 @@ require(["lib/models", "lib/tools", "knockout", "sammy", "lib/offline"], functio
             if (isMobile) {
                 // Mobile figure hotfix, adjusting URL
                 for (const fig of abstract.figures) {
-                    fig.URL = fig.URL + "mobile";
+                    fig.URL = fig.URL.replace("/image", "/imagemobile");
                 }
             }
             self.selectedAbstract(abstract);
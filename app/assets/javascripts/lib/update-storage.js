@@ -31,33 +31,69 @@ function onConferences(confs) {
     if (confs) {
         confs.forEach(function (conf) {
             localStorage.setItem(conf.uuid, JSON.stringify(conf));
-            // TODO: fix exception on emtpy abstracts
-            $.getJSON(conf.abstracts, function (confUuid) {
-                return function(data) {
-                    onAbstracts(confUuid, data);
-                };
-            }(conf.uuid));
-            $.getJSON(conf.geo, function (confUuid) {
-                return function(data) {
-                    onLocation(confUuid, data);
-                };
-            }(conf.uuid));
-            $.getJSON(conf.schedule, function (confUuid) {
-                return function(data) {
-                    onSchedule(confUuid, data);
-                };
-            }(conf.uuid));
-            $.getJSON(conf.info, function (confUuid) {
-                return function(data) {
-                    onInfo(confUuid, data);
-                };
-            }(conf.uuid));
+            syncConference(conf);
         });
     }
     // Reset the update timer.
     localStorage.setItem(_updateKey, (new Date()).getTime().toString());
 }
 
+// Fetch only the changes of a conference since the last synchronization.
+// Without a stored cursor all published abstracts are fetched.
+function syncConference(conf) {
+    var cursor = localStorage.getItem(conf.uuid + "cursor");
+    var url = "/api/conferences/" + conf.uuid + "/changes";
+    if (cursor !== null) {
+        url += "?since=" + cursor;
+    }
+
+    $.getJSON(url, function (changes) {
+        onChanges(conf.uuid, changes, cursor === null);
+
+        if (changes.conference) {
+            $.getJSON(conf.geo, function (data) {
+                onLocation(conf.uuid, data);
+            });
+            $.getJSON(conf.schedule, function (data) {
+                onSchedule(conf.uuid, data);
+            });
+            $.getJSON(conf.info, function (data) {
+                onInfo(conf.uuid, data);
+            });
+        }
+    });
+}
+
+// Merge the changed abstracts into the stored abstracts and remove deleted ones.
+// A full synchronization replaces the stored abstracts.
+function onChanges(confUuid, changes, full) {
+    var stored = full ? [] : JSON.parse(localStorage.getItem(confUuid + "abstracts")) || [];
+    var changed = {};
+    var removed = {};
+
+    changes.abstracts.forEach(function (abstract) {
+        changed[abstract.uuid] = abstract;
+    });
+    changes.deleted.abstracts.forEach(function (uuid) {
+        removed[uuid] = true;
+        localStorage.removeItem(uuid);
+    });
+
+    var abs = stored.filter(function (abstract) {
+        return !changed[abstract.uuid] && !removed[abstract.uuid];
+    }).concat(changes.abstracts);
+
+    abs.sort(function (a, b) {
+        if (a.sortId !== b.sortId) {
+            return a.sortId - b.sortId;
+        }
+        return a.title < b.title ? -1 : (a.title > b.title ? 1 : 0);
+    });
+
+    onAbstracts(confUuid, abs);
+    localStorage.setItem(confUuid + "cursor", changes.cursor.toString());
+}
+
 // Write all abstracts to the local storage.
 function onAbstracts(confUuid, abs) {
     localStorage.setItem(confUuid+"abstracts", JSON.stringify(abs));
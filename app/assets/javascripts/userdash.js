@@ -45,59 +45,49 @@ require(["lib/models", "lib/tools", "knockout", "sammy"], function (models, tool
         };
 
         self.ensureDataAndThen = function (doAfter) {
-            var confURL = "/api/user/self/conferences";
-            $.getJSON(confURL, onConferenceData).fail(self.ioFailHandler);
+            var dashURL = "/api/user/self/dashboard";
+            $.getJSON(dashURL, onDashboardData).fail(self.ioFailHandler);
 
-            // Conference data
-            function onConferenceData(confObj) {
-                if ((typeof confObj === "string" || confObj instanceof String) && confObj.length == 0) {
+            // Conferences with the abstract summaries of the user
+            function onDashboardData(dashObj) {
+                if (dashObj.length === 0) {
                     self.setInfo("info", "You have no own abstracts created yet.");
                     return;
                 }
-                var confs = models.Conference.fromArray(confObj);
-                if (confs !== null) {
-                    confs.forEach(function (current) {
-                        current.abstracts = ko.observableArray(null);
-                        current.localConferenceLink = ko.computed(function() {
-                            return "/conference/" + current.short + "/abstracts";
-                        });
-                    });
-                }
-
-                self.conferences(confs);
 
-                if (confs !== null) {
-                    confs.forEach(function (current) {
-                        var absUrl = "/api/user/self/conferences/" + current.uuid + "/abstracts";
-                        $.getJSON(absUrl, onAbstractData(current)).fail(self.ioFailHandler);
+                var confs = dashObj.map(function (confObj) {
+                    var current = models.Conference.fromObject(confObj);
+                    current.localConferenceLink = ko.computed(function() {
+                        return "/conference/" + current.short + "/abstracts";
                     });
-                }
+                    current.abstracts = ko.observableArray(makeAbstracts(current, confObj.abstracts));
+                    return current;
+                });
 
+                self.conferences(confs);
                 doAfter();
             }
 
-            function onAbstractData(currentConf) {
-                return function (abstractList) {
-                    var absList = models.Abstract.fromArray(abstractList);
-
-                    absList.forEach(function (abstr) {
-                        abstr.viewEditCtx = ko.computed(function () {
-                            var confIsOpen = currentConf.isOpen;
-                            var canEdit = abstr.state === "InRevision" ||
-                                (confIsOpen && (abstr.state === "InPreparation" ||
-                                abstr.state === "Submitted" ||
-                                abstr.state === "Withdrawn"));
-
-                            return {
-                                link: canEdit ? "/myabstracts/" + abstr.uuid + "/edit" : "/abstracts/" + abstr.uuid,
-                                label: canEdit ? "Edit" : "View",
-                                btn: canEdit ? "btn-danger" : "btn-primary"
-                            };
-                        });
+            function makeAbstracts(currentConf, abstractList) {
+                var absList = models.Abstract.fromArray(abstractList);
+
+                absList.forEach(function (abstr) {
+                    abstr.viewEditCtx = ko.computed(function () {
+                        var confIsOpen = currentConf.isOpen;
+                        var canEdit = abstr.state === "InRevision" ||
+                            (confIsOpen && (abstr.state === "InPreparation" ||
+                            abstr.state === "Submitted" ||
+                            abstr.state === "Withdrawn"));
+
+                        return {
+                            link: canEdit ? "/myabstracts/" + abstr.uuid + "/edit" : "/abstracts/" + abstr.uuid,
+                            label: canEdit ? "Edit" : "View",
+                            btn: canEdit ? "btn-danger" : "btn-primary"
+                        };
                     });
+                });
 
-                    currentConf.abstracts(absList);
-                };
+                return absList;
             }
         };
 
@@ -7,6 +7,7 @@ import com.mohiva.play.silhouette.contrib.services.CachedCookieAuthenticator
 import com.mohiva.play.silhouette.core.exceptions.AccessDeniedException
 import com.mohiva.play.silhouette.core.{Environment, SecuredSettings}
 import models.Login
+import plugins.QueryStatsFilter
 import play.api._
 import play.api.i18n.Lang
 import play.api.libs.json.{JsObject, JsError, JsResultException, Json}
@@ -14,7 +15,7 @@ import play.api.mvc.Results._
 import play.api.mvc._
 import scala.concurrent.Future
 
-object Global extends GlobalSettings with SecuredSettings {
+object Global extends WithFilters(QueryStatsFilter) with SecuredSettings {
 
   import play.api.Play.current
   implicit lazy val globalEnv = new GlobalEnvironment()
@@ -1,6 +1,5 @@
 package controllers
 
-import java.util.UUID
 import javax.persistence.NoResultException
 
 import com.mohiva.play.silhouette.contrib.services.CachedCookieAuthenticator
@@ -123,13 +122,8 @@ class Accounts(implicit val env: GlobalEnvironment)
         try {
           val account = accountService.getByMail(email)
 
-          val newpass = UUID.randomUUID.toString.substring(0, 8)
-          val loginInfo = LoginInfo(env.credentialsProvider.id, account.mail)
-          val pwInfo = env.pwHasher.hash(newpass)
-
-          mailer.sendPasswordReset(account, newpass, routes.Accounts.logIn().absoluteURL())
-
-          Await.result(env.authInfoService.save(loginInfo, pwInfo), 5 seconds)
+          // the new password is set when the mail is sent
+          mailer.sendPasswordReset(account)
 
           Redirect(routes.Accounts.logIn()).flashing("success" ->
             """Password was reset and sent to you by email.
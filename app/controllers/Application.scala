@@ -5,16 +5,21 @@ import com.mohiva.play.silhouette.core.{Silhouette, Environment}
 import play.api._
 import play.api.mvc._
 import models._
-import service.{AbstractService, ConferenceService}
+import service.{AbstractService, ConferenceService, OfflineContent}
+import service.util.{CachedBody, ConferenceCache}
 import java.net._
+import org.apache.commons.codec.digest.DigestUtils
 import org.joda.time.DateTime
-import scala.collection.JavaConverters._
+import play.api.libs.json.{JsValue, Json}
+import utils.DefaultRoutesResolver._
+import utils.serializer.AbstractFormat
 
 class Application(implicit val env: Environment[Login, CachedCookieAuthenticator])
   extends Silhouette[Login, CachedCookieAuthenticator] {
 
   val abstractService = AbstractService()
   val conferenceService = ConferenceService()
+  val absFormat = new AbstractFormat()
   
   def index = UserAwareAction { implicit request =>
     Redirect(routes.Application.conferences()).flashing(request.flash)
@@ -56,7 +61,17 @@ class Application(implicit val env: Environment[Login, CachedCookieAuthenticator
   def abstractsPublic(confId: String) = UserAwareAction { implicit request =>
     val conference = conferenceService.get(confId)
 
-    Ok(views.html.abstractlist(request.identity.map{ _.account }, conference))
+    if (request.identity.isEmpty && conference.isPublished && Application.prerender) {
+      cachedPage(Application.pages.getOrElseUpdate("list:" + confId) {
+        val documents = abstractService.listDocuments(conference)
+        val html = views.html.components.prerenderedlist(documents.map(doc => Json.parse(doc.json)))
+
+        (conference.uuid, CachedBody(views.html.abstractlist(None, conference, Some(html)).body,
+          DigestUtils.md5Hex(conference.eTag + conference.abstractsETag("html"))))
+      })
+    } else {
+      Ok(views.html.abstractlist(request.identity.map{ _.account }, conference))
+    }
   }
 
   def locations(confId: String) = UserAwareAction { implicit request =>
@@ -163,136 +178,240 @@ class Application(implicit val env: Environment[Login, CachedCookieAuthenticator
   }
 
   def viewAbstract(id: String) = UserAwareAction { implicit request =>
-    val abstr = request.identity match {
-      case Some(uid) => abstractService.getOwn(id, uid.account)
-      case _         => abstractService.get(id)
+    request.identity match {
+      case Some(uid) =>
+        val abstr = abstractService.getOwn(id, uid.account)
+        Ok(views.html.abstractviewer(Some(uid.account), abstr.conference, abstr))
+      case _ if Application.prerender =>
+        cachedPage(Application.pages.getOrElseUpdate("abstract:" + id) {
+          val (abstr, json, doc) = publishedAbstract(id)
+          val html = views.html.components.prerenderedabstract(json)
+
+          (abstr.conference.uuid, CachedBody(views.html.abstractviewer(None, abstr.conference, abstr, Some(html)).body,
+            DigestUtils.md5Hex(abstr.conference.eTag + doc.eTag)))
+        })
+      case _ =>
+        val (abstr, _, _) = publishedAbstract(id)
+        Ok(views.html.abstractviewer(None, abstr.conference, abstr))
     }
+  }
 
-    Ok(views.html.abstractviewer(request.identity.map{ _.account }, abstr.conference, abstr))
+  /**
+   * Get a published abstract from its read model, together with its conference.
+   */
+  private def publishedAbstract(id: String) : (Abstract, JsValue, AbstractDocument) = {
+    val doc = abstractService.getDocument(id)
+    val json = Json.parse(doc.json)
+    val abstr = absFormat.reads(json).get
+    abstr.conference = conferenceService.get(doc.conference)
+
+    (abstr, json, doc)
   }
 
-  def createAppCacheManifest() = UserAwareAction { implicit request =>
-    var dynamicViews: String = "";
-    var conf = conferenceService.list().head
-    dynamicViews += s"""
-                       |/conference/${conf.short}
-                       |/conference/${conf.short}/schedule
-                       |/conference/${conf.short}/submission
-                       |/conference/${conf.short}/floorplans
-                       |/conference/${conf.short}/locations
-                       |/conference/${conf.short}/abstracts""".stripMargin
-    for (ban: Banner <- conf.banner.asScala) {
-      dynamicViews +=
-          s"""
-             |/api/banner/${ban.uuid}/imagemobile""".stripMargin
+  /**
+   * Serve a page that was rendered for anonymous users. The page may be stored by
+   * shared caches, but only for requests without cookies, since the pages of users
+   * that are logged in differ.
+   */
+  private def cachedPage[A](cached: CachedBody)(implicit request: Request[A]) : Result = {
+    val eTag = "\"" + cached.eTag + "\""
+    val headers = Seq(
+      ETAG -> eTag,
+      CACHE_CONTROL -> s"public, max-age=${Application.pageMaxAge}",
+      VARY -> "Cookie"
+    )
+
+    if (request.headers.get(IF_NONE_MATCH).exists(_.split(",").map(_.trim).contains(eTag))) {
+      NotModified.withHeaders(headers: _*)
+    } else {
+      Ok(cached.body).as(HTML).withHeaders(headers: _*)
     }
-    for (abs: Abstract <- conf.abstracts.asScala) {
-      dynamicViews +=
-        s"""
-           |/abstracts/${abs.uuid}""".stripMargin
-      for (fig: Figure <- abs.figures.asScala) {
-        dynamicViews +=
-          s"""
-             |/api/figures/${fig.uuid}/imagemobile""".stripMargin
+  }
+
+  /**
+   * The views and images of the latest conference that are cached for offline use,
+   * the same list is used by the application cache manifest and the service worker.
+   * Only published abstracts are listed, since the list is public.
+   */
+  private def offlineResources(content: Option[OfflineContent]) : Seq[String] = {
+    content.map { c =>
+      Seq(
+        s"/conference/${c.short}",
+        s"/conference/${c.short}/schedule",
+        s"/conference/${c.short}/submission",
+        s"/conference/${c.short}/floorplans",
+        s"/conference/${c.short}/locations",
+        s"/conference/${c.short}/abstracts"
+      ) ++ c.images ++ c.banners.map(ban => s"/api/banner/$ban/imagemobile") ++ c.abstracts.flatMap { case (abs, figures) =>
+        s"/abstracts/$abs" +: figures.map(fig => s"/api/figures/$fig/imagemobile")
       }
+    }.getOrElse(Nil)
+  }
+
+  /**
+   * Get a cached offline document or render it from the offline content of the
+   * latest conference. The document is rendered again after the abstracts,
+   * figures or banners of the conference changed or another conference became
+   * the latest one.
+   */
+  private def offlineDocument(kind: String)(render: Seq[String] => String) : CachedBody = {
+    val latest = conferenceService.latestId
+
+    ConferenceService.offlineResources.getOrElseUpdate(kind + ":" + latest.getOrElse("")) {
+      val body = render(offlineResources(latest.map(conferenceService.listOfflineContent)))
+      (latest.getOrElse(""), CachedBody(body, DigestUtils.md5Hex(body)))
+    }
+  }
+
+  private def cachedResult[A](cached: CachedBody, contentType: String)(implicit request: Request[A]) = {
+    if (request.headers.get("If-None-Match").contains(cached.eTag)) {
+      NotModified
+    } else {
+      Ok(cached.body).as(contentType).withHeaders(ETAG -> cached.eTag)
     }
+  }
 
-    Ok(
-      s"""CACHE MANIFEST
-         |# v1.0.2
-         |# Views
-         |/conferences
-         |/contact
-         |/about
-         |/impressum
-         |/datenschutz
-         |# Assets
-         |/assets/manifest.json
-         |/assets/lib/momentjs/moment.js
-         |/assets/lib/bootstrap/js/bootstrap.min.js
-         |/assets/lib/bootstrap/js/bootstrap.js
-         |/assets/stylesheets/g-node-bootstrap.play.css
-         |/assets/lib/jquery/jquery.js
-         |/assets/lib/jquery/jquery.min.js
-         |/assets/lib/jquery-ui/jquery-ui.min.css
-         |/assets/lib/jquery-ui/jquery-ui.js
-         |/assets/stylesheets/layout.css
-         |/assets/javascripts/require.js
-         |/assets/lib/requirejs/require.js
-         |/assets/lib/sammy/sammy.js
-         |/assets/images/favicon.png
-         |/assets/images/bccn.png
-         |/assets/images/gnode_logo.png
-         |/assets/fonts/glyphicons-halflings-regular.eot
-         |/assets/fonts/glyphicons-halflings-regular.svg
-         |/assets/fonts/glyphicons-halflings-regular.ttf
-         |/assets/fonts/glyphicons-halflings-regular.woff
-         |/assets/javascripts/knockout-sortable.min.js
-         |# leaflet
-         |/assets/javascripts/lib/leaflet/leaflet.css
-         |/assets/javascripts/lib/leaflet/leaflet.js
-         |/assets/javascripts/lib/leaflet/leaflet-src.js
-         |/assets/javascripts/lib/leaflet/images/layers.png
-         |/assets/javascripts/lib/leaflet/images/layers-2x.png
-         |/assets/javascripts/lib/leaflet/images/marker-icon.png
-         |/assets/javascripts/lib/leaflet/images/marker-icon-2x.png
-         |/assets/javascripts/lib/leaflet/images/marker-shadow.png
-         |# scheduler
-         |/assets/javascripts/lib/scheduler/dhtmlxscheduler.css
-         |/assets/javascripts/lib/scheduler/dhtmlxscheduler.js
-         |/assets/javascripts/lib/scheduler/ext/dhtmlxscheduler_readonly.js
-         |# libs
-         |/assets/javascripts/lib/accessors.js
-         |/assets/javascripts/lib/astate.js
-         |/assets/javascripts/lib/models.js
-         |/assets/javascripts/lib/msg.js
-         |/assets/javascripts/lib/multi.js
-         |/assets/javascripts/lib/offline.js
-         |/assets/javascripts/lib/owned.js
-         |/assets/javascripts/lib/tools.js
-         |/assets/javascripts/lib/update-storage.js
-         |/assets/javascripts/lib/validate.js
-         |# View Models
-         |/assets/javascripts/abstract-list.js
-         |/assets/javascripts/abstract-viewer.js
-         |/assets/javascripts/abstract-favourite.js
-         |/assets/javascripts/browser.js
-         |/assets/javascripts/conference-schedule.js
-         |/assets/javascripts/config.js
-         |/assets/javascripts/editor.js
-         |/assets/javascripts/locations.js
-         |/assets/javascripts/main.js
-         |/assets/javascripts/userdash.js
-         |
-         |https://cdnjs.cloudflare.com/ajax/libs/jquery-ui-timepicker-addon/1.6.1/jquery-ui-timepicker-addon.min.js
-         |https://cdnjs.cloudflare.com/ajax/libs/knockout/3.0.0/knockout-debug.js
-         |https://cdnjs.cloudflare.com/ajax/libs/jquery-ui-timepicker-addon/1.6.1/jquery-ui-timepicker-addon.min.css
-         |https://fonts.googleapis.com/css?family=EB+Garamond|Open+Sans
-         |https://cdnjs.cloudflare.com/ajax/libs/mathjax/2.7.7/MathJax.js?delayStartupUntil=configured
-         |https://cdnjs.cloudflare.com/ajax/libs/mathjax/2.7.7/extensions/MathMenu.js
-         |
-         |# Styles
-         |/assets/stylesheets/_g-node-bootstrap.less
-         |/assets/stylesheets/g-node-bootstrap.play.less
-         |/assets/stylesheets/layout.less
-         |/assets/stylesheets/Readme.md
-         |/assets/stylesheets/custom/_classes.less
-         |/assets/stylesheets/custom/_classes_conference_scheduler.less
-         |/assets/stylesheets/custom/_colors.less
-         |/assets/stylesheets/custom/_font.less
-         |/assets/stylesheets/custom/bootstrap/_custom-colors.less
-         |/assets/stylesheets/custom/bootstrap/_custom-elements.less
-         |/assets/stylesheets/custom/bootstrap/_custom-fonts.less
-         |/assets/stylesheets/custom/bootstrap/_custom-vars.less
-         |
-         |# Dynamic Views
-         |${dynamicViews}
-         |
-         |NETWORK:
-         |*
-         |http:/*
-         |https:/*
-        """.stripMargin).as("text/cache-manifest")
+  def createAppCacheManifest() = UserAwareAction { implicit request =>
+    val manifest = offlineDocument("manifest") { resources =>
+      val builder = new StringBuilder(Application.manifestHeader)
+      builder.append("# Dynamic Views\n")
+      resources.foreach(builder.append(_).append('\n'))
+      builder.append(Application.manifestFooter)
+      builder.toString()
+    }
+
+    cachedResult(manifest, "text/cache-manifest")
   }
 
+  /**
+   * The dynamic resources the service worker caches for offline use.
+   *
+   * @return A JSON array with the paths of the resources.
+   */
+  def listOfflineResources() = UserAwareAction { implicit request =>
+    val resources = offlineDocument("resources") { resources =>
+      Json.stringify(Json.toJson(resources))
+    }
+
+    cachedResult(resources, JSON)
+  }
+
+}
+
+object Application {
+
+  /**
+   * Whether the public abstract list and viewer are rendered on the server
+   * for anonymous users, configured by "pages.prerender".
+   */
+  def prerender = Play.current.configuration.getBoolean("pages.prerender").getOrElse(false)
+
+  /**
+   * How long shared caches may keep pre-rendered pages, in seconds.
+   */
+  def pageMaxAge = Play.current.configuration.getInt("pages.maxAge").getOrElse(60)
+
+  /**
+   * Pre-rendered pages by page and id.
+   */
+  val pages = ConferenceCache[CachedBody]()
+
+  val manifestHeader =
+    """CACHE MANIFEST
+      |# v1.0.2
+      |# Views
+      |/conferences
+      |/contact
+      |/about
+      |/impressum
+      |/datenschutz
+      |# Assets
+      |/assets/manifest.json
+      |/assets/lib/momentjs/moment.js
+      |/assets/lib/bootstrap/js/bootstrap.min.js
+      |/assets/lib/bootstrap/js/bootstrap.js
+      |/assets/stylesheets/g-node-bootstrap.play.css
+      |/assets/lib/jquery/jquery.js
+      |/assets/lib/jquery/jquery.min.js
+      |/assets/lib/jquery-ui/jquery-ui.min.css
+      |/assets/lib/jquery-ui/jquery-ui.js
+      |/assets/stylesheets/layout.css
+      |/assets/javascripts/require.js
+      |/assets/lib/requirejs/require.js
+      |/assets/lib/sammy/sammy.js
+      |/assets/images/favicon.png
+      |/assets/images/bccn.png
+      |/assets/images/gnode_logo.png
+      |/assets/fonts/glyphicons-halflings-regular.eot
+      |/assets/fonts/glyphicons-halflings-regular.svg
+      |/assets/fonts/glyphicons-halflings-regular.ttf
+      |/assets/fonts/glyphicons-halflings-regular.woff
+      |/assets/javascripts/knockout-sortable.min.js
+      |# leaflet
+      |/assets/javascripts/lib/leaflet/leaflet.css
+      |/assets/javascripts/lib/leaflet/leaflet.js
+      |/assets/javascripts/lib/leaflet/leaflet-src.js
+      |/assets/javascripts/lib/leaflet/images/layers.png
+      |/assets/javascripts/lib/leaflet/images/layers-2x.png
+      |/assets/javascripts/lib/leaflet/images/marker-icon.png
+      |/assets/javascripts/lib/leaflet/images/marker-icon-2x.png
+      |/assets/javascripts/lib/leaflet/images/marker-shadow.png
+      |# scheduler
+      |/assets/javascripts/lib/scheduler/dhtmlxscheduler.css
+      |/assets/javascripts/lib/scheduler/dhtmlxscheduler.js
+      |/assets/javascripts/lib/scheduler/ext/dhtmlxscheduler_readonly.js
+      |# libs
+      |/assets/javascripts/lib/accessors.js
+      |/assets/javascripts/lib/astate.js
+      |/assets/javascripts/lib/models.js
+      |/assets/javascripts/lib/msg.js
+      |/assets/javascripts/lib/multi.js
+      |/assets/javascripts/lib/offline.js
+      |/assets/javascripts/lib/owned.js
+      |/assets/javascripts/lib/tools.js
+      |/assets/javascripts/lib/update-storage.js
+      |/assets/javascripts/lib/validate.js
+      |# View Models
+      |/assets/javascripts/abstract-list.js
+      |/assets/javascripts/abstract-viewer.js
+      |/assets/javascripts/abstract-favourite.js
+      |/assets/javascripts/browser.js
+      |/assets/javascripts/conference-schedule.js
+      |/assets/javascripts/config.js
+      |/assets/javascripts/editor.js
+      |/assets/javascripts/locations.js
+      |/assets/javascripts/main.js
+      |/assets/javascripts/userdash.js
+      |
+      |https://cdnjs.cloudflare.com/ajax/libs/jquery-ui-timepicker-addon/1.6.1/jquery-ui-timepicker-addon.min.js
+      |https://cdnjs.cloudflare.com/ajax/libs/knockout/3.0.0/knockout-debug.js
+      |https://cdnjs.cloudflare.com/ajax/libs/jquery-ui-timepicker-addon/1.6.1/jquery-ui-timepicker-addon.min.css
+      |https://fonts.googleapis.com/css?family=EB+Garamond|Open+Sans
+      |https://cdnjs.cloudflare.com/ajax/libs/mathjax/2.7.7/MathJax.js?delayStartupUntil=configured
+      |https://cdnjs.cloudflare.com/ajax/libs/mathjax/2.7.7/extensions/MathMenu.js
+      |
+      |# Styles
+      |/assets/stylesheets/_g-node-bootstrap.less
+      |/assets/stylesheets/g-node-bootstrap.play.less
+      |/assets/stylesheets/layout.less
+      |/assets/stylesheets/Readme.md
+      |/assets/stylesheets/custom/_classes.less
+      |/assets/stylesheets/custom/_classes_conference_scheduler.less
+      |/assets/stylesheets/custom/_colors.less
+      |/assets/stylesheets/custom/_font.less
+      |/assets/stylesheets/custom/bootstrap/_custom-colors.less
+      |/assets/stylesheets/custom/bootstrap/_custom-elements.less
+      |/assets/stylesheets/custom/bootstrap/_custom-fonts.less
+      |/assets/stylesheets/custom/bootstrap/_custom-vars.less
+      |
+      |""".stripMargin
+
+  val manifestFooter =
+    """
+      |NETWORK:
+      |*
+      |http:/*
+      |https:/*
+      |""".stripMargin
+
 }
@@ -1,19 +1,31 @@
 package controllers.api
 
+import java.net.URLEncoder
+import javax.persistence.EntityNotFoundException
+
 import org.apache.commons.codec.digest.DigestUtils
+import org.joda.time.{DateTime, DateTimeZone}
 import org.joda.time.format.DateTimeFormat
 import play.api._
+import play.api.libs.concurrent.Execution.Implicits.defaultContext
 import play.api.libs.functional.syntax._
+import play.api.libs.iteratee.{Enumeratee, Enumerator}
 import play.api.libs.json.{JsArray, JsObject, Json, _}
 import play.api.mvc._
 import service._
+import service.util.CachedBody
+import utils.BlockingIO
+import utils.BlockingIO.jdbc
 import utils.DefaultRoutesResolver._
-import utils.serializer.{AbstractFormat, AccountFormat, StateLogWrites}
+import utils.serializer.{AbstractFormat, AbstractProjectionWrites, AccountFormat, ConferenceFormat, StateLogWrites}
 import models._
 
 import com.mohiva.play.silhouette.contrib.services.CachedCookieAuthenticator
 import com.mohiva.play.silhouette.core.{Silhouette, Environment}
 
+import scala.concurrent.Future
+import scala.util.{Failure, Success, Try}
+
 /**
  * Abstracts controller.
  * Manages HTTP request logic for abstracts.
@@ -23,6 +35,7 @@ extends Silhouette[Login, CachedCookieAuthenticator] {
 
   implicit val absFormat = new AbstractFormat()
   val accountFormat = new AccountFormat()
+  val confFormat = new ConferenceFormat()
   val abstractService = AbstractService()
   val conferenceService = ConferenceService()
 
@@ -34,27 +47,37 @@ extends Silhouette[Login, CachedCookieAuthenticator] {
    *
    * @return new abstract in JSON / Redirect to the abstract page
    */
-  def create(id: String) = SecuredAction(parse.json) { implicit request =>
+  def create(id: String) = SecuredAction.async(parse.json) { implicit request =>
+    jdbc {
+      val abs = request.body.as[Abstract]
+      val conference = conferenceService.get(id)
+
+      if(!conference.isOpen &&
+        !(request.identity.account.isAdmin || conference.isOwner(request.identity.account))) {
+        throw new IllegalAccessException("Conference is closed!")
+      }
 
-    val abs = request.body.as[Abstract]
-    val conference = conferenceService.get(id)
+      val newAbs = abstractService.create(abs, conference, request.identity.account)
 
-    if(!conference.isOpen &&
-      !(request.identity.account.isAdmin || conference.isOwner(request.identity.account))) {
-      throw new IllegalAccessException("Conference is closed!")
+      Created(Json.toJson(newAbs)).withHeaders(ETAG -> newAbs.eTag)
     }
+  }
 
-    val newAbs = abstractService.create(abs, conference, request.identity.account)
+  def collectionETag(abstracts: Seq[Abstract]) : String = {
+    combineETags(abstracts.map(_.eTag))
+  }
 
-    Created(Json.toJson(newAbs)).withHeaders(ETAG -> newAbs.eTag)
+  def combineETags(eTags: Seq[String]) : String = {
+    if (eTags.isEmpty) {
+      DigestUtils.md5Hex("empty")
+    } else {
+      eTags.reduce((a, b) => DigestUtils.md5Hex(a + b))
+    }
   }
 
   def resultWithETag[A](abstracts: Seq[Abstract])(implicit request: Request[A]) = {
     val theirs = request.headers.get("If-None-Match")
-    var eTag = DigestUtils.md5Hex("empty")
-    if (!abstracts.isEmpty) {
-      eTag = abstracts.map(_.eTag).reduce((a, b) => DigestUtils.md5Hex(a + b))
-    }
+    val eTag = collectionETag(abstracts)
 
     if (theirs.contains(eTag)) {
       NotModified
@@ -63,44 +86,273 @@ extends Silhouette[Login, CachedCookieAuthenticator] {
     }
   }
 
+  /**
+   * Create a chunked result with a JSON array of abstracts that are loaded
+   * page by page while the response is written.
+   */
+  def streamAbstracts(load: Option[PageKey] => AbstractPage) = {
+    streamPages[PageKey] { after =>
+      val page = load(after)
+      (page.abstracts.map(abs => Json.stringify(absFormat.writes(abs))), page.next)
+    }
+  }
+
+  /**
+   * Create a chunked result with a JSON array that is loaded page by page
+   * while the response is written. Pages are loaded on the jdbc executor
+   * one after another and each page is written as one chunk, so only one
+   * page is held in memory regardless of the length of the list.
+   *
+   * @param load Load the page after a key (None for the first page) and
+   *             return its serialized elements and the key of the next page.
+   */
+  def streamPages[K](load: Option[K] => (Seq[String], Option[K])) = {
+    // the key of the next page and whether no element was written yet, None after the last page
+    val pages = Enumerator.unfoldM[Option[(Option[K], Boolean)], String](Some((None, true))) {
+      case None => Future.successful(None)
+      case Some((after, first)) => BlockingIO.later(BlockingIO.jdbcExecutor) {
+        val (elements, next) = load(after)
+        val chunk = elements.zipWithIndex.map { case (json, i) =>
+          (if (first && i == 0) "" else ",") + json
+        }.mkString
+
+        Some((next.map(key => (Some(key), first && elements.isEmpty)), chunk))
+      }
+    }
+
+    // an empty chunk would end the response
+    val chunks = pages &> Enumeratee.filter[String](_.nonEmpty)
+
+    Ok.chunked(Enumerator("[") >>> chunks >>> Enumerator("]")).as(JSON)
+  }
+
+  /**
+   * Parse the pagination parameters of a list request.
+   *
+   * @return None if no pagination was requested, the page key,
+   *         limit and fields otherwise.
+   */
+  def pageParams(after: Option[String], limit: Option[Int],
+                 fields: Option[String]) : Option[(Option[PageKey], Int, Set[String])] = {
+    if (after.isEmpty && limit.isEmpty && fields.isEmpty) {
+      None
+    } else {
+      Some((after.map(PageKey.parse),
+        limit.getOrElse(AbstractService.defaultPageSize),
+        fields.map(_.split(",").map(_.trim).filter(_.nonEmpty).toSet).getOrElse(AbstractService.pageFields)))
+    }
+  }
+
+  /**
+   * A stable representation of the pagination parameters, e.g. for an ETag.
+   * The fields are sorted, since the iteration order of a set is not defined.
+   */
+  def pageVariant(params: Option[(Option[PageKey], Int, Set[String])]) : String = {
+    params.map { case (key, size, selected) =>
+      key.map(_.toString).getOrElse("") + ";" + size + ";" + selected.toSeq.sorted.mkString(",")
+    }.getOrElse("")
+  }
+
+  /**
+   * Create a result for a page of abstracts. If there is a next page, its
+   * URL is provided in the Link header.
+   */
+  def pageResult[A](page: AbstractPage, limit: Int, fields: Set[String])(implicit request: Request[A]) = {
+    val writes = new AbstractProjectionWrites(fields)
+    val result = Ok(JsArray(page.abstracts.map(writes.writes)))
+
+    page.next match {
+      case Some(key) =>
+        val params = Seq("after" -> key.toString, "limit" -> limit.toString) ++
+          request.getQueryString("fields").map("fields" -> _)
+        val query = params.map { case (k, v) => k + "=" + URLEncoder.encode(v, "UTF-8") }.mkString("&")
+        result.withHeaders("Link" -> s"""<${request.path}?$query>; rel="next"""")
+      case None => result
+    }
+  }
+
   /**
    * List all published abstracts for a given conference.
+   * The serialized list is cached until the conference or one of
+   * its abstracts changes. The ETag is derived from the abstracts version
+   * of the conference, so a matching If-None-Match is answered without
+   * loading any abstracts. With stream a list that is not cached is
+   * written as a chunked response instead of being cached.
+   * Cached lists are served right away, only lists that have to be
+   * loaded are queued on the jdbc executor.
    *
    * @return All abstracts publicly available.
    */
-  def listByConference(id: String) = UserAwareAction { implicit request =>
+  def listByConference(id: String, stream: Boolean) = UserAwareAction.async { implicit request =>
+    val theirs = request.headers.get("If-None-Match")
+
+    ConferenceService.uuids.get(id).flatMap(AbstractService.publishedList.get) match {
+      case Some(cached) => Future.successful(cachedResult(cached))
+      case None => jdbc {
+        val conference = conferenceService.get(id)
+        val eTag = conference.abstractsETag("published")
+        ConferenceService.uuids.getOrElseUpdate(id)((conference.uuid, conference.uuid))
+
+        if (theirs.contains(eTag)) {
+          NotModified
+        } else if (stream) {
+          streamPages[DocumentKey] { after =>
+            val page = abstractService.listDocumentPage(conference, after, AbstractService.streamPageSize)
+            (page.documents.map(_.json), page.next)
+          }.withHeaders(ETAG -> eTag)
+        } else {
+          cachedResult(AbstractService.publishedList.getOrElseUpdate(conference.uuid) {
+            val documents = abstractService.listDocuments(conference)
+
+            (conference.uuid, CachedBody(documents.map(_.json).mkString("[", ",", "]"),
+              conference.abstractsETag("published")))
+          })
+        }
+      }
+    }
+  }
+
+  def cachedResult[A](cached: CachedBody)(implicit request: Request[A]) = {
+    if (request.headers.get("If-None-Match").contains(cached.eTag)) {
+      NotModified
+    } else {
+      Ok(cached.body).as(JSON).withHeaders(ETAG -> cached.eTag)
+    }
+  }
+
+  /**
+   * Search the published abstracts of a conference.
+   *
+   * @param id     The id of the conference.
+   * @param q      The query string.
+   * @param offset The number of results to skip.
+   * @param limit  The maximum number of results.
+   *
+   * @return The total number of results and the requested results
+   *         with their score, best matches first.
+   */
+  def search(id: String, q: String, offset: Int, limit: Int) = UserAwareAction.async { implicit request =>
+    jdbc {
+      if (offset < 0 || limit < 1 || limit > AbstractService.maxPageSize) {
+        throw new IllegalArgumentException("Invalid offset or limit")
+      }
 
-    val conference = conferenceService.get(id)
-    val abstracts = abstractService.list(conference)
+      val conference = conferenceService.get(id)
+      val hits = abstractService.search(conference, q)
+
+      Ok(Json.obj(
+        "total" -> hits.size,
+        "offset" -> offset,
+        "limit" -> limit,
+        "hits" -> hits.slice(offset, offset + limit).map { hit =>
+          Json.parse(hit.doc.json).as[JsObject] + ("score" -> JsNumber(hit.score))
+        }
+      ))
+    }
+  }
 
-    resultWithETag(abstracts)
+  /**
+   * List the changes of the published abstracts of a conference since
+   * the cursor of the last synchronization, for offline clients.
+   *
+   * @param id    The id of the conference.
+   * @param since The cursor returned by the last synchronization
+   *              (milliseconds since the epoch); everything if absent.
+   *
+   * @return The cursor for the next synchronization, the conference if it
+   *         changed, the changed abstracts and the uuids of the abstracts
+   *         and figures that were removed.
+   */
+  def listChanges(id: String, since: Option[Long]) = UserAwareAction.async { implicit request =>
+    jdbc {
+      if (since.exists(_ < 0)) {
+        throw new IllegalArgumentException("Invalid cursor: " + since.get)
+      }
+
+      val conference = conferenceService.get(id)
+      val changes = abstractService.listChanges(conference, since.map(new DateTime(_, DateTimeZone.UTC)))
+
+      Ok(Json.obj(
+        "cursor" -> changes.cursor.getMillis,
+        "conference" -> changes.conference.map(confFormat.writes).getOrElse(JsNull),
+        "abstracts" -> changes.abstracts,
+        "deleted" -> Json.obj(
+          "abstracts" -> changes.removedAbstracts,
+          "figures" -> changes.removedFigures
+        )
+      )).withHeaders(CACHE_CONTROL -> "no-cache")
+    }
   }
 
   /**
    * List all abstracts for a given conference.
+   * With any of after, limit or fields only a page of abstracts
+   * with the requested fields is returned.
    *
    * @return All abstracts publicly available.
    */
-  def listAllByConference(id: String) = SecuredAction {  implicit request =>
+  def listAllByConference(id: String, after: Option[String], limit: Option[Int],
+                          fields: Option[String], stream: Boolean) = SecuredAction.async {  implicit request =>
+    jdbc {
+      val conference = conferenceService.get(id)
 
-    val conference = conferenceService.get(id)
+      if (!(request.identity.account.isAdmin || conference.isOwner(request.identity.account))) {
+        throw new IllegalAccessException("Not allowed")
+      }
 
-    if (!(request.identity.account.isAdmin || conference.isOwner(request.identity.account))) {
-      throw new IllegalAccessException("Not allowed")
+      val params = pageParams(after, limit, fields)
+      val eTag = conference.abstractsETag("all" + pageVariant(params))
+
+      if (request.headers.get("If-None-Match").contains(eTag)) {
+        NotModified
+      } else {
+        params match {
+          case Some((key, size, selected)) =>
+            val page = abstractService.listAllPage(conference, key, size, selected)
+            pageResult(page, size, selected).withHeaders(ETAG -> eTag)
+          case None if stream =>
+            streamAbstracts { after =>
+              abstractService.listAllPage(conference, after, AbstractService.streamPageSize,
+                AbstractService.pageFields)
+            }.withHeaders(ETAG -> eTag)
+          case None =>
+            Ok(Json.toJson(abstractService.listAll(conference))).withHeaders(ETAG -> eTag)
+        }
+      }
     }
-
-    val abstracts = abstractService.listAll(conference)
-    resultWithETag(abstracts)
   }
 
   /**
    * List all abstracts for a given user.
+   * With any of after, limit or fields only a page of abstracts
+   * with the requested fields is returned.
    *
    * @return All (accessible) abstracts for a given user.
    */
-  def listByAccount(id: String) = SecuredAction { implicit request =>
-    val ownAbstracts = abstractService.listOwn(request.identity.account)
-    resultWithETag(ownAbstracts)
+  def listByAccount(id: String, after: Option[String], limit: Option[Int],
+                    fields: Option[String], stream: Boolean) = SecuredAction.async { implicit request =>
+    jdbc {
+      pageParams(after, limit, fields) match {
+        case Some((key, size, selected)) =>
+          val page = abstractService.listOwnPage(request.identity.account, key, size, selected)
+          pageResult(page, size, selected)
+        case None if stream =>
+          val account = request.identity.account
+          val eTag = combineETags(abstractService.listOwnETags(account))
+
+          if (request.headers.get("If-None-Match").contains(eTag)) {
+            NotModified
+          } else {
+            streamAbstracts { after =>
+              abstractService.listOwnPage(account, after, AbstractService.streamPageSize,
+                AbstractService.pageFields)
+            }.withHeaders(ETAG -> eTag)
+          }
+        case None =>
+          val ownAbstracts = abstractService.listOwn(request.identity.account)
+          resultWithETag(ownAbstracts)
+      }
+    }
   }
 
   /**
@@ -110,9 +362,18 @@ extends Silhouette[Login, CachedCookieAuthenticator] {
     *
     * @return All (accessible) abstracts for a given user.
     */
-  def listFavByAccount(id: String) = SecuredAction { implicit request =>
-    val favAbstracts = abstractService.listFavourite(request.identity.account)
-    resultWithETag(favAbstracts)
+  def listFavByAccount(id: String, after: Option[String], limit: Option[Int],
+                       fields: Option[String]) = SecuredAction.async { implicit request =>
+    jdbc {
+      pageParams(after, limit, fields) match {
+        case Some((key, size, selected)) =>
+          val page = abstractService.listFavouritePage(request.identity.account, key, size, selected)
+          pageResult(page, size, selected)
+        case None =>
+          val favAbstracts = abstractService.listFavourite(request.identity.account)
+          resultWithETag(favAbstracts)
+      }
+    }
   }
 
   /**
@@ -120,12 +381,47 @@ extends Silhouette[Login, CachedCookieAuthenticator] {
    *
    * @return All (accessible) abstracts for a given user.
    */
-  def listOwn(conferenceId: String) = SecuredAction { implicit request =>
+  def listOwn(conferenceId: String) = SecuredAction.async { implicit request =>
+    jdbc {
+      val conference = conferenceService.get(conferenceId)
+      val abstracts = abstractService.listOwn(conference, request.identity.account)
 
-    val conference = conferenceService.get(conferenceId)
-    val abstracts = abstractService.listOwn(conference, request.identity.account)
+      resultWithETag(abstracts)
+    }
+  }
 
-    resultWithETag(abstracts)
+  /**
+   * The conferences of all abstracts of the current user, latest first, each with
+   * a summary (uuid, sortId, title, state, mtime) of the user's abstracts in it.
+   * Replaces the request for the conferences and one request per conference
+   * on the user dashboard.
+   *
+   * @return Ok with the conferences and abstracts / NotModified.
+   */
+  def dashboard = SecuredAction.async { implicit request =>
+    jdbc {
+      val entries = abstractService.listDashboard(request.identity.account)
+      val eTag = DigestUtils.md5Hex(request.identity.account.uuid + entries.map { case (conf, abstracts) =>
+        conf.eTag + abstracts.map(_.eTag).mkString
+      }.mkString)
+
+      if (request.headers.get("If-None-Match").contains(eTag)) {
+        NotModified
+      } else {
+        val summaryWrites = new AbstractProjectionWrites(Set("sortId", "title", "state", "mtime"))
+
+        Ok(JsArray(entries.map { case (conf, abstracts) =>
+          Json.obj(
+            "uuid" -> conf.uuid,
+            "short" -> conf.short,
+            "name" -> conf.name,
+            "cite" -> conf.cite,
+            "isOpen" -> conf.isOpen,
+            "abstracts" -> JsArray(abstracts.map(summaryWrites.writes))
+          )
+        })).withHeaders(ETAG -> eTag)
+      }
+    }
   }
 
   /**
@@ -133,10 +429,12 @@ extends Silhouette[Login, CachedCookieAuthenticator] {
     *
     * @return All (accessible) favourite abstracts for a given user.
     */
-  def listFavByConf(conferenceId: String) = SecuredAction { implicit request =>
-    val conference = conferenceService.get(conferenceId)
-    val abstracts = abstractService.listFavourite(conference, request.identity.account)
-    resultWithETag(abstracts)
+  def listFavByConf(conferenceId: String) = SecuredAction.async { implicit request =>
+    jdbc {
+      val conference = conferenceService.get(conferenceId)
+      val abstracts = abstractService.listFavourite(conference, request.identity.account)
+      resultWithETag(abstracts)
+    }
   }
 
   /**
@@ -144,12 +442,14 @@ extends Silhouette[Login, CachedCookieAuthenticator] {
     *
     * @return All (accessible) favourite abstracts for a given user.
     */
-  def listFavUuidByConf(conferenceId: String) = SecuredAction { implicit request =>
-    val conference = conferenceService.get(conferenceId)
-    val abstracts = abstractService.listIsFavourite(conference, request.identity.account)
-    Ok(Json.toJson(
-      for (abs <- abstracts) yield abs.uuid
-    ))
+  def listFavUuidByConf(conferenceId: String) = SecuredAction.async { implicit request =>
+    jdbc {
+      val conference = conferenceService.get(conferenceId)
+      val abstracts = abstractService.listIsFavourite(conference, request.identity.account)
+      Ok(Json.toJson(
+        for (abs <- abstracts) yield abs.uuid
+      ))
+    }
   }
 
   /**
@@ -159,21 +459,33 @@ extends Silhouette[Login, CachedCookieAuthenticator] {
    *
     * @return An abstract as JSON / abstract page.
    */
-  def get(id: String) = UserAwareAction { implicit request =>
-    Logger.debug(s"Getting abstract with uuid: [$id]")
-
-    val abs = request.identity.map { _.account } match {
-      case Some(user) => abstractService.getOwn(id, user)
-      case _          => abstractService.get(id)
-    }
-
-    if (request.headers.get("If-None-Match").contains(abs.eTag)) {
-      NotModified
-    } else {
-      Ok(Json.toJson(abs)).withHeaders(
-        LAST_MODIFIED -> rfcDateFormatter.print(abs.mtime),
-        ETAG -> abs.eTag)
+  def get(id: String) = UserAwareAction.async { implicit request =>
+    jdbc {
+      Logger.debug(s"Getting abstract with uuid: [$id]")
+
+      request.identity.map { _.account } match {
+        case Some(user) =>
+          val abs = abstractService.getOwn(id, user)
+
+          if (request.headers.get("If-None-Match").contains(abs.eTag)) {
+            NotModified
+          } else {
+            Ok(Json.toJson(abs)).withHeaders(
+              LAST_MODIFIED -> rfcDateFormatter.print(abs.mtime),
+              ETAG -> abs.eTag)
+          }
+        case _ =>
+          val doc = abstractService.getDocument(id)
+
+          if (request.headers.get("If-None-Match").contains(doc.eTag)) {
+            NotModified
+          } else {
+            Ok(doc.json).as(JSON).withHeaders(
+              LAST_MODIFIED -> rfcDateFormatter.print(doc.mtime),
+              ETAG -> doc.eTag)
+          }
       }
+    }
   }
 
   /**
@@ -183,27 +495,29 @@ extends Silhouette[Login, CachedCookieAuthenticator] {
    *
    * @return abstract in JSON / abstract page
    */
-  def update(id: String) = SecuredAction(parse.json) { implicit request =>
-    Logger.debug(s"Updating abstract with uuid: [$id]")
+  def update(id: String) = SecuredAction.async(parse.json) { implicit request =>
+    jdbc {
+      Logger.debug(s"Updating abstract with uuid: [$id]")
 
-    val abs = request.body.as[Abstract]
+      val abs = request.body.as[Abstract]
 
-    if (abs.uuid != null && abs.uuid != id) {
-      //TODO: should that be allowed? I guess not - ck
-      throw new RuntimeException("Trying to change the id of an abstract!")
-      Logger.debug(s"Updating [$id]: UUID mismatch")
-    }
+      if (abs.uuid != null && abs.uuid != id) {
+        //TODO: should that be allowed? I guess not - ck
+        throw new RuntimeException("Trying to change the id of an abstract!")
+        Logger.debug(s"Updating [$id]: UUID mismatch")
+      }
 
-    val oldAbstract = abstractService.getOwn(abs.uuid, request.identity.account)
-    val conference = oldAbstract.conference
+      val oldAbstract = abstractService.getOwn(abs.uuid, request.identity.account)
+      val conference = oldAbstract.conference
 
-    if(!conference.isOpen && oldAbstract.state != AbstractState.InRevision && !request.identity.account.isAdmin) {
-      throw new IllegalAccessException("Conference is closed and abstract not in 'InRevision' state!")
-    }
-    
-    val newAbstract = abstractService.update(abs, request.identity.account)
+      if(!conference.isOpen && oldAbstract.state != AbstractState.InRevision && !request.identity.account.isAdmin) {
+        throw new IllegalAccessException("Conference is closed and abstract not in 'InRevision' state!")
+      }
+
+      val newAbstract = abstractService.update(abs, request.identity.account)
 
-    Ok(Json.toJson(newAbstract)).withHeaders(ETAG -> newAbstract.eTag)
+      Ok(Json.toJson(newAbstract)).withHeaders(ETAG -> newAbstract.eTag)
+    }
   }
 
   /**
@@ -213,12 +527,14 @@ extends Silhouette[Login, CachedCookieAuthenticator] {
    *
    * @return OK or Failed / Redirect to the abstract list page
    */
-  def delete(id: String) = SecuredAction { implicit request =>
-    Logger.debug(s"Deleting abstract with uuid: [$id]")
+  def delete(id: String) = SecuredAction.async { implicit request =>
+    jdbc {
+      Logger.debug(s"Deleting abstract with uuid: [$id]")
 
-    abstractService.delete(id, request.identity.account)
+      abstractService.delete(id, request.identity.account)
 
-    Ok("Abstract Deleted") //FIXME: JSON
+      Ok("Abstract Deleted") //FIXME: JSON
+    }
   }
 
   /**
@@ -226,17 +542,18 @@ extends Silhouette[Login, CachedCookieAuthenticator] {
    *
    * @return a list of updated permissions (accounts) as JSON
    */
-  def setPermissions(id: String) = SecuredAction(parse.json) { implicit request =>
+  def setPermissions(id: String) = SecuredAction.async(parse.json) { implicit request =>
+    jdbc {
+      val to_set = for (acc <- request.body.as[List[JsObject]])
+        yield accountFormat.reads(acc).get
 
-    val to_set = for (acc <- request.body.as[List[JsObject]])
-      yield accountFormat.reads(acc).get
+      val abstr = abstractService.getOwn(id, request.identity.account)
+      val owners = abstractService.setPermissions(abstr, request.identity.account, to_set)
 
-    val abstr = abstractService.getOwn(id, request.identity.account)
-    val owners = abstractService.setPermissions(abstr, request.identity.account, to_set)
-
-    Ok(JsArray(
-      for (acc <- owners) yield accountFormat.writes(acc)
-    ))
+      Ok(JsArray(
+        for (acc <- owners) yield accountFormat.writes(acc)
+      ))
+    }
   }
 
   /**
@@ -244,14 +561,15 @@ extends Silhouette[Login, CachedCookieAuthenticator] {
    *
    * @return a list of updated permissions (accounts) as JSON
    */
-  def getPermissions(id: String) = SecuredAction { implicit request =>
-
-    val abstr = abstractService.getOwn(id, request.identity.account)
-    val owners = abstractService.getPermissions(abstr, request.identity.account)
-
-    Ok(JsArray(
-      for (acc <- owners) yield accountFormat.writes(acc)
-    ))
+  def getPermissions(id: String) = SecuredAction.async { implicit request =>
+    jdbc {
+      val abstr = abstractService.getOwn(id, request.identity.account)
+      val owners = abstractService.getPermissions(abstr, request.identity.account)
+
+      Ok(JsArray(
+        for (acc <- owners) yield accountFormat.writes(acc)
+      ))
+    }
   }
 
   /**
@@ -259,12 +577,14 @@ extends Silhouette[Login, CachedCookieAuthenticator] {
     *
     * @return a list of updated permissions (accounts) as JSON
     */
-  def favouriteUsers(id: String) = SecuredAction { implicit request =>
-    val abstr = abstractService.getFav(id, request.identity.account)
-    val favUsers = abstractService.getFavouriteUsers(abstr, request.identity.account)
-    Ok(JsArray(
-      for (acc <- favUsers) yield accountFormat.writes(acc)
-    ))
+  def favouriteUsers(id: String) = SecuredAction.async { implicit request =>
+    jdbc {
+      val abstr = abstractService.getFav(id, request.identity.account)
+      val favUsers = abstractService.getFavouriteUsers(abstr, request.identity.account)
+      Ok(JsArray(
+        for (acc <- favUsers) yield accountFormat.writes(acc)
+      ))
+    }
   }
 
   /**
@@ -272,73 +592,87 @@ extends Silhouette[Login, CachedCookieAuthenticator] {
     *
     * @return The id of the updated Abstract as JSON
     */
-  def addFavUser(id: String) = SecuredAction { implicit request =>
-    val abstr = abstractService.get(id)
-    abstractService.addFavUser(abstr, request.identity.account)
-    Ok(Json.toJson(id))
+  def addFavUser(id: String) = SecuredAction.async { implicit request =>
+    jdbc {
+      abstractService.setFavourite(id, request.identity.account, favourite = true)
+      Ok(Json.toJson(id))
+    }
   }
   /**
     * Remove the logged in user from the favourite users list of an abstract.
     *
     * @return The id of the updated Abstract as JSON
     */
-  def removeFavUser(id: String) = SecuredAction { implicit request =>
-    val abstr = abstractService.get(id)
-    abstractService.removeFavUser(abstr, request.identity.account)
-    Ok(Json.toJson(id))
+  def removeFavUser(id: String) = SecuredAction.async { implicit request =>
+    jdbc {
+      abstractService.setFavourite(id, request.identity.account, favourite = false)
+      Ok(Json.toJson(id))
+    }
   }
 
-  def listState(id: String) = SecuredAction { implicit request =>
-    implicit val logWrites = new StateLogWrites()
-
-    Ok(Json.toJson(abstractService.listStates(id, request.identity.account)))
+  /**
+    * The number of favourite users of every published abstract of a conference.
+    *
+    * @param id The id of the conference.
+    *
+    * @return An object with the counts by abstract uuid.
+    */
+  def favCounts(id: String) = UserAwareAction.async { implicit request =>
+    jdbc {
+      val conference = conferenceService.get(id)
+      val counts = abstractService.favCounts(conference)
+
+      Ok(JsObject(counts.toSeq.sortBy(_._1).map { case (uuid, count) =>
+        uuid -> JsNumber(count)
+      })).withHeaders(CACHE_CONTROL -> "no-cache")
+    }
   }
 
+  def listState(id: String) = SecuredAction.async { implicit request =>
+    jdbc {
+      implicit val logWrites = new StateLogWrites()
 
-  def setState(id: String) = SecuredAction(parse.json) { implicit request =>
-    implicit val logWrites = new StateLogWrites()
-    val changeReads = ((__ \ "state").read[String] and (__ \ "note").readNullable[String]).tupled
+      Ok(Json.toJson(abstractService.listStates(id, request.identity.account)))
+    }
+  }
 
-    val account = request.identity.account
-    val abstr = abstractService.getOwn(id, account) // TODO: will not work for admin (GitHub issue, #155)
-    val conference = abstr.conference
 
-    val (toState, msg): (AbstractState.State, Option[String]) = changeReads.reads(request.body).fold (
-      invalid = {errors => throw new IllegalArgumentException("Invalid state change object") },
-      valid = { case(s, m) => (AbstractState.withName(s), m) }
-    )
+  def setState(id: String) = SecuredAction.async(parse.json) { implicit request =>
+    jdbc {
+      implicit val logWrites = new StateLogWrites()
+      val changeReads = ((__ \ "state").read[String] and (__ \ "note").readNullable[String]).tupled
 
-    val fromState = abstr.state
+      val account = request.identity.account
+      val abstr = abstractService.getOwn(id, account) // TODO: will not work for admin (GitHub issue, #155)
 
-    val isAdmin = account.isAdmin || conference.owners.contains(account)
-    val isOwner = abstr.isOwner(account)
+      val (toState, msg): (AbstractState.State, Option[String]) = changeReads.reads(request.body).fold (
+        invalid = {errors => throw new IllegalArgumentException("Invalid state change object") },
+        valid = { case(s, m) => (AbstractState.withName(s), m) }
+      )
 
-    val canTransitionAdmin = isAdmin && fromState.canTransitionTo(toState, isAdmin=true, conference.isOpen)
-    val canTransitionOwner = isOwner && fromState.canTransitionTo(toState, isAdmin=false, conference.isOpen)
+      val stateLog = abstractService.setState(abstr, toState, account, msg)
 
-    if (!(canTransitionAdmin || canTransitionOwner)) {
-      throw new IllegalAccessException(s"No permission to set state to $toState")
+      Ok(Json.toJson(stateLog))
     }
+  }
 
-    val stateLog = abstractService.setState(abstr, toState, account, msg)
+  def patch(id: String) = SecuredAction.async(parse.json) { implicit request =>
+    jdbc {
+      val account = request.identity.account
+      val abstr = abstractService.getOwn(id, account)
 
-    Ok(Json.toJson(stateLog))
+      val patches = parsePatches(request.body)
+
+      val patched = abstractService.patch(abstr, patches, account)
+      Ok(Json.toJson(patched))
+    }
   }
 
-  def patch(id: String) = SecuredAction(parse.json) { implicit request =>
+  private def parsePatches(json: JsValue) : List[PatchOp] = {
     val patchReads = Reads.list(((__ \ "op").read[String] and
       (__ \ "path").read[String] and (__ \ "value").readNullable[JsValue]).tupled)
 
-    val account = request.identity.account
-    val abstr = abstractService.getOwn(id, account)
-    val isAdmin = account.isAdmin || abstr.conference.owners.contains(account)
-
-    if (!isAdmin) {
-      //patching is only for fields which require admin access, such as sortId + doi
-      throw new IllegalAccessException(s"No permission to patch the abstract")
-    }
-
-    val patches = patchReads.reads(request.body).getOrElse {
+    patchReads.reads(json).getOrElse {
       Logger.debug("Invalid patch description")
       throw new IllegalArgumentException("Invalid patch description")
     }.map {
@@ -346,8 +680,74 @@ extends Silhouette[Login, CachedCookieAuthenticator] {
       case("add", "/doi", Some(v: JsString)) => PatchAddDOI(v.value)
       case _ => throw new IllegalArgumentException("Unsupported patch operation")
     }.toList
+  }
 
-    val patched = abstractService.patch(abstr, patches)
-    Ok(Json.toJson(patched))
+  /**
+   * Change the state of many abstracts of a conference at once.
+   * The body is a list of changes: [{"abstract": uuid, "state": state, "note": note}, ...]
+   *
+   * @param id The id of the conference.
+   *
+   * @return Ok with the result of every change, see bulkResult.
+   */
+  def setStates(id: String) = SecuredAction.async(parse.json) { implicit request =>
+    jdbc {
+      val changeReads = Reads.list(((__ \ "abstract").read[String] and (__ \ "state").read[String] and
+        (__ \ "note").readNullable[String]).tupled)
+
+      val changes = changeReads.reads(request.body).getOrElse {
+        throw new IllegalArgumentException("Invalid state change list")
+      }.map { case (abstr, state, note) =>
+        val toState = AbstractState.values.find(_.toString == state).getOrElse {
+          throw new IllegalArgumentException(s"Invalid state: $state")
+        }
+        StateChange(abstr, toState, note)
+      }
+
+      bulkResult(abstractService.setStates(id, changes, request.identity.account))
+    }
+  }
+
+  /**
+   * Patch many abstracts of a conference at once.
+   * The body is a list of patches: [{"abstract": uuid, "patches": [{"op": .., "path": .., "value": ..}]}, ...]
+   *
+   * @param id The id of the conference.
+   *
+   * @return Ok with the result of every patch, see bulkResult.
+   */
+  def patchAll(id: String) = SecuredAction.async(parse.json) { implicit request =>
+    jdbc {
+      val patchesReads = Reads.list(((__ \ "abstract").read[String] and (__ \ "patches").read[JsValue]).tupled)
+
+      val patches = patchesReads.reads(request.body).getOrElse {
+        throw new IllegalArgumentException("Invalid patch list")
+      }.map { case (abstr, ops) =>
+        (abstr, parsePatches(ops))
+      }
+
+      bulkResult(abstractService.patchAll(id, patches, request.identity.account))
+    }
+  }
+
+  /**
+   * The results of a bulk operation, in the order of the request:
+   * {"abstract": uuid, "error": false, "state": .., "sortId": .., "doi": ..} for changed abstracts
+   * and {"abstract": uuid, "error": true, "status": 403, "message": ..} for failures.
+   */
+  private def bulkResult(results: Seq[(String, Try[Abstract])]) = {
+    Ok(JsArray(results.map {
+      case (id, Success(abstr)) =>
+        Json.obj("abstract" -> id, "error" -> false, "state" -> abstr.state.toString,
+          "sortId" -> abstr.sortId, "doi" -> Option(abstr.doi))
+      case (id, Failure(e)) =>
+        val status = e match {
+          case _: IllegalAccessException => FORBIDDEN
+          case _: EntityNotFoundException => NOT_FOUND
+          case _: IllegalArgumentException => BAD_REQUEST
+          case _ => INTERNAL_SERVER_ERROR
+        }
+        Json.obj("abstract" -> id, "error" -> true, "status" -> status, "message" -> e.getMessage)
+    }))
   }
 }
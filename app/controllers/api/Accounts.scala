@@ -6,6 +6,7 @@ import conf.GlobalEnvironment
 import models._
 import play.api.libs.json._
 import service.AccountStore
+import utils.BlockingIO.jdbc
 import utils.DefaultRoutesResolver._
 import utils.serializer.AccountFormat
 
@@ -27,25 +28,28 @@ extends Silhouette[Login, CachedCookieAuthenticator] {
    *
    * @return Ok with all accounts that match.
    */
-  def accountsByEmail(email: String) = SecuredAction { implicit request =>
-    // TODO since email is unique this could be a single result
-    val accounts = try {
-      Seq(accountStore.getByMail(email))
-    } catch {
-      case e: Throwable => Seq[Account]()
+  def accountsByEmail(email: String) = SecuredAction.async { implicit request =>
+    jdbc {
+      // TODO since email is unique this could be a single result
+      val accounts = try {
+        Seq(accountStore.getByMail(email))
+      } catch {
+        case e: Throwable => Seq[Account]()
+      }
+
+      Ok(Json.toJson(accounts))
     }
-
-    Ok(Json.toJson(accounts))
   }
 
-  def listAccounts() = SecuredAction { implicit request =>
+  def listAccounts() = SecuredAction.async { implicit request =>
+    jdbc {
+      if(! request.identity.account.isAdmin) {
+        throw new IllegalAccessException("Need to be a site admin to obtain account list!")
+      }
 
-    if(! request.identity.account.isAdmin) {
-      throw new IllegalAccessException("Need to be a site admin to obtain account list!")
+      val accounts = accountStore.list()
+      Ok(Json.toJson(accounts))
     }
-
-    val accounts = accountStore.list()
-    Ok(Json.toJson(accounts))
   }
 
 }
\ No newline at end of file
@@ -6,11 +6,11 @@ import javax.persistence.NoResultException
 import models._
 import play.api.libs.json.{JsArray, _}
 import service.{BannerService, ConferenceService}
+import utils.BlockingIO.{files, jdbc}
 import utils.DefaultRoutesResolver._
+import utils.FileResults
 import utils.serializer.BannerFormat
 
-import scala.concurrent.ExecutionContext.Implicits.global
-import scala.concurrent.Future
 import scala.collection.JavaConversions._
 
 /**
@@ -35,25 +35,25 @@ class Banners(implicit val env: Environment[Login, CachedCookieAuthenticator])
     *
     * @return  OK / Failed
     */
-  def upload(id: String) = SecuredAction(parse.multipartFormData) { implicit request =>
-    val conference = conferenceService.get(id)
-    val tempfile = request.body.file("file").map {
-      banner => banner.ref
-    }.getOrElse {
-      throw new IllegalArgumentException("File is missing")
-    }
+  def upload(id: String) = SecuredAction.async(parse.multipartFormData) { implicit request =>
+    files {
+      val conference = conferenceService.get(id)
+      val tempfile = request.body.file("file").map {
+        banner => banner.ref
+      }.getOrElse {
+        throw new IllegalArgumentException("File is missing")
+      }
 
-    val jsban = Json.parse(request.body.dataParts("banner").head).as[Banner]
+      val jsban = Json.parse(request.body.dataParts("banner").head).as[Banner]
 
-    val banner = bannerService.create(jsban, tempfile, conference, request.identity.account)
+      val banner = bannerService.create(jsban, tempfile, conference, request.identity.account)
 
-    // uploadMobile is not very perfomant so we move the task to the background
-    // since mobile banners are also nice to have but not essential.
-    val future = Future {
+      // mobile banners are created in the background by a bounded worker pool,
+      // until then the original is served as mobile version.
       bannerService.uploadMobile(jsban, conference, request.identity.account)
-    }
 
-    Created(banFormat.writes(banner))
+      Created(banFormat.writes(banner))
+    }
   }
 
   /**
@@ -63,13 +63,15 @@ class Banners(implicit val env: Environment[Login, CachedCookieAuthenticator])
     *
     * @return  OK / Failed
     */
-  def list(id: String) = UserAwareAction { implicit request =>
-    Ok(JsArray(
-      for (ban <- asScalaSet(
-        conferenceService.get(id).banner
-      ).toSeq
-      ) yield banFormat.writes(ban)
-    ))
+  def list(id: String) = UserAwareAction.async { implicit request =>
+    jdbc {
+      Ok(JsArray(
+        for (ban <- asScalaSet(
+          conferenceService.get(id).banner
+        ).toSeq
+        ) yield banFormat.writes(ban)
+      ))
+    }
   }
 
   /**
@@ -77,12 +79,14 @@ class Banners(implicit val env: Environment[Login, CachedCookieAuthenticator])
     *
     * @param id  The id of the banner.
     *
-    * @return  OK / Failed
+    * @return  OK / Partial Content / Not Modified / Failed
     */
-  def download(id: String) = UserAwareAction { implicit request =>
-    Ok.sendFile(bannerService.openFile(
-      bannerService.get(id)
-    ))
+  def download(id: String) = UserAwareAction.async { implicit request =>
+    files {
+      val banner = bannerService.get(id)
+      val original = bannerService.openFile(banner)
+      FileResults.serve(original, original, banner.hash, derived = false)
+    }
   }
 
   /**
@@ -90,12 +94,14 @@ class Banners(implicit val env: Environment[Login, CachedCookieAuthenticator])
     *
     * @param id  The id of the banner.
     *
-    * @return  OK / Failed
+    * @return  OK / Partial Content / Not Modified / Failed
     */
-  def downloadmobile(id: String) = UserAwareAction { implicit request =>
-    Ok.sendFile(bannerService.openMobileFile(
-      bannerService.get(id)
-    ))
+  def downloadmobile(id: String) = UserAwareAction.async { implicit request =>
+    files {
+      val banner = bannerService.get(id)
+      FileResults.serve(bannerService.openMobileFile(banner), bannerService.openFile(banner),
+        banner.hash, derived = true)
+    }
   }
 
   /**
@@ -105,9 +111,11 @@ class Banners(implicit val env: Environment[Login, CachedCookieAuthenticator])
     *
     * @return  OK / Failed
     */
-  def delete(id: String) = SecuredAction { implicit request =>
-    bannerService.delete(id, request.identity.account)
-    Ok("Banner deleted successfully.")
+  def delete(id: String) = SecuredAction.async { implicit request =>
+    jdbc {
+      bannerService.delete(id, request.identity.account)
+      Ok("Banner deleted successfully.")
+    }
   }
 
 }
@@ -4,7 +4,10 @@ import org.apache.commons.codec.digest.DigestUtils
 import play.api.mvc._
 import play.api.libs.json._
 import utils.serializer.{AccountFormat, ConferenceFormat}
-import service.ConferenceService
+import service.{ConferenceService, ExportService}
+import service.util.ScheduleIndex
+import utils.BlockingIO.jdbc
+import utils.FileResults
 import utils.DefaultRoutesResolver._
 import models.Conference
 import play.api.libs.json.JsArray
@@ -23,17 +26,20 @@ class Conferences(implicit val env: Environment[Login, CachedCookieAuthenticator
   implicit val confFormat = new ConferenceFormat()
   val accountFormat = new AccountFormat()
   val conferenceService = ConferenceService()
+  val exportService = ExportService()
 
   /**
    * Create a new conference.
    *
    * @return Created with conference in JSON / BadRequest
    */
-  def create = SecuredAction(parse.json) { implicit request =>
-    val conference = request.body.as[Conference]
-    val resp = conferenceService.create(conference, request.identity.account)
+  def create = SecuredAction.async(parse.json) { implicit request =>
+    jdbc {
+      val conference = request.body.as[Conference]
+      val resp = conferenceService.create(conference, request.identity.account)
 
-    Created(confFormat.writes(resp)).withHeaders(ETAG -> conference.eTag)
+      Created(confFormat.writes(resp)).withHeaders(ETAG -> conference.eTag)
+    }
   }
 
   def resultWithETag[A](conferences: Seq[Conference])(implicit request: Request[A]) = {
@@ -52,14 +58,22 @@ class Conferences(implicit val env: Environment[Login, CachedCookieAuthenticator
    *
    * @return Ok with all conferences publicly available.
    */
-  def list(group: String) = Action { implicit request =>
-    val conferences = if (group != null) {
-      conferenceService.listWithGroup(group)
-    } else {
-      conferenceService.list()
-    }
+  def list(group: String) = Action.async { implicit request =>
+    jdbc {
+      val eTag = conferenceService.listETag(group)
 
-    resultWithETag(conferences)
+      if (request.headers.get("If-None-Match").contains(eTag)) {
+        NotModified
+      } else {
+        val conferences = if (group != null) {
+          conferenceService.listWithGroup(group)
+        } else {
+          conferenceService.list()
+        }
+
+        Ok(Json.toJson(conferences)).withHeaders(ETAG -> eTag)
+      }
+    }
   }
 
   /**
@@ -68,12 +82,14 @@ class Conferences(implicit val env: Environment[Login, CachedCookieAuthenticator
    *
    * @return Ok with all conferences publicly available. / empty string to circumvent error message
    */
-  def listWithOwnAbstracts =  SecuredAction { implicit request =>
-    val conferences = conferenceService.listWithAbstractsOfAccount(request.identity.account)
-    if (conferences.length==0) {
-      Ok(Json.toJson(""))
-    } else {
-      resultWithETag(conferences)
+  def listWithOwnAbstracts =  SecuredAction.async { implicit request =>
+    jdbc {
+      val conferences = conferenceService.listWithAbstractsOfAccount(request.identity.account)
+      if (conferences.length==0) {
+        Ok(Json.toJson(""))
+      } else {
+        resultWithETag(conferences)
+      }
     }
   }
 
@@ -83,12 +99,14 @@ class Conferences(implicit val env: Environment[Login, CachedCookieAuthenticator
     *
     * @return Ok with all conferences publicly available.
     */
-  def listWithFavAbstracts =  SecuredAction { implicit request =>
-    val conferences = conferenceService.listWithFavouriteAbstractsOfAccount(request.identity.account)
-    if (conferences.length==0) {
-      BadRequest("No favourite abstracts")
-    } else {
-      resultWithETag(conferences)
+  def listWithFavAbstracts =  SecuredAction.async { implicit request =>
+    jdbc {
+      val conferences = conferenceService.listWithFavouriteAbstractsOfAccount(request.identity.account)
+      if (conferences.length==0) {
+        BadRequest("No favourite abstracts")
+      } else {
+        resultWithETag(conferences)
+      }
     }
   }
 
@@ -98,17 +116,18 @@ class Conferences(implicit val env: Environment[Login, CachedCookieAuthenticator
    * @param id The id of the conference.
    * @return OK with conference in JSON / NotFound
    */
-  def get(id: String) = Action { implicit request =>
-
-    val conference = conferenceService.get(id)
+  def get(id: String) = Action.async { implicit request =>
+    jdbc {
+      val conference = conferenceService.get(id)
 
-    val theirs = request.headers.get("If-None-Match")
-    val eTag = conference.eTag
+      val theirs = request.headers.get("If-None-Match")
+      val eTag = conference.eTag
 
-    if (theirs.contains(eTag)) {
-       NotModified
-    } else {
-      Ok(confFormat.writes(conference)).withHeaders(ETAG -> eTag)
+      if (theirs.contains(eTag)) {
+         NotModified
+      } else {
+        Ok(confFormat.writes(conference)).withHeaders(ETAG -> eTag)
+      }
     }
   }
 
@@ -118,12 +137,14 @@ class Conferences(implicit val env: Environment[Login, CachedCookieAuthenticator
    * @param id   The conference id to update.
    * @return OK with conference in JSON / BadRequest / Forbidden
    */
-  def update(id: String) = SecuredAction(parse.json) { implicit request =>
-    val conference = request.body.as[Conference]
-    conference.uuid = id
-    val resp = conferenceService.update(conference, request.identity.account)
+  def update(id: String) = SecuredAction.async(parse.json) { implicit request =>
+    jdbc {
+      val conference = request.body.as[Conference]
+      conference.uuid = id
+      val resp = conferenceService.update(conference, request.identity.account)
 
-    Ok(confFormat.writes(resp)).withHeaders(ETAG -> conference.eTag)
+      Ok(confFormat.writes(resp)).withHeaders(ETAG -> conference.eTag)
+    }
   }
 
   /**
@@ -132,9 +153,11 @@ class Conferences(implicit val env: Environment[Login, CachedCookieAuthenticator
    * @param id   Conference id to delete.
    * @return OK | BadRequest | Forbidden
    */
-  def delete(id: String) = SecuredAction { implicit request =>
-    conferenceService.delete(id, request.identity.account)
-    Ok(Json.obj("error" -> false))
+  def delete(id: String) = SecuredAction.async { implicit request =>
+    jdbc {
+      conferenceService.delete(id, request.identity.account)
+      Ok(Json.obj("error" -> false))
+    }
   }
 
   /**
@@ -142,16 +165,17 @@ class Conferences(implicit val env: Environment[Login, CachedCookieAuthenticator
    *
    * @return a list of updated permissions (accounts) as JSON
    */
-  def setPermissions(id: String) = SecuredAction(parse.json) { implicit request =>
-
-    val to_set = for (acc <- request.body.as[List[JsObject]])
-      yield accountFormat.reads(acc).get
+  def setPermissions(id: String) = SecuredAction.async(parse.json) { implicit request =>
+    jdbc {
+      val to_set = for (acc <- request.body.as[List[JsObject]])
+        yield accountFormat.reads(acc).get
 
-    val owners = conferenceService.setPermissions(conferenceService.get(id), request.identity.account, to_set)
+      val owners = conferenceService.setPermissions(conferenceService.get(id), request.identity.account, to_set)
 
-    Ok(JsArray(
-      for (acc <- owners) yield accountFormat.writes(acc)
-    ))
+      Ok(JsArray(
+        for (acc <- owners) yield accountFormat.writes(acc)
+      ))
+    }
   }
 
   /**
@@ -159,13 +183,14 @@ class Conferences(implicit val env: Environment[Login, CachedCookieAuthenticator
    *
    * @return a list of updated permissions (accounts) as JSON
    */
-  def getPermissions(id: String) = SecuredAction { implicit request =>
-
-    val owners = conferenceService.getPermissions(conferenceService.get(id), request.identity.account)
+  def getPermissions(id: String) = SecuredAction.async { implicit request =>
+    jdbc {
+      val owners = conferenceService.getPermissions(conferenceService.get(id), request.identity.account)
 
-    Ok(JsArray(
-      for (acc <- owners) yield accountFormat.writes(acc)
-    ))
+      Ok(JsArray(
+        for (acc <- owners) yield accountFormat.writes(acc)
+      ))
+    }
   }
 
   /**
@@ -174,11 +199,13 @@ class Conferences(implicit val env: Environment[Login, CachedCookieAuthenticator
     * @param id Conference id where the geo entry should be set.
     * @return OK | BadRequest | Forbidden | Unauthorized
     */
-  def setGeo(id: String) = SecuredAction(parse.json) { implicit request =>
-    val geoContent = Json.stringify(request.body)
-    conferenceService.updateSpecificFields(conferenceService.get(id),
-                                            request.identity.account, geo = geoContent)
-    Ok(request.body)
+  def setGeo(id: String) = SecuredAction.async(parse.json) { implicit request =>
+    jdbc {
+      val geoContent = Json.stringify(request.body)
+      conferenceService.updateSpecificFields(conferenceService.get(id),
+                                              request.identity.account, geo = geoContent)
+      Ok(request.body)
+    }
   }
 
   /**
@@ -187,18 +214,9 @@ class Conferences(implicit val env: Environment[Login, CachedCookieAuthenticator
     * @param id Conference id of the required geo entry.
     * @return OK | NotFound
     */
-  def getGeo(id: String) = UserAwareAction { implicit request =>
-    val geo = conferenceService.get(id).geo
-    if (geo == null) {
-      NotFound(Json.obj("message" -> "Geo entry not found."))
-    } else {
-      val theirs = request.headers.get("If-None-Match")
-      val eTag = DigestUtils.md5Hex(geo)
-      if (theirs.contains(eTag)) {
-        NotModified
-      } else {
-        Ok(Json.parse(geo)).withHeaders(ETAG -> eTag)
-      }
+  def getGeo(id: String) = UserAwareAction.async { implicit request =>
+    jdbc {
+      fieldResult(id, "geo", "Geo", JSON)
     }
   }
 
@@ -208,30 +226,45 @@ class Conferences(implicit val env: Environment[Login, CachedCookieAuthenticator
     * @param id Conference id where the schedule entry should be set.
     * @return OK | BadRequest | Forbidden | Unauthorized
     */
-  def setSchedule(id: String) = SecuredAction(parse.json) { implicit request =>
-    val scheduleContent = Json.stringify(request.body)
-    conferenceService.updateSpecificFields(conferenceService.get(id),
-                                            request.identity.account, schedule = scheduleContent)
-    Ok(request.body)
+  def setSchedule(id: String) = SecuredAction.async(parse.json) { implicit request =>
+    jdbc {
+      val scheduleContent = Json.stringify(request.body)
+      conferenceService.updateSpecificFields(conferenceService.get(id),
+                                              request.identity.account, schedule = scheduleContent)
+      Ok(request.body)
+    }
   }
 
   /**
-    * Return the schedule entry of a specific conference.
+    * Return the schedule entry of a specific conference. With any of from, to
+    * or track only the sessions, tracks and events in the time window and track
+    * are returned, in the format of the schedule.
     *
-    * @param id Conference id of the required schedule entry.
-    * @return OK | NotFound
+    * @param id    Conference id of the required schedule entry.
+    * @param from  Start of the time window (yyyy-MM-dd or yyyy-MM-ddTHH:mm).
+    * @param to    End of the time window; a date includes the whole day.
+    * @param track Title of a track.
+    * @return OK | NotFound | BadRequest
     */
-  def getSchedule(id: String) = UserAwareAction { implicit request =>
-    val schedule = conferenceService.get(id).schedule
-    if (schedule == null) {
-      NotFound(Json.obj("message" -> "Schedule entry not found."))
-    } else {
-      val theirs = request.headers.get("If-None-Match")
-      val eTag = DigestUtils.md5Hex(schedule)
-      if (theirs.contains(eTag)) {
-        NotModified
+  def getSchedule(id: String, from: Option[String], to: Option[String], track: Option[String]) =
+    UserAwareAction.async { implicit request =>
+    jdbc {
+      if (from.isEmpty && to.isEmpty && track.isEmpty) {
+        fieldResult(id, "schedule", "Schedule", JSON)
       } else {
-        Ok(Json.parse(schedule)).withHeaders(ETAG -> eTag)
+        val fromTime = from.map(ScheduleIndex.parseTime(_))
+        val toTime = to.map(ScheduleIndex.parseTime(_, endOfDay = true))
+
+        conferenceService.getScheduleIndex(id) match {
+          case None => NotFound(Json.obj("message" -> "Schedule entry not found."))
+          case Some(schedule) =>
+            val eTag = DigestUtils.md5Hex(schedule.eTag + ":" + from + ":" + to + ":" + track)
+            if (request.headers.get(IF_NONE_MATCH).contains(eTag)) {
+              NotModified
+            } else {
+              Ok(schedule.select(fromTime, toTime, track)).withHeaders(ETAG -> eTag)
+            }
+        }
       }
     }
   }
@@ -242,10 +275,12 @@ class Conferences(implicit val env: Environment[Login, CachedCookieAuthenticator
     * @param id Conference id where the info entry should be set.
     * @return OK | BadRequest | Forbidden | Unauthorized
     */
-  def setInfo(id: String) = SecuredAction(parse.text) { implicit request =>
-    val infoContent = request.body
-    conferenceService.updateSpecificFields(conferenceService.get(id), request.identity.account, info = infoContent)
-    Ok(request.body)
+  def setInfo(id: String) = SecuredAction.async(parse.text) { implicit request =>
+    jdbc {
+      val infoContent = request.body
+      conferenceService.updateSpecificFields(conferenceService.get(id), request.identity.account, info = infoContent)
+      Ok(request.body)
+    }
   }
 
   /**
@@ -254,17 +289,72 @@ class Conferences(implicit val env: Environment[Login, CachedCookieAuthenticator
     * @param id Conference id of the required info entry.
     * @return OK | NotFound
     */
-  def getInfo(id: String) = UserAwareAction { implicit request =>
-    val info = conferenceService.get(id).info
-    if (info == null) {
-      NotFound(Json.obj("message" -> "Info entry not found."))
-    } else {
-      val theirs = request.headers.get("If-None-Match")
-      val eTag = DigestUtils.md5Hex(info)
-      if (theirs.contains(eTag)) {
-        NotModified
-      } else {
-        Ok(info).withHeaders(ETAG -> eTag)
+  def getInfo(id: String) = UserAwareAction.async { implicit request =>
+    jdbc {
+      fieldResult(id, "info", "Info", TEXT)
+    }
+  }
+
+  /**
+   * Download the export bundle of a conference: a ZIP archive with the
+   * conference, all of its abstracts and the files of its figures and banners.
+   * Bundles are built in the background; until the bundle of the current
+   * version is built the request is answered with Accepted and should be
+   * repeated after the time given in Retry-After. Byte ranges are supported,
+   * so interrupted downloads can be resumed.
+   *
+   * @param id The id of the conference.
+   * @return OK with the bundle / Accepted / Forbidden / NotFound
+   */
+  def export(id: String) = SecuredAction.async { implicit request =>
+    jdbc {
+      val conference = conferenceService.get(id)
+
+      if (!(request.identity.account.isAdmin || conference.isOwner(request.identity.account))) {
+        throw new IllegalAccessException("Not allowed")
+      }
+
+      exportService.get(conference) match {
+        case Some(file) =>
+          // contains unpublished abstracts, must not be stored by shared caches
+          FileResults.serve(file, file, null, derived = false, FileResults.PRIVATE)
+            .withHeaders(CONTENT_DISPOSITION -> s"""attachment; filename="${conference.short}.zip"""")
+        case None if exportService.build(conference).value.exists(_.isFailure) =>
+          ServiceUnavailable(Json.obj(
+            "error" -> true,
+            "message" -> "The export could not be started, please try again later"
+          )).withHeaders(RETRY_AFTER -> "30")
+        case None =>
+          Accepted(Json.obj(
+            "error" -> false,
+            "message" -> "The export is being prepared, please try again later"
+          )).withHeaders(RETRY_AFTER -> "5", CACHE_CONTROL -> "no-cache")
+      }
+    }
+  }
+
+  /**
+   * Serve a cached geo, schedule or info entry; the gzip compressed body
+   * is sent to clients that accept it.
+   */
+  private def fieldResult(id: String, field: String, label: String, contentType: String)
+                         (implicit request: RequestHeader) : Result = {
+    conferenceService.getField(id, field) match {
+      case None => NotFound(Json.obj("message" -> s"$label entry not found."))
+      case Some(cached) if request.headers.get(IF_NONE_MATCH).contains(cached.eTag) =>
+        NotModified.withHeaders(ETAG -> cached.eTag, VARY -> ACCEPT_ENCODING)
+      case Some(cached) if acceptsGzip(request) =>
+        Ok(cached.gzipped).as(contentType)
+          .withHeaders(ETAG -> cached.eTag, CONTENT_ENCODING -> "gzip", VARY -> ACCEPT_ENCODING)
+      case Some(cached) =>
+        Ok(cached.body).as(contentType).withHeaders(ETAG -> cached.eTag, VARY -> ACCEPT_ENCODING)
+    }
+  }
+
+  private def acceptsGzip(request: RequestHeader) : Boolean = {
+    request.headers.get(ACCEPT_ENCODING).exists { value =>
+      value.split(",").map(_.trim.split(";").map(_.trim)).exists { parts =>
+        (parts.head == "gzip" || parts.head == "*") && !parts.tail.exists(_.matches("q=0(\\.0*)?"))
       }
     }
   }
@@ -4,15 +4,16 @@ import play.api._
 import play.api.libs.json.{JsArray, _}
 import play.api.mvc._
 import service.{AbstractService, FigureService}
+import service.util.ImageProcessor
+import utils.BlockingIO.{files, jdbc}
 import utils.DefaultRoutesResolver._
+import utils.FileResults
 import utils.serializer.FigureFormat
 import models._
 
 import com.mohiva.play.silhouette.contrib.services.CachedCookieAuthenticator
 import com.mohiva.play.silhouette.core.{Silhouette, Environment}
 
-import scala.concurrent.ExecutionContext.Implicits.global
-import scala.concurrent.Future
 import scala.collection.JavaConversions._
 
 /**
@@ -37,27 +38,45 @@ extends Silhouette[Login, CachedCookieAuthenticator] {
    *
    * @return  OK / Failed
    */
-  def upload(id: String) = SecuredAction(parse.multipartFormData) { implicit request =>
-    val abstr = abstractService.getOwn(id, request.identity.account)
-    val tempfile = request.body.file("file").map {
-      figure => figure.ref
-    }.getOrElse {
-      throw new IllegalArgumentException("File is missing")
-    }
+  def upload(id: String) = SecuredAction.async(parse.multipartFormData) { implicit request =>
+    files {
+      val abstr = abstractService.getOwn(id, request.identity.account)
+      val tempfile = request.body.file("file").map {
+        figure => figure.ref
+      }.getOrElse {
+        throw new IllegalArgumentException("File is missing")
+      }
+
+      val jsfig = Json.parse(request.body.dataParts("figure")(0)).as[Figure]
 
-    val jsfig = Json.parse(request.body.dataParts("figure")(0)).as[Figure]
+      jsfig.position = abstr.figures.toList.map(_.position).reduceLeftOption(_ max _).getOrElse(0) + 1
 
-    jsfig.position = abstr.figures.toList.map(_.position).reduceLeftOption(_ max _).getOrElse(0) + 1
+      val figure = figureService.create(jsfig, tempfile, abstr, request.identity.account)
 
-    val figure = figureService.create(jsfig, tempfile, abstr, request.identity.account)
+      // the mobile figure and the derivatives are created in the background by a
+      // bounded worker pool, until then the original is served instead.
+      figureService.createVersions(jsfig)
 
-    // uploadMobile is not very perfomant so we move the task to the background
-    // since mobile figures are also nice to have but not essential.
-    val future = Future {
-      figureService.uploadMobile(jsfig, abstr, request.identity.account)
+      Created(figFormat.writes(figure))
     }
+  }
 
-    Created(figFormat.writes(figure))
+  /**
+   * Create the mobile versions and derivatives of all figures that have none,
+   * e.g. figures that were uploaded before derivatives were introduced.
+   * The figures are processed in the background. Site admins only.
+   *
+   * @return Accepted with the number of figures that are processed / Forbidden
+   */
+  def createMissingVersions = SecuredAction.async { implicit request =>
+    jdbc {
+      if (!request.identity.account.isAdmin) {
+        throw new IllegalAccessException("Need to be a site admin to create figure versions!")
+      }
+
+      val (count, _) = figureService.createMissingVersions()
+      Accepted(Json.obj("error" -> false, "figures" -> count))
+    }
   }
 
   /**
@@ -67,26 +86,43 @@ extends Silhouette[Login, CachedCookieAuthenticator] {
    *
    * @return  OK / Failed
    */
-  def list(id: String) = UserAwareAction { implicit request =>
-    Ok(JsArray(
-      for (fig <- asScalaSet(
-          abstractService.get(id).figures
-        ).toSeq
-      ) yield figFormat.writes(fig)
-    ))
+  def list(id: String) = UserAwareAction.async { implicit request =>
+    jdbc {
+      Ok(JsArray(
+        for (fig <- asScalaSet(
+            abstractService.get(id).figures
+          ).toSeq
+        ) yield figFormat.writes(fig)
+      ))
+    }
   }
 
   /**
    * Download figure file from the specified figure object (id).
+   * If a width is requested, the smallest derivative that is at least
+   * as wide is served in the preferred format the client accepts.
+   * Without a width or a fitting derivative the original is served.
+   * Conditional and range requests are supported, see FileResults.
    *
    * @param id  The id of the figure.
+   * @param w   The requested width in pixels (optional).
    *
-   * @return  OK / Failed
+   * @return  OK / Partial Content / Not Modified / Failed
    */
-  def download(id: String) = UserAwareAction { implicit request =>
-    Ok.sendFile(figureService.openFile(
-      figureService.get(id)
-    ))
+  def download(id: String, w: Option[Int]) = UserAwareAction.async { implicit request =>
+    files {
+      val figure = figureService.get(id)
+      val original = figureService.openFile(figure)
+
+      w match {
+        case Some(width) =>
+          val formats = ImageProcessor.derivativeFormats.filter(f => request.accepts(f.mimeType))
+          val file = figureService.openDerivative(figure, width, formats)
+          FileResults.serve(file, original, figure.hash, derived = true).withHeaders(VARY -> ACCEPT)
+        case None =>
+          FileResults.serve(original, original, figure.hash, derived = false)
+      }
+    }
   }
 
   /**
@@ -96,9 +132,11 @@ extends Silhouette[Login, CachedCookieAuthenticator] {
    *
    * @return  OK / Failed
    */
-  def delete(id: String) = SecuredAction { implicit request =>
-    figureService.delete(id, request.identity.account)
-    Ok(Json.obj("error" -> false))
+  def delete(id: String) = SecuredAction.async { implicit request =>
+    jdbc {
+      figureService.delete(id, request.identity.account)
+      Ok(Json.obj("error" -> false))
+    }
   }
 
   /**
@@ -109,17 +147,18 @@ extends Silhouette[Login, CachedCookieAuthenticator] {
    * @return  OK / Failed
    */
 
-  def updateFigure(id: String) = SecuredAction(parse.json) { implicit request =>
+  def updateFigure(id: String) = SecuredAction.async(parse.json) { implicit request =>
+    jdbc {
+      val figure = request.body.as[Figure]
+      val oldFig = figureService.get(figure.uuid)
 
-    val figure = request.body.as[Figure]
-    val oldFig = figureService.get(figure.uuid)
+      // get abstractID and position from database
+      figure.abstr = abstractService.getOwn(oldFig.abstr.uuid, request.identity.account)
+      figure.position = oldFig.position
 
-    // get abstractID and position from database
-    figure.abstr = abstractService.getOwn(oldFig.abstr.uuid, request.identity.account)
-    figure.position = oldFig.position
-
-    figureService.update(figure, request.identity.account)
-    Ok(Json.obj("error" -> false))
+      figureService.update(figure, request.identity.account)
+      Ok(Json.obj("error" -> false))
+    }
   }
 
   /**
@@ -127,11 +166,13 @@ extends Silhouette[Login, CachedCookieAuthenticator] {
     *
     * @param id  The id of the figure.
     *
-    * @return  OK / Failed
+    * @return  OK / Partial Content / Not Modified / Failed
     */
-  def downloadmobile(id: String) = UserAwareAction { implicit request =>
-    Ok.sendFile(figureService.openMobileFile(
-      figureService.get(id)
-    ))
+  def downloadmobile(id: String) = UserAwareAction.async { implicit request =>
+    files {
+      val figure = figureService.get(id)
+      FileResults.serve(figureService.openMobileFile(figure), figureService.openFile(figure),
+        figure.hash, derived = true)
+    }
   }
 }
@@ -0,0 +1,35 @@
+package controllers.api
+
+import com.mohiva.play.silhouette.contrib.services.CachedCookieAuthenticator
+import com.mohiva.play.silhouette.core.{Environment, Silhouette}
+import models._
+import org.apache.commons.codec.digest.DigestUtils
+import play.api.libs.json._
+
+/**
+ * Metadata controller.
+ * Provides metadata of the models, e.g. for input validation in the browser.
+ */
+class Metadata(implicit val env: Environment[Login, CachedCookieAuthenticator])
+  extends Silhouette[Login, CachedCookieAuthenticator] {
+
+  /**
+   * The limits only change with a new release, they are serialized once.
+   */
+  lazy val limitsBody = Json.stringify(Json.toJson(ModelMetadata.limits))
+  lazy val limitsETag = DigestUtils.md5Hex(limitsBody)
+
+  /**
+   * Maximum lengths of the text fields of all models.
+   *
+   * @return Ok with an object of the form {"Abstract": {"title": 300, ...}, ...}
+   */
+  def limits = UserAwareAction { implicit request =>
+    if (request.headers.get("If-None-Match").contains(limitsETag)) {
+      NotModified
+    } else {
+      Ok(limitsBody).as(JSON).withHeaders(ETAG -> limitsETag, CACHE_CONTROL -> "public, max-age=86400")
+    }
+  }
+
+}
@@ -0,0 +1,87 @@
+package controllers.api
+
+import com.mohiva.play.silhouette.contrib.services.CachedCookieAuthenticator
+import com.mohiva.play.silhouette.core.{Environment, Silhouette}
+import models._
+import play.api.libs.json._
+import plugins.{DBUtil, Histogram, QueryStats}
+import service.mail.MailOutbox
+import utils.BoundedExecutor
+
+import scala.collection.JavaConversions._
+
+/**
+ * Metrics controller.
+ * Provides runtime statistics of the application for site admins.
+ */
+class Metrics(implicit val env: Environment[Login, CachedCookieAuthenticator])
+  extends Silhouette[Login, CachedCookieAuthenticator] {
+
+  /**
+   * Statistics about entity managers, the JDBC connection pool,
+   * the background executors, the executed SQL statements by
+   * service method and per request and the mails in the outbox by state.
+   *
+   * @return Ok with the statistics as JSON.
+   */
+  def get = SecuredAction { implicit request =>
+
+    if (!request.identity.account.isAdmin) {
+      throw new IllegalAccessException("Need to be a site admin to obtain metrics!")
+    }
+
+    val db = DBUtil.instance
+    val em = db.emStatistics
+
+    val pool = db.poolStatistics.map { p =>
+      Json.obj(
+        "leased" -> p.leased,
+        "free" -> p.free,
+        "created" -> p.created,
+        "requested" -> p.requested,
+        "waitAvgMs" -> p.waitAvgMs
+      )
+    }.getOrElse(JsNull)
+
+    Ok(Json.obj(
+      "entityManagers" -> Json.obj(
+        "open" -> em.open,
+        "created" -> em.created,
+        "leaked" -> em.leaked,
+        "oldestMs" -> em.oldestMs
+      ),
+      "pool" -> pool,
+      "executors" -> JsObject(BoundedExecutor.all.map { executor =>
+        val e = executor.statistics
+        executor.name -> Json.obj(
+          "threads" -> e.threads,
+          "active" -> e.active,
+          "queued" -> e.queued,
+          "queueSize" -> e.queueSize,
+          "completed" -> e.completed,
+          "rejected" -> e.rejected
+        )
+      }),
+      "queries" -> JsObject(QueryStats.statistics.toSeq.sortBy(_._1).map { case (name, q) =>
+        name -> Json.obj(
+          "count" -> q.statements.count,
+          "rows" -> q.rows.get,
+          "statements" -> histogram(q.statements),
+          "durationMs" -> histogram(q.durationMs)
+        )
+      }),
+      "outbox" -> JsObject(MailOutbox().countByState.toSeq.sortBy(_._1).map { case (state, count) =>
+        state -> JsNumber(count)
+      })
+    ))
+  }
+
+  private def histogram(h: Histogram) : JsObject = {
+    Json.obj(
+      "mean" -> h.mean,
+      "max" -> h.max,
+      "buckets" -> JsObject(h.buckets.map { case (bound, count) => bound -> JsNumber(count) })
+    )
+  }
+
+}
@@ -61,6 +61,12 @@ class Abstract extends Model with Owned with Tagged {
   @ManyToMany
   @JoinTable(name = "abstract_favUsers")
   var favUsers:  JSet[Account] = new JTreeSet[Account]()
+  /**
+   * Number of favUsers. The column is only written by AbstractService.setFavourite,
+   * so merging a stale abstract can not overwrite the count.
+   */
+  @Column(insertable = false, updatable = false, columnDefinition = "INTEGER DEFAULT 0 NOT NULL")
+  var favCount: Int = _
   @OneToMany(mappedBy = "abstr", cascade = Array(CascadeType.ALL), orphanRemoval = true)
   var authors: JSet[Author] = new JTreeSet[Author]()
   @OneToMany(mappedBy = "abstr", cascade = Array(CascadeType.ALL), orphanRemoval = true)
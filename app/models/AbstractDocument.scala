@@ -0,0 +1,38 @@
+package models
+
+import javax.persistence.{Column, Convert, Entity}
+import models.util.DateTimeConverter
+import org.apache.commons.codec.digest.DigestUtils
+import org.joda.time.DateTime
+
+
+/**
+ * Read model of an accepted abstract: the serialized abstract with the
+ * fields needed to find and order it. Documents are written whenever the
+ * abstract, its figures or its conference change and removed when the
+ * abstract is no longer accepted. The uuid of a document is the uuid of
+ * the abstract.
+ */
+@Entity
+class AbstractDocument extends Model {
+
+  var conference: String = _
+
+  var sortId: Int = _
+  var title: String = _
+
+  @Convert(converter = classOf[DateTimeConverter])
+  var mtime: DateTime = _
+
+  @Column(length = 500000)
+  var json: String = _
+
+  /**
+   * Content hash of the json. Refreshes after changes of the conference
+   * rewrite the json without changing mtime, so the ETag is the hash.
+   */
+  @Column(length = 32)
+  var hash: String = _
+
+  def eTag = Option(hash).getOrElse(DigestUtils.md5Hex(json))
+}
@@ -20,6 +20,10 @@ class Banner extends Model {
   @Column(length=300)
   var bType: String = _
 
+  // content hash of the image file, used as ETag and version of the image URL
+  @Column(length=32)
+  var hash: String = _
+
   @ManyToOne
   var conference: Conference = _
 
@@ -102,6 +102,12 @@ class Conference extends Model with Owned with Tagged {
   var abstractMaxLength: Int = 2500
   var abstractMaxFigures: Int = 1
 
+  // incremented whenever an abstract of the conference, one of its figures or the
+  // conference itself changes, see ConferenceService.bumpAbstractsVersion; only
+  // written by that statement, so merging a stale copy cannot move it backwards
+  @Column(nullable = false, updatable = false)
+  var abstractsVersion: Long = 0
+
 
   def formatDuration : String = {
     if (startDate == null || endDate == null) {
@@ -127,6 +133,8 @@ class Conference extends Model with Owned with Tagged {
   }
 
   def eTag : String = DigestUtils.md5Hex(uuid + mtime.toString())
+  def abstractsETag(variant: String) : String =
+    DigestUtils.md5Hex(uuid + ":" + abstractsVersion + ":" + isPublished + ":" + variant)
   def touch (): Unit = {
     this.mtime = new DateTime(DateTimeZone.UTC)
   }
@@ -21,6 +21,10 @@ class Figure extends PositionedModel {
   @Column(length=300)
   var caption: String = _
 
+  // content hash of the image file, used as ETag and version of the image URL
+  @Column(length=32)
+  var hash: String = _
+
   @ManyToOne
   var abstr: Abstract = _
 
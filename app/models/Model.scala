@@ -12,7 +12,7 @@ package models
 import collection.JavaConversions.asJavaCollection
 import java.util.{Set => JSet, TreeSet => JTreeSet, UUID}
 import javax.persistence.{PrePersist, Id, MappedSuperclass}
-import scala.reflect.runtime.universe._
+import scala.reflect.{ClassTag, classTag}
 
 /**
  * Trait that defines stuff that is common for all models.
@@ -100,24 +100,17 @@ object Model {
     }
   }
 
-  def membersAnnotations[T: TypeTag]: Map[String, Map[String, Map[String, Any]]] = {
-    typeOf[T].members.withFilter {
-      _.annotations.length > 0
-    }.map { m =>
-      m.name.toString.trim -> m.annotations.map { a =>
-        a.tree.tpe.typeSymbol.name.toString.trim -> a.tree.children.withFilter {
-          _.productPrefix eq "AssignOrNamedArg"
-        }.map { tree =>
-          tree.productElement(0).toString.trim -> tree.productElement(1)
-        }.toMap
-      }.toMap
-    }.toMap
-  }
-
-  def getLimit[T :TypeTag](name: String): Int = {
-    membersAnnotations[T].get(name).flatMap(_.get("Column")).flatMap(_.get("length")).map {
-      x => x.asInstanceOf[Literal].value.value.asInstanceOf[Int]
-    }.getOrElse(255)
+  /**
+   * Get the maximum length of a text column of an entity.
+   *
+   * @param name The name of the field.
+   *
+   * @tparam T The entity class.
+   *
+   * @return The maximum length, see ModelMetadata.
+   */
+  def getLimit[T: ClassTag](name: String): Int = {
+    ModelMetadata.getLimit(classTag[T].runtimeClass, name)
   }
 
 }
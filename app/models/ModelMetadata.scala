@@ -0,0 +1,86 @@
+package models
+
+import java.io.File
+import java.net.JarURLConnection
+import javax.persistence.{Column, Entity}
+
+import scala.collection.JavaConversions._
+
+/**
+ * Metadata of the entity classes that is needed outside of the persistence
+ * layer, e.g. the maximum length of text columns for input validation.
+ * The metadata is read once from the JPA annotations of the entities and
+ * is immutable afterwards.
+ */
+object ModelMetadata {
+
+  /**
+   * The default length of a text column if none is given.
+   */
+  val DEFAULT_LENGTH = 255
+
+  /**
+   * All entity classes of the application: the classes of the package "models"
+   * that are annotated with @Entity, the same classes JPA manages since the
+   * persistence unit does not exclude unlisted classes.
+   */
+  val entities : Seq[Class[_]] = {
+    val loader = getClass.getClassLoader
+    val pkg = classOf[Model].getPackage.getName
+
+    classNames(loader, pkg).sorted.map { name =>
+      Class.forName(name, false, loader)
+    }.filter(_.isAnnotationPresent(classOf[Entity]))
+  }
+
+  /**
+   * The maximum length of all text columns by entity name and field name.
+   */
+  val limits : Map[String, Map[String, Int]] = entities.map { cls =>
+    cls.getSimpleName -> textColumns(cls)
+  }.toMap
+
+  /**
+   * Get the maximum length of a text column.
+   *
+   * @param cls  The entity class.
+   * @param name The name of the field.
+   *
+   * @return The maximum length or the default length if the field is unknown.
+   */
+  def getLimit(cls: Class[_], name: String) : Int = {
+    limits.get(cls.getSimpleName).flatMap(_.get(name)).getOrElse(DEFAULT_LENGTH)
+  }
+
+  /**
+   * The names of the top level classes of a package, from class directories and jars.
+   */
+  private def classNames(loader: ClassLoader, pkg: String) : Seq[String] = {
+    val path = pkg.replace('.', '/')
+
+    def className(file: String) : Option[String] = {
+      val name = file.stripSuffix(".class")
+      if (file.endsWith(".class") && !name.contains("$")) Some(pkg + "." + name) else None
+    }
+
+    loader.getResources(path).toList.flatMap { url =>
+      url.openConnection match {
+        case jar: JarURLConnection =>
+          jar.getJarFile.entries.toList.map(_.getName).filter { entry =>
+            entry.startsWith(path + "/") && !entry.substring(path.length + 1).contains("/")
+          }.flatMap(entry => className(entry.substring(path.length + 1)))
+        case _ =>
+          Option(new File(url.toURI).list).map(_.toList).getOrElse(Nil).flatMap(className)
+      }
+    }.distinct
+  }
+
+  private def textColumns(cls: Class[_]) : Map[String, Int] = {
+    Iterator.iterate[Class[_]](cls)(_.getSuperclass).takeWhile(_ != null).flatMap(_.getDeclaredFields).filter { field =>
+      field.getType == classOf[String]
+    }.map { field =>
+      field.getName -> Option(field.getAnnotation(classOf[Column])).map(_.length).getOrElse(DEFAULT_LENGTH)
+    }.toMap
+  }
+
+}
@@ -0,0 +1,77 @@
+package models
+
+import javax.persistence.{Cacheable, Column, Convert, Entity}
+import models.util.DateTimeConverter
+import org.joda.time.{DateTimeZone, DateTime}
+
+
+/**
+ * Model for a mail in the outbox. Mails are stored in the same transaction
+ * as the change that caused them and delivered by the MailSender plugin.
+ * Pending mails are retried with an exponential backoff until they are
+ * sent or given up (dead). Mails are claimed with bulk updates, so they
+ * are not kept in the shared cache. Mails whose body would contain a secret
+ * are stored without body and rendered by MailerService when they are sent.
+ */
+@Entity
+@Cacheable(false)
+class OutboxMail extends Model {
+
+  var subject: String = _
+  var sender: String = _
+
+  /**
+   * The recipients, separated by new lines.
+   */
+  @Column(length = 2500)
+  var recipients: String = _
+
+  @Column(length = 100000)
+  var bodyText: String = _
+
+  /**
+   * The kind of a mail that is rendered when it is sent, and the uuid of
+   * the entity it refers to. Null for mails with a stored body.
+   */
+  var template: String = _
+  var reference: String = _
+
+  var state: String = _
+  var attempts: Int = _
+
+  @Column(length = 2500)
+  var lastError: String = _
+
+  @Convert(converter = classOf[DateTimeConverter])
+  var ctime: DateTime = _
+  @Convert(converter = classOf[DateTimeConverter])
+  var nextAttempt: DateTime = _
+  @Convert(converter = classOf[DateTimeConverter])
+  var sentAt: DateTime = _
+
+  def recipientList : Seq[String] = recipients.split("\n").toSeq.filter(_.nonEmpty)
+}
+
+object OutboxMail {
+
+  val PENDING = "pending"
+  val SENT = "sent"
+  val DEAD = "dead"
+
+  def apply(subject: String, sender: String, recipients: Seq[String], bodyText: String) : OutboxMail = {
+
+    val mail = new OutboxMail()
+    val now = new DateTime(DateTimeZone.UTC)
+
+    mail.subject     = subject
+    mail.sender      = sender
+    mail.recipients  = recipients.mkString("\n")
+    mail.bodyText    = bodyText
+    mail.state       = PENDING
+    mail.attempts    = 0
+    mail.ctime       = now
+    mail.nextAttempt = now
+
+    mail
+  }
+}
@@ -0,0 +1,40 @@
+package models
+
+import javax.persistence.{Convert, Entity}
+import models.util.DateTimeConverter
+import org.joda.time.{DateTimeZone, DateTime}
+
+
+/**
+ * Model for a deleted abstract or figure. Tombstones let offline clients
+ * that synchronize changes since a point in time remove deleted entities.
+ * The uuid of a tombstone is the uuid of the deleted entity.
+ */
+@Entity
+class Tombstone extends Model {
+
+  var kind: String = _
+
+  var conference: String = _
+
+  @Convert(converter = classOf[DateTimeConverter])
+  var deleted: DateTime = _
+}
+
+object Tombstone {
+
+  val ABSTRACT = "abstract"
+  val FIGURE = "figure"
+
+  def apply(uuid: String, kind: String, conference: String) : Tombstone = {
+
+    val tombstone = new Tombstone()
+
+    tombstone.uuid       = uuid
+    tombstone.kind       = kind
+    tombstone.conference = conference
+    tombstone.deleted    = new DateTime(DateTimeZone.UTC)
+
+    tombstone
+  }
+}
@@ -1,35 +1,130 @@
 package plugins
 
+import java.util.concurrent.ConcurrentHashMap
+import java.util.concurrent.atomic.AtomicLong
 import javax.persistence.{EntityTransaction, EntityManager, Persistence}
 
+import com.jolbox.bonecp.BoneCPDataSource
 import play.api._
 import play.api.Logger._
+import play.api.db.DB
+
+import scala.collection.JavaConversions._
+
+/**
+ * Statistics about the entity managers handed out by DBUtil.
+ *
+ * @param open      Number of entity managers that are currently open.
+ * @param created   Number of entity managers created since start.
+ * @param leaked    Number of entity managers that were held longer than the leak threshold.
+ * @param oldestMs  Age in ms of the oldest entity manager that is currently open.
+ */
+case class EMStatistics(open: Int, created: Long, leaked: Long, oldestMs: Long)
+
+/**
+ * Statistics of the JDBC connection pool.
+ *
+ * @param leased     Number of connections in use.
+ * @param free       Number of idle connections.
+ * @param created    Number of connections created by the pool.
+ * @param requested  Number of connection requests.
+ * @param waitAvgMs  Average time in ms a request had to wait for a connection.
+ */
+case class PoolStatistics(leased: Int, free: Int, created: Int, requested: Long, waitAvgMs: Double)
 
 /**
  * Plugin that provides an configured entity manager factory and
- * thread local entity managers.
+ * scoped entity managers.
  */
 class DBUtil(implicit app: Application) extends Plugin {
 
   private lazy val emf = Persistence.createEntityManagerFactory(DBUtil.DEFAULT_UNIT)
 
+  private val leases = new ConcurrentHashMap[EntityManager, Long]()
+  private val created = new AtomicLong(0)
+  private val leaked = new AtomicLong(0)
+
+  /**
+   * Entity managers that are held longer than this (in ms) are reported as leaked.
+   */
+  val leakThreshold = app.configuration.getMilliseconds("db.em.leakThreshold").getOrElse(30000L)
+
   override def onStart(): Unit = {
     info("DBUtil: activating  plugin")
   }
 
 
   override def onStop(): Unit = {
+    if (!leases.isEmpty) {
+      warn(s"DBUtil: ${leases.size} entity managers still open on shutdown")
+    }
+
     emf.close()
     info("DBUtil: stopping  plugin")
   }
 
   /**
-   * Get a new entity manager.
+   * Get a new entity manager. Entity managers obtained by this method
+   * must be returned with releaseEM.
    *
    * @return A newly created entity manager.
    */
   def createEM : EntityManager = {
-    emf.createEntityManager()
+    val em = emf.createEntityManager()
+
+    created.incrementAndGet()
+    leases.put(em, System.currentTimeMillis())
+
+    em
+  }
+
+  /**
+   * Close an entity manager obtained by createEM.
+   *
+   * @param em The entity manager to close.
+   */
+  def releaseEM(em: EntityManager) : Unit = {
+    val since = leases.remove(em)
+
+    if (since != 0) {
+      val held = System.currentTimeMillis() - since
+      if (held > leakThreshold) {
+        leaked.incrementAndGet()
+        warn(s"DBUtil: entity manager was held for $held ms (threshold $leakThreshold ms)")
+      }
+    }
+
+    if (em.isOpen) {
+      em.close()
+    }
+  }
+
+  /**
+   * Statistics about the entity managers.
+   *
+   * @return The current entity manager statistics.
+   */
+  def emStatistics : EMStatistics = {
+    val now = System.currentTimeMillis()
+    val oldest = leases.values().foldLeft(now)((a, b) => math.min(a, b))
+
+    EMStatistics(leases.size, created.get, leaked.get, now - oldest)
+  }
+
+  /**
+   * Statistics of the JDBC connection pool of the default data source.
+   *
+   * @return The pool statistics or None if the data source is not a
+   *         BoneCP pool or the pool was not initialized yet.
+   */
+  def poolStatistics : Option[PoolStatistics] = {
+    DB.getDataSource("default") match {
+      case ds: BoneCPDataSource if ds.getPool != null =>
+        val stats = ds.getPool.getStatistics
+        Some(PoolStatistics(stats.getTotalLeased, stats.getTotalFree, stats.getTotalCreatedConnections,
+          stats.getConnectionsRequested, stats.getConnectionWaitTimeAvg))
+      case _ => None
+    }
   }
 
 }
@@ -50,16 +145,19 @@ object DBUtil {
 
   /**
    * Execute a function encapsulated in a JPA transaction. The called function
-   * will be provided with a thread local entity manager and the transaction object.
+   * will be provided with an entity manager and the transaction object.
+   * The entity manager is closed when the function returns. The statements
+   * executed by the function are recorded under the name of the calling method.
    *
    * @param func  The function to invoke
    *
    * @tparam A The return type of the function
    * @return The result of the invoked function
    */
-  def transaction[A](func : (EntityManager, EntityTransaction) => A) : A = {
+  def transaction[A](func : (EntityManager, EntityTransaction) => A) : A = QueryStats.metered(QueryStats.nameOf(func)) {
 
-    val em = instance.createEM
+    val plugin = instance
+    val em = plugin.createEM
     val tx = em.getTransaction
 
     try {
@@ -76,22 +174,31 @@ object DBUtil {
           tx.rollback()
         throw ex
 
+    } finally {
+      plugin.releaseEM(em)
     }
 
   }
 
   /**
-   * Executing a function while providing a thread local entity manager.
+   * Executing a function while providing an entity manager.
+   * The entity manager is closed when the function returns. The statements
+   * executed by the function are recorded under the name of the calling method.
    *
    * @param func  The function to invoke.
    *
    * @tparam A The return type of the
    * @return The result of the invoked function.
    */
-  def query[A](func : (EntityManager) => A) : A = {
-    func(instance.createEM)
+  def query[A](func : (EntityManager) => A) : A = QueryStats.metered(QueryStats.nameOf(func)) {
+    val plugin = instance
+    val em = plugin.createEM
+
+    try {
+      func(em)
+    } finally {
+      plugin.releaseEM(em)
+    }
   }
 
 }
-
-
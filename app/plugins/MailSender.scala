@@ -0,0 +1,172 @@
+package plugins
+
+import java.util.concurrent.{Executor, RejectedExecutionException}
+import java.util.concurrent.atomic.AtomicBoolean
+
+import akka.actor.Cancellable
+import models.OutboxMail
+import org.joda.time.{DateTimeZone, DateTime}
+import play.api.Logger._
+import play.api.libs.concurrent.Akka
+import play.api.libs.concurrent.Execution.Implicits.defaultContext
+import play.api.libs.mailer.{Email, MailerPlugin}
+import play.api.{Application, Play, Plugin}
+import service.mail.{MailOutbox, MailerService}
+import utils.BoundedExecutor
+
+import scala.concurrent.Future
+import scala.concurrent.duration._
+import scala.util.{Failure, Success, Try}
+
+/**
+ * Plugin that delivers the mails of the outbox in the background.
+ * Due mails are polled every "mail.outbox.interval" and whenever a mail is
+ * enqueued, and sent on the "mail" executor, so at most as many mails as it
+ * has threads are sent at the same time. A claimed mail that is not finished
+ * within "mail.outbox.lease" is sent again. Once per "mail.outbox.purgeInterval"
+ * sent and dead mails older than "mail.outbox.retention" are removed.
+ *
+ * The worker can be disabled with "mail.outbox.worker = false", mails then
+ * stay in the outbox until an instance with a worker picks them up.
+ */
+class MailSender(implicit app: Application) extends Plugin {
+
+  val interval = app.configuration.getMilliseconds("mail.outbox.interval").getOrElse(10000L)
+  val lease = app.configuration.getMilliseconds("mail.outbox.lease").getOrElse(300000L)
+  val purgeInterval = app.configuration.getMilliseconds("mail.outbox.purgeInterval").getOrElse(3600000L)
+
+  lazy val executor = BoundedExecutor("mail", 2, 100)
+  lazy val outbox = MailOutbox()
+  lazy val mailer = new MailerService
+
+  private val polling = new AtomicBoolean(false)
+  private var ticks: Seq[Cancellable] = Nil
+
+  override def enabled: Boolean = app.configuration.getBoolean("mail.outbox.worker").getOrElse(true)
+
+  override def onStart(): Unit = {
+    info("MailSender: activating plugin")
+    ticks = Seq(
+      Akka.system.scheduler.schedule(interval.millis, interval.millis) {
+        poll()
+      },
+      Akka.system.scheduler.schedule(purgeInterval.millis, purgeInterval.millis) {
+        purge()
+      })
+  }
+
+  override def onStop(): Unit = {
+    ticks.foreach(_.cancel())
+    info("MailSender: stopping plugin")
+  }
+
+  /**
+   * Claim due mails for the free threads of the executor and send them.
+   * Concurrent calls return immediately while a poll is running.
+   *
+   * @param sendOn The executor the mails are sent on.
+   *
+   * @return The number of claimed mails.
+   */
+  def poll(sendOn: Executor = executor) : Int = {
+    if (!polling.compareAndSet(false, true)) {
+      return 0
+    }
+
+    try {
+      val stats = executor.statistics
+      val free = stats.threads - stats.active - stats.queued
+
+      if (free <= 0) 0 else {
+        val claimed = outbox.listDue(free).filter { mail =>
+          outbox.claim(mail, new DateTime(DateTimeZone.UTC).plus(lease))
+        }
+
+        claimed.foreach { mail =>
+          try {
+            sendOn.execute(new Runnable {
+              override def run(): Unit = deliver(mail)
+            })
+          } catch {
+            case e: RejectedExecutionException =>
+              // the mail is due again when the lease expires
+              warn(s"MailSender: queue full, mail [${mail.uuid}] postponed")
+          }
+        }
+
+        claimed.size
+      }
+    } catch {
+      case e: Exception =>
+        error("MailSender: polling the outbox failed", e)
+        0
+    } finally {
+      polling.set(false)
+    }
+  }
+
+  /**
+   * Remove sent and dead mails older than the retention time of the outbox.
+   *
+   * @return The number of removed mails.
+   */
+  def purge() : Int = {
+    try {
+      val purged = outbox.purge(new DateTime(DateTimeZone.UTC).minus(outbox.retention))
+      if (purged > 0) {
+        info(s"MailSender: removed $purged sent and dead mails")
+      }
+      purged
+    } catch {
+      case e: Exception =>
+        error("MailSender: purging the outbox failed", e)
+        0
+    }
+  }
+
+  /**
+   * Send a claimed mail and record the outcome.
+   *
+   * @param mail The claimed mail.
+   */
+  def deliver(mail: OutboxMail) : Unit = {
+    Try {
+      MailerPlugin.send(Email(
+        subject = mail.subject,
+        from = mail.sender,
+        to = mail.recipientList,
+        bodyText = Option(mailer.render(mail))
+      ))
+    } match {
+      case Success(_) =>
+        outbox.markSent(mail.uuid)
+      case Failure(e) =>
+        outbox.markFailed(mail.uuid, e.toString).foreach { failed =>
+          if (failed.state == OutboxMail.DEAD) {
+            error(s"MailSender: giving up mail [${mail.uuid}] after ${failed.attempts} attempts", e)
+          } else {
+            warn(s"MailSender: sending mail [${mail.uuid}] failed, retry at ${failed.nextAttempt}: $e")
+          }
+        }
+    }
+  }
+
+}
+
+object MailSender {
+
+  /**
+   * Get the plugin instance if the worker is enabled.
+   */
+  def instance : Option[MailSender] = Play.maybeApplication.flatMap(_.plugin[MailSender])
+
+  /**
+   * Poll the outbox without waiting for the next interval, e.g. after a mail was enqueued.
+   */
+  def wake() : Unit = {
+    instance.foreach { sender =>
+      Future(sender.poll())
+    }
+  }
+
+}
@@ -0,0 +1,320 @@
+package plugins
+
+import java.util.Locale
+import java.util.concurrent.ConcurrentHashMap
+import java.util.concurrent.atomic.{AtomicLong, AtomicLongArray}
+
+import org.eclipse.persistence.sessions.{SessionEvent, SessionEventAdapter}
+import play.api.{Logger, Mode, Play}
+import play.api.libs.iteratee.Execution
+import play.api.mvc.{Filter, RequestHeader, Result}
+
+import scala.concurrent.Future
+
+/**
+ * Counts the SQL statements, rows and time spent in the database within
+ * a scope, e.g. a call to DBUtil.query or a request.
+ *
+ * @param name The name of the scope.
+ */
+class QueryScope(val name: String) {
+
+  val started = System.nanoTime()
+
+  var statements = 0
+  var rows = 0L
+  var sqlNanos = 0L
+
+  def add(other: QueryScope) : Unit = {
+    statements += other.statements
+    rows += other.rows
+    sqlNanos += other.sqlNanos
+  }
+
+  def sqlMs : Double = sqlNanos / 1e6
+
+  def elapsedMs : Double = (System.nanoTime() - started) / 1e6
+
+}
+
+/**
+ * A histogram with fixed bucket bounds. Values are counted in the first
+ * bucket whose bound is not smaller than the value, larger values in an
+ * overflow bucket.
+ *
+ * @param bounds The upper bounds of the buckets in ascending order.
+ */
+class Histogram(val bounds: Array[Long]) {
+
+  private val counts = new AtomicLongArray(bounds.length + 1)
+  private val total = new AtomicLong(0)
+  private val sum = new AtomicLong(0)
+  private val maximum = new AtomicLong(0)
+
+  def record(value: Long) : Unit = {
+    val i = bounds.indexWhere(value <= _)
+    counts.incrementAndGet(if (i < 0) bounds.length else i)
+    total.incrementAndGet()
+    sum.addAndGet(value)
+
+    var max = maximum.get
+    while (value > max && !maximum.compareAndSet(max, value)) {
+      max = maximum.get
+    }
+  }
+
+  def count : Long = total.get
+
+  def mean : Double = if (total.get == 0) 0.0 else sum.get.toDouble / total.get
+
+  def max : Long = maximum.get
+
+  /**
+   * The counts of all buckets by their upper bound, "+Inf" for the overflow bucket.
+   */
+  def buckets : Seq[(String, Long)] = {
+    (bounds.map(_.toString) :+ "+Inf").zipWithIndex.map { case (bound, i) => bound -> counts.get(i) }
+  }
+
+}
+
+/**
+ * Statistics of all scopes with the same name.
+ */
+class ScopeStatistics {
+
+  val statements = new Histogram(Array[Long](0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000))
+  val durationMs = new Histogram(Array[Long](1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000))
+  val rows = new AtomicLong(0)
+
+  def record(scope: QueryScope) : Unit = {
+    statements.record(scope.statements)
+    durationMs.record(math.round(scope.elapsedMs))
+    rows.addAndGet(scope.rows)
+  }
+
+}
+
+/**
+ * Session event listener that counts all calls EclipseLink executes against the
+ * database. It is registered with the "eclipselink.session-event-listener"
+ * property of the persistence units.
+ */
+class QueryStatsListener extends SessionEventAdapter {
+
+  override def preExecuteCall(event: SessionEvent) : Unit = {
+    QueryStats.callStarted()
+  }
+
+  override def postExecuteCall(event: SessionEvent) : Unit = {
+    val rows = event.getResult match {
+      case null => 0
+      case result: java.util.Collection[_] => result.size
+      case count: java.lang.Integer => count.intValue
+      case _ => 1
+    }
+
+    QueryStats.callFinished(rows)
+  }
+
+}
+
+/**
+ * Instrumentation of the database access. All statements are counted in the
+ * scopes that are open on the executing thread. DBUtil opens a scope for every
+ * query or transaction, named after the service method it was called from.
+ * While a request scope is open on the thread, e.g. for a block that BlockingIO
+ * runs for a request, the scopes are also summed up for the request and
+ * reported by the QueryStatsFilter. Work of background threads is only
+ * recorded by scope name.
+ */
+object QueryStats {
+
+  private val scopes = new ThreadLocal[List[QueryScope]] {
+    override def initialValue() = Nil
+  }
+
+  private val callStarts = new ThreadLocal[Long]
+
+  private val requests = new ThreadLocal[QueryScope]
+
+  private val names = new ConcurrentHashMap[Class[_], String]()
+
+  private val attached = new ConcurrentHashMap[java.lang.Long, QueryScope]()
+
+  private val anonfun = """^(?:\w+\.)*(\w+)\$+anonfun\$(\w+)\$.*""".r
+
+  /**
+   * Statistics by scope name.
+   */
+  val statistics = new ConcurrentHashMap[String, ScopeStatistics]()
+
+  /**
+   * Run a function in a new scope and record the statistics of the scope.
+   *
+   * @param name The name of the scope.
+   * @param func The function to run.
+   *
+   * @return The result of the function.
+   */
+  def metered[A](name: String)(func: => A) : A = {
+    val scope = new QueryScope(name)
+    val outer = scopes.get
+    scopes.set(scope :: outer)
+
+    try {
+      func
+    } finally {
+      scopes.set(outer)
+      record(scope)
+
+      if (outer.isEmpty) {
+        Option(requests.get).foreach(_.add(scope))
+      }
+    }
+  }
+
+  /**
+   * Get the name of the service method a function passed to DBUtil was defined in,
+   * e.g. "AbstractService.get" for a function defined in AbstractService.get.
+   *
+   * @param func The function.
+   *
+   * @return The name of the class and method of the function.
+   */
+  def nameOf(func: AnyRef) : String = {
+    val cls = func.getClass
+    Option(names.get(cls)).getOrElse {
+      val name = cls.getName match {
+        case anonfun(className, method) => className + "." + method
+        case other => other.substring(other.lastIndexOf('.') + 1)
+      }
+      names.put(cls, name)
+      name
+    }
+  }
+
+  /**
+   * Open a request scope on this thread. The scopes that finish on this thread
+   * are added to it until it is closed with takeRequest or attachTo.
+   */
+  def openRequest() : Unit = {
+    requests.set(new QueryScope("request"))
+  }
+
+  /**
+   * Close the request scope of this thread.
+   *
+   * @return The sum of the scopes that finished while it was open or None
+   *         if no request scope was open.
+   */
+  def takeRequest() : Option[QueryScope] = {
+    val request = Option(requests.get)
+    requests.remove()
+    request
+  }
+
+  /**
+   * Close the request scope of this thread and add it to a request. Used by
+   * work that runs for a request on another thread than the one that
+   * completes the result.
+   *
+   * @param id The id of the request.
+   */
+  def attachTo(id: Long) : Unit = {
+    takeRequest().foreach { scope =>
+      Option(attached.putIfAbsent(id, scope)).foreach { existing =>
+        existing.synchronized(existing.add(scope))
+      }
+    }
+  }
+
+  /**
+   * Take the statistics of a request: the request scopes attached to it.
+   *
+   * @param id The id of the request.
+   *
+   * @return The sum of the scopes or None if there were none.
+   */
+  def takeRequest(id: Long) : Option[QueryScope] = {
+    Option(attached.remove(id))
+  }
+
+  /**
+   * Record the statistics of a scope.
+   *
+   * @param scope The finished scope.
+   */
+  def record(scope: QueryScope) : Unit = {
+    Option(statistics.get(scope.name)).getOrElse {
+      statistics.putIfAbsent(scope.name, new ScopeStatistics())
+      statistics.get(scope.name)
+    }.record(scope)
+  }
+
+  private[plugins] def callStarted() : Unit = {
+    callStarts.set(System.nanoTime())
+  }
+
+  private[plugins] def callFinished(rows: Int) : Unit = {
+    val nanos = System.nanoTime() - callStarts.get
+    scopes.get.foreach { scope =>
+      scope.statements += 1
+      scope.rows += rows
+      scope.sqlNanos += nanos
+    }
+  }
+
+}
+
+/**
+ * Sums up the database statistics of each request, records them under "request"
+ * and returns them in a Server-Timing header. In dev mode requests that execute
+ * more statements than "db.queryBudget" are logged.
+ *
+ * A request scope is open while the filter calls the action, which covers work
+ * that actions do before they return their future. The blocks that actions
+ * run on the BlockingIO executors open their own request scopes and attach
+ * them to the request.
+ */
+object QueryStatsFilter extends Filter {
+
+  lazy val queryBudget = Play.current.configuration.getInt("db.queryBudget").getOrElse(50)
+
+  def apply(next: RequestHeader => Future[Result])(rh: RequestHeader) : Future[Result] = {
+    val started = System.nanoTime()
+
+    QueryStats.openRequest()
+    val nextResult = try {
+      next(rh)
+    } catch {
+      case e: Throwable =>
+        QueryStats.takeRequest()
+        QueryStats.takeRequest(rh.id)
+        throw e
+    }
+    QueryStats.attachTo(rh.id)
+
+    // failed requests are answered by Global.onError, drop their statistics
+    nextResult.onFailure { case _ =>
+      QueryStats.takeRequest(rh.id)
+    }(Execution.trampoline)
+
+    nextResult.map { result =>
+      val request = QueryStats.takeRequest(rh.id).getOrElse(new QueryScope("request"))
+      QueryStats.record(request)
+
+      if (request.statements > queryBudget && Play.maybeApplication.exists(_.mode == Mode.Dev)) {
+        Logger.warn(s"QueryStats: ${rh.method} ${rh.uri} executed ${request.statements} statements " +
+          s"(budget $queryBudget, ${request.rows} rows, ${ms(request.sqlMs)} ms)")
+      }
+
+      result.withHeaders("Server-Timing" ->
+        (s"""db;dur=${ms(request.sqlMs)};desc="${request.statements} statements, ${request.rows} rows", """ +
+          s"total;dur=${ms((System.nanoTime() - started) / 1e6)}"))
+    }(Execution.trampoline)
+  }
+
+  private def ms(value: Double) : String = "%.1f".formatLocal(Locale.ROOT, value)
+
+}
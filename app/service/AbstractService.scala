@@ -10,15 +10,22 @@
 package service
 
 import java.io.File
-import javax.persistence.{EntityNotFoundException, TypedQuery}
+import javax.persistence.{EntityManager, EntityNotFoundException, TypedQuery}
 
 import play.Play
+import org.apache.commons.codec.digest.DigestUtils
+import play.api.Logger
 import models._
 import plugins.DBUtil._
-import service.util.PermissionsBase
+import service.util.{CachedBody, ConferenceCache, PermissionsBase, SearchHit, SearchIndex}
+import play.api.libs.json.{JsValue, Json}
+import utils.DefaultRoutesResolver
+import utils.serializer.AbstractFormat
 
 import scala.collection.JavaConversions._
 import scala.collection.mutable.{Map => MMap}
+import scala.util.Try
+import scala.util.control.NonFatal
 
 import org.joda.time.{DateTimeZone, DateTime}
 
@@ -28,6 +35,56 @@ abstract class PatchOp
 case class PatchAddSortId(id: Int) extends PatchOp
 case class PatchAddDOI(doi: String) extends PatchOp
 
+//for bulk state changes
+case class StateChange(abstr: String, state: AbstractState.State, note: Option[String])
+
+//for delta synchronization of offline clients
+case class AbstractChanges(cursor: DateTime,
+                           conference: Option[Conference],
+                           abstracts: Seq[Abstract],
+                           removedAbstracts: Seq[String],
+                           removedFigures: Seq[String])
+
+//for keyset pagination of abstract lists
+case class PageKey(sortId: Int, uuid: String) {
+  override def toString = s"$sortId,$uuid"
+}
+
+object PageKey {
+
+  /**
+   * Parse a page key of the form "sortId,uuid".
+   *
+   * @throws IllegalArgumentException If the key is malformed.
+   */
+  def parse(key: String) : PageKey = {
+    key.split(",", 2) match {
+      case Array(sortId, uuid) if sortId.matches("-?\\d+") && uuid.nonEmpty => PageKey(sortId.toInt, uuid)
+      case _ => throw new IllegalArgumentException(s"Invalid page key: $key")
+    }
+  }
+}
+
+/**
+ * A page of abstracts. Abstracts in a page are transient objects that only
+ * have the requested fields set.
+ *
+ * @param abstracts The abstracts of the page.
+ * @param next      The key of the next page or None if this is the last page.
+ */
+case class AbstractPage(abstracts: Seq[Abstract], next: Option[PageKey])
+
+//for keyset pagination of the published abstract list, which is ordered by title within a sortId
+case class DocumentKey(sortId: Int, title: String, uuid: String)
+
+/**
+ * A page of documents of published abstracts.
+ *
+ * @param documents The documents of the page.
+ * @param next      The key of the next page or None if this is the last page.
+ */
+case class DocumentPage(documents: Seq[AbstractDocument], next: Option[DocumentKey])
+
 /**
  * Service class that provides data access logic for abstracts and nested
  * authors and affiliations.
@@ -57,10 +114,145 @@ class AbstractService(figPath: String) extends PermissionsBase {
       val query: TypedQuery[Abstract] = em.createQuery(queryStr, classOf[Abstract])
       query.setParameter("uuid", conference.uuid)
       query.setParameter("state", AbstractState.Accepted)
+      batchFetch(query, AbstractService.serializedRelations: _*)
       asScalaBuffer(query.getResultList)
     }
   }
 
+  /**
+   * List the changes of the published abstracts of a conference since a point in time:
+   * abstracts that were created or changed, abstracts that were deleted or are no longer
+   * published and deleted figures. Changed figures are part of their changed abstracts.
+   * If the conference is not published, all of its abstracts are reported as removed,
+   * so clients drop what they got while it was published.
+   *
+   * The returned cursor lies a bit before the time of the query, so that changes of
+   * transactions that were still running are not missed; clients may therefore get
+   * the same change twice.
+   *
+   * @param conference The conference.
+   * @param since      The cursor of the last synchronization or None to get everything.
+   *
+   * @return The changes and the cursor for the next synchronization.
+   */
+  def listChanges(conference: Conference, since: Option[DateTime]) : AbstractChanges = {
+    val cursor = new DateTime(DateTimeZone.UTC).minus(AbstractService.changesOverlap)
+
+    val changedConference = since match {
+      case Some(time) if conference.mtime != null && !conference.mtime.isAfter(time) => None
+      case _ => Some(conference)
+    }
+
+    if (!conference.isPublished) {
+      val (removedAbstracts, removedFigures) = since.map { time =>
+        query { em =>
+          val all: TypedQuery[String] = em.createQuery(
+            "SELECT a.uuid FROM Abstract a WHERE a.conference.uuid = :uuid", classOf[String])
+          all.setParameter("uuid", conference.uuid)
+
+          val (abstractTombstones, figureTombstones) = listTombstones(em, conference, time)
+          (asScalaBuffer(all.getResultList) ++ abstractTombstones, figureTombstones)
+        }
+      }.getOrElse((Seq.empty[String], Seq.empty[String]))
+
+      return AbstractChanges(cursor, changedConference, Seq.empty[Abstract], removedAbstracts, removedFigures)
+    }
+
+    query { em =>
+      val mtimeFilter = if (since.isDefined) "AND a.mtime > :since" else ""
+
+      val changed: TypedQuery[Abstract] = em.createQuery(
+        s"""SELECT DISTINCT a FROM Abstract a
+           LEFT JOIN FETCH a.conference c
+           WHERE c.uuid = :uuid AND a.state = :state $mtimeFilter
+           ORDER BY a.sortId, a.title""", classOf[Abstract])
+      changed.setParameter("uuid", conference.uuid)
+      batchFetch(changed, AbstractService.serializedRelations: _*)
+      changed.setParameter("state", AbstractState.Accepted)
+
+      since match {
+        case Some(time) =>
+          changed.setParameter("since", time)
+
+          val withdrawn: TypedQuery[String] = em.createQuery(
+            """SELECT a.uuid FROM Abstract a
+               WHERE a.conference.uuid = :uuid AND a.state <> :state AND a.mtime > :since""", classOf[String])
+          withdrawn.setParameter("uuid", conference.uuid)
+          withdrawn.setParameter("state", AbstractState.Accepted)
+          withdrawn.setParameter("since", time)
+
+          val (abstractTombstones, figureTombstones) = listTombstones(em, conference, time)
+
+          AbstractChanges(cursor, changedConference, asScalaBuffer(changed.getResultList),
+            asScalaBuffer(withdrawn.getResultList) ++ abstractTombstones, figureTombstones)
+
+        case None =>
+          AbstractChanges(cursor, changedConference, asScalaBuffer(changed.getResultList),
+            Seq.empty[String], Seq.empty[String])
+      }
+    }
+  }
+
+  /**
+   * The uuids of the abstracts and figures of a conference deleted since a point in time.
+   */
+  private def listTombstones(em: EntityManager, conference: Conference, since: DateTime) : (Seq[String], Seq[String]) = {
+    val deleted: TypedQuery[Tombstone] = em.createQuery(
+      """SELECT t FROM Tombstone t
+         WHERE t.conference = :uuid AND t.deleted > :since""", classOf[Tombstone])
+    deleted.setParameter("uuid", conference.uuid)
+    deleted.setParameter("since", since)
+
+    val (abstractTombstones, figureTombstones) = asScalaBuffer(deleted.getResultList).partition {
+      _.kind == Tombstone.ABSTRACT
+    }
+
+    (abstractTombstones.map(_.uuid), figureTombstones.map(_.uuid))
+  }
+
+  /**
+   * Search the published abstracts of a conference. Title, topic, text,
+   * authors and affiliations are searched, results are ranked by relevance.
+   * The search index of a conference is built from the documents of the
+   * abstracts on first use and dropped whenever an abstract of the
+   * conference changes. Hits carry the serialized abstracts, so writing
+   * them loads nothing.
+   *
+   * @param conference The conference to search in.
+   * @param q          The query string.
+   *
+   * @return The documents of all matching abstracts, best matches first.
+   */
+  def search(conference: Conference, q: String) : Seq[SearchHit[AbstractDocument]] = {
+
+    if(!conference.isPublished) {
+      return Seq.empty[SearchHit[AbstractDocument]]
+    }
+
+    val index = AbstractService.searchIndex.getOrElseUpdate(conference.uuid) {
+      val documents = listDocuments(conference)
+
+      (conference.uuid, SearchIndex(documents) { document =>
+        val abstr = Json.parse(document.json)
+
+        def text(json: JsValue, field: String) = (json \ field).asOpt[String]
+        def joined(json: JsValue, fields: String*) = fields.flatMap(text(json, _)).mkString(" ")
+
+        Seq("title" -> 3.0, "topic" -> 2.0, "text" -> 1.0).flatMap { case (field, weight) =>
+          text(abstr, field).map((_, weight))
+        } ++
+          (abstr \ "authors").asOpt[Seq[JsValue]].getOrElse(Nil).map { a =>
+            (joined(a, "firstName", "middleName", "lastName"), 2.0)
+          } ++
+          (abstr \ "affiliations").asOpt[Seq[JsValue]].getOrElse(Nil).map { a =>
+            (joined(a, "department", "section", "address", "country"), 1.0)
+          }
+      })
+    }
+
+    index.search(q)
+  }
+
   /**
   * List all abstracts (independent of the state) that belong to a conference.
   *
@@ -78,10 +270,56 @@ class AbstractService(figPath: String) extends PermissionsBase {
 
       val query: TypedQuery[Abstract] = em.createQuery(queryStr, classOf[Abstract])
       query.setParameter("uuid", conference.uuid)
+      batchFetch(query, AbstractService.serializedRelations: _*)
       asScalaBuffer(query.getResultList)
     }
   }
 
+  /**
+   * List a page of abstracts (independent of the state) that belong to a conference.
+   *
+   * @param conference The conference for which to list the abstracts.
+   * @param after      Only list abstracts after this key.
+   * @param limit      The maximum number of abstracts.
+   * @param fields     The fields to load, see AbstractService.pageFields.
+   *
+   * @return A page of abstracts ordered by sortId and uuid.
+   */
+  def listAllPage(conference: Conference, after: Option[PageKey], limit: Int,
+                  fields: Set[String]) : AbstractPage = {
+    listPage("", "c.uuid = :uuid", conference.uuid, after, limit, fields)
+  }
+
+  /**
+   * List a page of published and unpublished abstracts that belong to an account.
+   *
+   * @param account The account for which to list the abstracts.
+   * @param after   Only list abstracts after this key.
+   * @param limit   The maximum number of abstracts.
+   * @param fields  The fields to load, see AbstractService.pageFields.
+   *
+   * @return A page of abstracts ordered by sortId and uuid.
+   */
+  def listOwnPage(account: Account, after: Option[PageKey], limit: Int,
+                  fields: Set[String]) : AbstractPage = {
+    listPage("INNER JOIN a.owners o", "o.uuid = :uuid", account.uuid, after, limit, fields)
+  }
+
+  /**
+   * List a page of favourite abstracts of an account.
+   *
+   * @param account The account for which to list the abstracts.
+   * @param after   Only list abstracts after this key.
+   * @param limit   The maximum number of abstracts.
+   * @param fields  The fields to load, see AbstractService.pageFields.
+   *
+   * @return A page of abstracts ordered by sortId and uuid.
+   */
+  def listFavouritePage(account: Account, after: Option[PageKey], limit: Int,
+                        fields: Set[String]) : AbstractPage = {
+    listPage("INNER JOIN a.favUsers f", "f.uuid = :uuid", account.uuid, after, limit, fields)
+  }
+
   /**
    * List all published and unpublished abstracts that belong to an account.
    *
@@ -103,6 +341,7 @@ class AbstractService(figPath: String) extends PermissionsBase {
 
       val query: TypedQuery[Abstract] = em.createQuery(queryStr, classOf[Abstract])
       query.setParameter("uuid", account.uuid)
+      batchFetch(query, "a.authors.affiliations", "a.abstrTypes")
       asScalaBuffer(query.getResultList)
     }
   }
@@ -123,10 +362,72 @@ class AbstractService(figPath: String) extends PermissionsBase {
       val query: TypedQuery[Abstract] = em.createQuery(queryStr, classOf[Abstract])
       query.setParameter("ConfUuid", conference.uuid)
       query.setParameter("OwnerUuid", account.uuid)
+      batchFetch(query, "a.authors.affiliations", "a.abstrTypes")
       asScalaBuffer(query.getResultList)
     }
   }
 
+  /**
+   * List the conferences of all abstracts of an account together with a summary
+   * of each abstract, using a single query. Conferences only contain uuid, short,
+   * name, cite, isOpen and mtime, abstracts only uuid, sortId, title, state and mtime.
+   *
+   * @param account The account for which to list the abstracts.
+   *
+   * @return The conferences, latest first, with the abstracts of the account.
+   */
+  def listDashboard(account: Account) : Seq[(Conference, Seq[Abstract])] = {
+    query { em =>
+      val queryStr =
+        """SELECT c.uuid, c.short, c.name, c.cite, c.isOpen, c.mtime,
+                  a.uuid, a.sortId, a.title, a.state, a.mtime
+           FROM Abstract a
+           INNER JOIN a.conference c
+           INNER JOIN a.owners o
+           WHERE o.uuid = :uuid
+           ORDER BY c.startDate DESC, c.uuid, a.sortId, a.title"""
+
+      val query = em.createQuery(queryStr, classOf[Array[AnyRef]])
+      query.setParameter("uuid", account.uuid)
+
+      val rows = asScalaBuffer(query.getResultList).toList
+      val conferences = MMap.empty[String, Conference]
+
+      val abstracts = rows.map { row =>
+        val conference = conferences.getOrElseUpdate(row(0).asInstanceOf[String], {
+          val conf = new Conference()
+          conf.uuid = row(0).asInstanceOf[String]
+          conf.short = row(1).asInstanceOf[String]
+          conf.name = row(2).asInstanceOf[String]
+          conf.cite = row(3).asInstanceOf[String]
+          conf.isOpen = row(4) == java.lang.Boolean.TRUE
+          conf.mtime = row(5) match {
+            case t: DateTime => t
+            case t: java.util.Date => new DateTime(t.getTime, DateTimeZone.UTC)
+            case _ => null
+          }
+          conf
+        })
+
+        val abstr = new Abstract()
+        abstr.uuid = row(6).asInstanceOf[String]
+        abstr.sortId = row(7).asInstanceOf[Number].intValue
+        abstr.conference = conference
+        setColumn(abstr, "title", row(8))
+        setColumn(abstr, "state", row(9))
+        setColumn(abstr, "mtime", row(10))
+
+        abstr
+      }
+
+      // rows are ordered by conference, so grouping keeps the order
+      abstracts.foldRight(List.empty[(Conference, List[Abstract])]) {
+        case (abstr, (conf, list) :: rest) if conf eq abstr.conference => (conf, abstr :: list) :: rest
+        case (abstr, groups) => (abstr.conference, List(abstr)) :: groups
+      }
+    }
+  }
+
   /**
     * List all published and unpublished favourite abstracts that belong to an account.
     *
@@ -148,6 +449,7 @@ class AbstractService(figPath: String) extends PermissionsBase {
           ORDER BY a.sortId, a.title"""
       val query: TypedQuery[Abstract] = em.createQuery(queryStr, classOf[Abstract])
       query.setParameter("uuid", account.uuid)
+      batchFetch(query, "a.authors.affiliations", "a.abstrTypes")
       asScalaBuffer(query.getResultList)
     }
   }
@@ -168,6 +470,7 @@ class AbstractService(figPath: String) extends PermissionsBase {
       val query: TypedQuery[Abstract] = em.createQuery(queryStr, classOf[Abstract])
       query.setParameter("ConfUuid", conference.uuid)
       query.setParameter("FavUserUuid", account.uuid)
+      batchFetch(query, "a.authors.affiliations", "a.abstrTypes")
       asScalaBuffer(query.getResultList)
     }
   }
@@ -209,10 +512,166 @@ class AbstractService(figPath: String) extends PermissionsBase {
       val query: TypedQuery[Abstract] = em.createQuery(queryStr, classOf[Abstract])
       query.setParameter("uuid", id)
       query.setParameter("state", AbstractState.Accepted)
+      batchFetch(query, "a.authors.affiliations", "a.abstrTypes")
       query.getSingleResult
     }
   }
 
+  /**
+   * Return the read model of a published abstract by id. The serialized abstract
+   * is read from a single row; if the document is missing it is created from the
+   * abstract.
+   *
+   * @param id The id of the abstract.
+   *
+   * @return The document of the abstract.
+   *
+   * @throws NoResultException If there is no published abstract with the id.
+   */
+  def getDocument(id: String) : AbstractDocument = {
+    val document = query { em =>
+      val queryStr =
+        """SELECT d FROM AbstractDocument d, Conference c
+           WHERE d.uuid = :uuid AND c.uuid = d.conference AND c.isPublished = TRUE"""
+
+      val query: TypedQuery[AbstractDocument] = em.createQuery(queryStr, classOf[AbstractDocument])
+      query.setParameter("uuid", id)
+      asScalaBuffer(query.getResultList).headOption
+    }
+
+    document.getOrElse {
+      val abstr = get(id)
+      AbstractService.refreshDocuments(Seq(abstr.uuid))
+      AbstractService.makeDocument(abstr)
+    }
+  }
+
+  /**
+   * Return the read models of all published abstracts of a conference, ordered
+   * like the abstracts themselves. Missing documents are created first.
+   *
+   * @param conference The conference.
+   *
+   * @return The documents of all published abstracts.
+   */
+  def listDocuments(conference: Conference) : Seq[AbstractDocument] = {
+
+    if(!conference.isPublished) {
+      return Seq.empty[AbstractDocument]
+    }
+
+    createMissingDocuments(conference)
+
+    query { em =>
+      val queryStr =
+        """SELECT d FROM AbstractDocument d
+           WHERE d.conference = :uuid
+           ORDER BY d.sortId, d.title, d.uuid"""
+
+      val query: TypedQuery[AbstractDocument] = em.createQuery(queryStr, classOf[AbstractDocument])
+      query.setParameter("uuid", conference.uuid)
+      asScalaBuffer(query.getResultList)
+    }
+  }
+
+  /**
+   * Return a page of the read models of the published abstracts of a conference.
+   * Missing documents are created when the first page is requested.
+   *
+   * @param conference The conference.
+   * @param after      Only list documents after this key.
+   * @param limit      The maximum number of documents.
+   *
+   * @return A page of documents in the order of listDocuments.
+   */
+  def listDocumentPage(conference: Conference, after: Option[DocumentKey], limit: Int) : DocumentPage = {
+
+    if(!conference.isPublished) {
+      return DocumentPage(Nil, None)
+    }
+
+    if (after.isEmpty) {
+      createMissingDocuments(conference)
+    }
+
+    query { em =>
+      val keyset = after.map { _ =>
+        """AND (d.sortId > :sortId OR (d.sortId = :sortId AND
+             (d.title > :title OR (d.title = :title AND d.uuid > :after))))"""
+      }.getOrElse("")
+
+      val queryStr =
+        s"""SELECT d FROM AbstractDocument d
+            WHERE d.conference = :uuid $keyset
+            ORDER BY d.sortId, d.title, d.uuid"""
+
+      val query: TypedQuery[AbstractDocument] = em.createQuery(queryStr, classOf[AbstractDocument])
+      query.setParameter("uuid", conference.uuid)
+      after.foreach { key =>
+        query.setParameter("sortId", key.sortId)
+        query.setParameter("title", key.title)
+        query.setParameter("after", key.uuid)
+      }
+      query.setMaxResults(limit + 1)
+
+      val documents = asScalaBuffer(query.getResultList).toList
+      val next = if (documents.size > limit) {
+        documents.take(limit).lastOption.map(d => DocumentKey(d.sortId, d.title, d.uuid))
+      } else {
+        None
+      }
+
+      DocumentPage(documents.take(limit), next)
+    }
+  }
+
+  /**
+   * The ETags of all abstracts that belong to an account, in the order of
+   * listOwnPage. Only the uuid and mtime of the abstracts are loaded.
+   *
+   * @param account The account.
+   *
+   * @return The ETags of the abstracts.
+   */
+  def listOwnETags(account: Account) : Seq[String] = {
+    query { em =>
+      val queryStr =
+        """SELECT a.uuid, a.mtime FROM Abstract a
+           INNER JOIN a.owners o
+           WHERE o.uuid = :uuid
+           ORDER BY a.sortId, a.uuid"""
+
+      val query = em.createQuery(queryStr, classOf[Array[AnyRef]])
+      query.setParameter("uuid", account.uuid)
+
+      asScalaBuffer(query.getResultList).map { row =>
+        val abstr = new Abstract()
+        abstr.uuid = row(0).asInstanceOf[String]
+        setColumn(abstr, "mtime", row(1))
+        abstr.eTag
+      }
+    }
+  }
+
+  /**
+   * Create the read models of accepted abstracts of a conference that have none yet.
+   */
+  private def createMissingDocuments(conference: Conference) : Unit = {
+    val missing = query { em =>
+      val queryStr =
+        """SELECT a.uuid FROM Abstract a
+           WHERE a.conference.uuid = :uuid AND a.state = :state AND NOT EXISTS (
+             SELECT d.uuid FROM AbstractDocument d WHERE d.uuid = a.uuid)"""
+
+      val query: TypedQuery[String] = em.createQuery(queryStr, classOf[String])
+      query.setParameter("uuid", conference.uuid)
+      query.setParameter("state", AbstractState.Accepted)
+      asScalaBuffer(query.getResultList).toList
+    }
+
+    AbstractService.refreshDocuments(missing)
+  }
+
   /**
    * Return an abstract with a certain id, that is accessible for an account.
    * The abstract doesnt need to be published if the account has appropriate
@@ -250,6 +709,7 @@ class AbstractService(figPath: String) extends PermissionsBase {
 
       val query: TypedQuery[Abstract] = em.createQuery(queryStr, classOf[Abstract])
       query.setParameter("uuid", id)
+      batchFetch(query, "a.authors.affiliations", "a.abstrTypes")
       val abstr = query.getSingleResult
 
       if (!(abstr.isOwner(account) || abstr.conference.isOwner(account) || account.isAdmin))
@@ -293,6 +753,7 @@ class AbstractService(figPath: String) extends PermissionsBase {
         throw new EntityNotFoundException("Unable to find account with uuid = " + account.uuid)
       val query: TypedQuery[Abstract] = em.createQuery(queryStr, classOf[Abstract])
       query.setParameter("uuid", id)
+      batchFetch(query, "a.authors.affiliations", "a.abstrTypes")
       val abstr = query.getSingleResult
       abstr
     }
@@ -311,7 +772,11 @@ class AbstractService(figPath: String) extends PermissionsBase {
       val objChecked = em.find(obj.getClass, obj.uuid)
       if (objChecked == null)
         throw new EntityNotFoundException("Unable to find conference with uuid = " + obj.uuid)
-      objChecked.favUsers.toList
+
+      val query = em.createQuery(
+        """SELECT f FROM Abstract a INNER JOIN a.favUsers f WHERE a.uuid = :uuid""", classOf[Account])
+      query.setParameter("uuid", obj.uuid)
+      asScalaBuffer(query.getResultList).toList
     }
   }
 
@@ -352,9 +817,13 @@ class AbstractService(figPath: String) extends PermissionsBase {
 
       abstr.ctime = new DateTime(DateTimeZone.UTC)
 
+      ConferenceService.bumpAbstractsVersion(em, conferenceChecked.uuid)
+
       em.merge(abstr)
     }
 
+    ConferenceCache.invalidate(conference.uuid)
+
     getOwn(abstrCreated.uuid, account)
   }
 
@@ -398,10 +867,13 @@ class AbstractService(figPath: String) extends PermissionsBase {
       }
 
       abstr.owners = abstrChecked.owners
+      abstr.favUsers = abstrChecked.favUsers
       abstr.conference = abstrChecked.conference
       abstr.figures = abstrChecked.figures
       abstr.ctime = abstrChecked.ctime
 
+      ConferenceService.bumpAbstractsVersion(em, abstrChecked.conference.uuid)
+
       val merged = em.merge(abstr)
 
       abstrChecked.authors.foreach { author =>
@@ -422,6 +894,8 @@ class AbstractService(figPath: String) extends PermissionsBase {
       merged
     }
 
+    AbstractService.afterCommit(abstrUpdated.conference.uuid, Seq(abstrUpdated.uuid))
+
     getOwn(abstrUpdated.uuid, account)
   }
 
@@ -434,23 +908,11 @@ class AbstractService(figPath: String) extends PermissionsBase {
     * @return The updated and persisted abstract.
     */
   def addFavUser(abstr : Abstract, account: Account) : Abstract = {
-    val abstrUpdated = transaction { (em, tx) =>
-      if (abstr.uuid == null)
-        throw new IllegalArgumentException("Unable to update an abstract with null uuid")
-
-      val abstrChecked = em.find(classOf[Abstract], abstr.uuid)
-      if (abstrChecked == null)
-        throw new EntityNotFoundException("Unable to find abstract with uuid = " + abstr.uuid)
-
-      val accountChecked = em.find(classOf[Account], account.uuid)
-      if (accountChecked == null)
-        throw new EntityNotFoundException("Unable to find account with uuid = " + account.uuid)
+    if (abstr.uuid == null)
+      throw new IllegalArgumentException("Unable to update an abstract with null uuid")
 
-      abstr.favUsers.add(account)
-      val merged = em.merge(abstr)
-      merged
-    }
-    get(abstrUpdated.uuid)
+    setFavourite(abstr.uuid, account, favourite = true)
+    get(abstr.uuid)
   }
 
   /**
@@ -461,24 +923,104 @@ class AbstractService(figPath: String) extends PermissionsBase {
     * @return The updated and persisted abstract.
     */
   def removeFavUser(abstr : Abstract, account: Account) : Abstract = {
-    val abstrUpdated = transaction { (em, tx) =>
+    if (abstr.uuid == null)
+      throw new IllegalArgumentException("Unable to update an abstract with null uuid")
 
-      if (abstr.uuid == null)
-        throw new IllegalArgumentException("Unable to update an abstract with null uuid")
-
-      val abstrChecked = em.find(classOf[Abstract], abstr.uuid)
-      if (abstrChecked == null)
-        throw new EntityNotFoundException("Unable to find abstract with uuid = " + abstr.uuid)
+    setFavourite(abstr.uuid, account, favourite = false)
+    get(abstr.uuid)
+  }
 
+  /**
+   * Add or remove an account from the favourite users of an abstract.
+   * Only the row of the join table is inserted or deleted and the favourite
+   * count of the abstract is updated, the abstract itself is not loaded.
+   * The abstract row is locked first, so concurrent toggles keep the count exact.
+   *
+   * @param id        The id of the abstract.
+   * @param account   The account that likes or no longer likes the abstract.
+   * @param favourite True to add the account, false to remove it.
+   *
+   * @return The new number of favourite users of the abstract.
+   * @throws EntityNotFoundException If the abstract or the account does not exist.
+   */
+  def setFavourite(id: String, account: Account, favourite: Boolean) : Int = {
+    val count = transaction { (em, tx) =>
       val accountChecked = em.find(classOf[Account], account.uuid)
       if (accountChecked == null)
         throw new EntityNotFoundException("Unable to find account with uuid = " + account.uuid)
 
-      abstr.favUsers.remove(account)
-      val merged = em.merge(abstr)
-      merged
+      val locked = em.createNativeQuery("UPDATE abstract SET favcount = favcount WHERE uuid = ?1")
+        .setParameter(1, id)
+        .executeUpdate()
+      if (locked == 0)
+        throw new EntityNotFoundException("Unable to find abstract with uuid = " + id)
+
+      val exists = em.createQuery(
+        """SELECT COUNT(f) FROM Abstract a INNER JOIN a.favUsers f
+           WHERE a.uuid = :uuid AND f.uuid = :account""", classOf[java.lang.Long])
+        .setParameter("uuid", id)
+        .setParameter("account", account.uuid)
+        .getSingleResult > 0
+
+      if (favourite && !exists) {
+        em.createNativeQuery("INSERT INTO abstract_favusers (favabstracts_uuid, favusers_uuid) VALUES (?1, ?2)")
+          .setParameter(1, id)
+          .setParameter(2, account.uuid)
+          .executeUpdate()
+      } else if (!favourite && exists) {
+        em.createNativeQuery("DELETE FROM abstract_favusers WHERE favabstracts_uuid = ?1 AND favusers_uuid = ?2")
+          .setParameter(1, id)
+          .setParameter(2, account.uuid)
+          .executeUpdate()
+      }
+
+      em.createNativeQuery(
+        """UPDATE abstract SET favcount =
+             (SELECT COUNT(*) FROM abstract_favusers f WHERE f.favabstracts_uuid = ?1)
+           WHERE uuid = ?1""")
+        .setParameter(1, id)
+        .executeUpdate()
+
+      em.createQuery("SELECT a.favCount FROM Abstract a WHERE a.uuid = :uuid", classOf[Integer])
+        .setParameter("uuid", id)
+        .getSingleResult.intValue
+    }
+
+    // the native statements bypass the shared cache, evict after the commit
+    query { em =>
+      val cache = em.getEntityManagerFactory.getCache
+      cache.evict(classOf[Abstract], id)
+      cache.evict(classOf[Account], account.uuid)
+    }
+
+    count
+  }
+
+  /**
+   * Get the number of favourite users of all published abstracts of a
+   * conference with a single query.
+   *
+   * @param conference The conference.
+   *
+   * @return The favourite counts by abstract uuid.
+   */
+  def favCounts(conference: Conference) : Map[String, Int] = {
+
+    if(!conference.isPublished) {
+      return Map.empty[String, Int]
+    }
+
+    query { em =>
+      val query = em.createQuery(
+        """SELECT a.uuid, a.favCount FROM Abstract a
+           WHERE a.conference.uuid = :uuid AND a.state = :state""", classOf[Array[AnyRef]])
+      query.setParameter("uuid", conference.uuid)
+      query.setParameter("state", AbstractState.Accepted)
+
+      asScalaBuffer(query.getResultList).map { row =>
+        row(0).asInstanceOf[String] -> row(1).asInstanceOf[Number].intValue
+      }.toMap
     }
-    get(abstrUpdated.uuid)
   }
 
   /**
@@ -492,7 +1034,7 @@ class AbstractService(figPath: String) extends PermissionsBase {
    * @throws IllegalAccessException If account is not an owner.
    */
   def delete(id: String, account: Account) : Unit = {
-    transaction { (em, tx) =>
+    val conferenceId = transaction { (em, tx) =>
 
       val accountChecked = em.find(classOf[Account], account.uuid)
       if (accountChecked == null)
@@ -516,13 +1058,24 @@ class AbstractService(figPath: String) extends PermissionsBase {
         }
       })
 
+      abstrChecked.figures.foreach { fig =>
+        em.persist(Tombstone(fig.uuid, Tombstone.FIGURE, abstrChecked.conference.uuid))
+      }
+      em.persist(Tombstone(abstrChecked.uuid, Tombstone.ABSTRACT, abstrChecked.conference.uuid))
+
       abstrChecked.figures.foreach(em.remove(_))
       abstrChecked.authors.foreach(em.remove(_))
       abstrChecked.affiliations.foreach(em.remove(_))
       abstrChecked.references.foreach(em.remove(_))
 
       em.remove(abstrChecked)
+
+      ConferenceService.bumpAbstractsVersion(em, abstrChecked.conference.uuid)
+
+      abstrChecked.conference.uuid
     }
+
+    AbstractService.afterCommit(conferenceId, Seq(id))
   }
 
   /**
@@ -554,31 +1107,435 @@ class AbstractService(figPath: String) extends PermissionsBase {
     }
   }
 
+  /**
+   * Change the state of an abstract. The transition is checked against the
+   * stored state of the abstract, see checkStateChange.
+   *
+   * @param abstr   The abstract.
+   * @param state   The new state.
+   * @param editor  The account that changes the state.
+   * @param message An optional note for the state log.
+   *
+   * @return The state log of the abstract, newest first.
+   *
+   * @throws EntityNotFoundException If the abstract does not exist.
+   * @throws IllegalAccessException If the account may not change the state.
+   */
   def setState(abstr: Abstract, state: AbstractState.State, editor: Account, message: Option[String]) = {
-    transaction { (em, tx) =>
+    val (conferenceId, stateLog) = transaction { (em, tx) =>
+
+      val abstrChecked = em.find(classOf[Abstract], abstr.uuid)
+      if (abstrChecked == null)
+        throw new EntityNotFoundException("Unable to find abstract with uuid = " + abstr.uuid)
+
+      checkStateChange(abstrChecked, state, editor)
+
+      abstrChecked.state = state
+      abstrChecked.touch()
+
+      val log = em.merge(StateLogEntry(abstrChecked, state, editor, message))
+      abstrChecked.stateLog.add(log)
 
-      val abstrMerged = em.merge(abstr)
-      abstrMerged.state = state
-      abstrMerged.touch()
+      ConferenceService.bumpAbstractsVersion(em, abstrChecked.conference.uuid)
 
-      val log = em.merge(StateLogEntry(abstrMerged, state, editor, message))
-      abstrMerged.stateLog.add(log)
+      (abstrChecked.conference.uuid,
+        abstrChecked.stateLog.toSeq.sortWith (_.timestamp.getMillis > _.timestamp.getMillis))
+    }
+
+    AbstractService.afterCommit(conferenceId, Seq(abstr.uuid))
+
+    stateLog
+  }
+
+  /**
+   * Patch the admin fields of an abstract, see checkPatch.
+   *
+   * @param abstr   The abstract.
+   * @param patches The patches.
+   * @param account The account that patches the abstract.
+   *
+   * @return The patched abstract.
+   *
+   * @throws EntityNotFoundException If the abstract does not exist.
+   * @throws IllegalAccessException If the account may not patch the abstract.
+   */
+  def patch(abstr: Abstract, patches: List[PatchOp], account: Account) = {
+    val patched = transaction { (em, tx) =>
+
+      val abstrChecked = em.find(classOf[Abstract], abstr.uuid)
+      if (abstrChecked == null)
+        throw new EntityNotFoundException("Unable to find abstract with uuid = " + abstr.uuid)
+
+      checkPatch(abstrChecked, account)
+      applyPatches(abstrChecked, patches)
 
-      abstrMerged.stateLog.toSeq.sortWith (_.timestamp.getMillis > _.timestamp.getMillis)
+      abstrChecked.touch()
+      ConferenceService.bumpAbstractsVersion(em, abstrChecked.conference.uuid)
+      abstrChecked
     }
+
+    AbstractService.afterCommit(patched.conference.uuid, Seq(patched.uuid))
+
+    patched
   }
 
-  def patch(abstr: Abstract, patches: List[PatchOp]) = {
-    transaction { (em, tx) =>
+  /**
+   * Check whether an account may change the state of an abstract.
+   * Conference owners and admins may use the admin transitions, owners
+   * of the abstract the transitions that depend on whether the conference
+   * is open.
+   *
+   * @param abstr   The abstract.
+   * @param toState The new state.
+   * @param account The account that changes the state.
+   *
+   * @throws IllegalAccessException If the account may not change the state.
+   */
+  private def checkStateChange(abstr: Abstract, toState: AbstractState.State, account: Account) : Unit = {
+    val conference = abstr.conference
+    val fromState = abstr.state
 
-      patches.foreach {
-        case PatchAddSortId(id: Int) => abstr.sortId = id
-        case PatchAddDOI(doi: String) => abstr.doi = doi
-        case _ => throw new IllegalArgumentException("Invalid value to patch")
+    val isAdmin = account.isAdmin || conference.owners.contains(account)
+    val isOwner = abstr.isOwner(account)
+
+    val canTransitionAdmin = isAdmin && fromState.canTransitionTo(toState, isAdmin=true, conference.isOpen)
+    val canTransitionOwner = isOwner && fromState.canTransitionTo(toState, isAdmin=false, conference.isOpen)
+
+    if (!(canTransitionAdmin || canTransitionOwner)) {
+      throw new IllegalAccessException(s"No permission to set state to $toState")
+    }
+  }
+
+  /**
+   * Check whether an account may patch an abstract; patching is only
+   * for fields which require admin access, such as sortId + doi.
+   *
+   * @param abstr   The abstract.
+   * @param account The account that patches the abstract.
+   *
+   * @throws IllegalAccessException If the account may not patch the abstract.
+   */
+  private def checkPatch(abstr: Abstract, account: Account) : Unit = {
+    if (!(account.isAdmin || abstr.conference.owners.contains(account))) {
+      throw new IllegalAccessException(s"No permission to patch the abstract")
+    }
+  }
+
+  /**
+   * Change the state of many abstracts of a conference in a single transaction.
+   * Every change is checked like a single state change; changes that fail do not
+   * prevent the other changes.
+   *
+   * @param conference The uuid of the conference.
+   * @param changes    The state changes.
+   * @param editor     The account that changes the states.
+   *
+   * @return The result of every change: the changed abstract or the failure.
+   *
+   * @throws EntityNotFoundException If the conference does not exist.
+   */
+  def setStates(conference: String, changes: Seq[StateChange], editor: Account) : Seq[(String, Try[Abstract])] = {
+    bulk(conference, changes.map(_.abstr)) { (em, abstracts) =>
+      changes.map { change =>
+        change.abstr -> Try {
+          val abstr = abstracts.getOrElse(change.abstr,
+            throw new EntityNotFoundException("Unable to find abstract with uuid = " + change.abstr))
+
+          checkStateChange(abstr, change.state, editor)
+
+          abstr.state = change.state
+          abstr.touch()
+
+          val log = StateLogEntry(abstr, change.state, editor, change.note)
+          em.persist(log)
+          abstr.stateLog.add(log)
+
+          abstr
+        }
       }
+    }
+  }
 
-      abstr.touch()
-      em.merge(abstr)
+  /**
+   * Patch many abstracts of a conference in a single transaction.
+   * Every patch is checked like a single patch; patches that fail do not
+   * prevent the other patches.
+   *
+   * @param conference The uuid of the conference.
+   * @param patches    The patches by abstract uuid.
+   * @param account    The account that patches the abstracts.
+   *
+   * @return The result of every patch: the patched abstract or the failure.
+   *
+   * @throws EntityNotFoundException If the conference does not exist.
+   */
+  def patchAll(conference: String, patches: Seq[(String, List[PatchOp])], account: Account) : Seq[(String, Try[Abstract])] = {
+    bulk(conference, patches.map(_._1)) { (em, abstracts) =>
+      patches.map { case (id, ops) =>
+        id -> Try {
+          val abstr = abstracts.getOrElse(id,
+            throw new EntityNotFoundException("Unable to find abstract with uuid = " + id))
+
+          checkPatch(abstr, account)
+          applyPatches(abstr, ops)
+          abstr.touch()
+
+          abstr
+        }
+      }
+    }
+  }
+
+  private def applyPatches(abstr: Abstract, patches: List[PatchOp]) : Unit = {
+    patches.foreach {
+      case PatchAddSortId(id: Int) => abstr.sortId = id
+      case PatchAddDOI(doi: String) => abstr.doi = doi
+      case _ => throw new IllegalArgumentException("Invalid value to patch")
+    }
+  }
+
+  /**
+   * Load the abstracts of a conference that are changed by a bulk operation
+   * with two queries and apply the changes in one transaction. The changes are
+   * written in JDBC batches when the transaction is committed.
+   */
+  private def bulk(conference: String, ids: Seq[String])
+                  (func: (EntityManager, Map[String, Abstract]) => Seq[(String, Try[Abstract])]) : Seq[(String, Try[Abstract])] = {
+
+    if (ids.size > AbstractService.maxBulkSize)
+      throw new IllegalArgumentException(s"At most ${AbstractService.maxBulkSize} abstracts can be changed at once")
+
+    val results = transaction { (em, tx) =>
+      val conferenceChecked = em.find(classOf[Conference], conference)
+      if (conferenceChecked == null)
+        throw new EntityNotFoundException("Unable to find conference with uuid = " + conference)
+
+      val abstracts = if (ids.isEmpty) {
+        Map.empty[String, Abstract]
+      } else {
+        val queryStr =
+          """SELECT DISTINCT a FROM Abstract a
+             LEFT JOIN FETCH a.owners
+             WHERE a.conference.uuid = :conference AND a.uuid IN :uuids"""
+
+        val query = em.createQuery(queryStr, classOf[Abstract])
+        query.setParameter("conference", conference)
+        query.setParameter("uuids", asJavaCollection(ids.distinct))
+        batchFetch(query, ("a.stateLog" +: AbstractService.serializedRelations): _*)
+
+        query.getResultList.map(a => a.uuid -> a).toMap
+      }
+
+      val results = func(em, abstracts)
+
+      if (results.exists(_._2.isSuccess))
+        ConferenceService.bumpAbstractsVersion(em, conference)
+
+      results
+    }
+
+    AbstractService.afterCommit(conference, results.filter(_._2.isSuccess).map(_._1))
+
+    results
+  }
+
+  /**
+   * Load a page of abstracts using scalar queries, so that only the requested
+   * fields and relations are read and no cartesian products are built.
+   */
+  private def listPage(join: String, where: String, param: String, after: Option[PageKey],
+                       limit: Int, fields: Set[String]) : AbstractPage = {
+
+    if (limit < 1 || limit > AbstractService.maxPageSize)
+      throw new IllegalArgumentException(s"Page limit must be between 1 and ${AbstractService.maxPageSize}")
+
+    val unknown = fields -- AbstractService.pageFields
+    if (unknown.nonEmpty)
+      throw new IllegalArgumentException("Unknown fields: " + unknown.mkString(", "))
+
+    val columns = AbstractService.pageColumns.filter(fields.contains)
+
+    query { em =>
+      val keyset = after.map { _ =>
+        "AND (a.sortId > :sortId OR (a.sortId = :sortId AND a.uuid > :after))"
+      }.getOrElse("")
+
+      val queryStr =
+        s"""SELECT a.uuid, a.sortId, c.uuid ${columns.map(", a." + _).mkString}
+            FROM Abstract a
+            INNER JOIN a.conference c
+            $join
+            WHERE $where $keyset
+            ORDER BY a.sortId, a.uuid"""
+
+      val query = em.createQuery(queryStr, classOf[Array[AnyRef]])
+      query.setParameter("uuid", param)
+      after.foreach { key =>
+        query.setParameter("sortId", key.sortId)
+        query.setParameter("after", key.uuid)
+      }
+      query.setMaxResults(limit + 1)
+
+      val rows = asScalaBuffer(query.getResultList).toList
+
+      val abstracts = rows.take(limit).map { row =>
+        val abstr = new Abstract()
+        abstr.uuid = row(0).asInstanceOf[String]
+        abstr.sortId = row(1).asInstanceOf[Number].intValue
+        abstr.conference = new Conference()
+        abstr.conference.uuid = row(2).asInstanceOf[String]
+
+        columns.zipWithIndex.foreach { case (column, i) =>
+          setColumn(abstr, column, row(i + 3))
+        }
+
+        abstr
+      }
+
+      val byUuid = abstracts.map(a => a.uuid -> a).toMap
+      if (byUuid.nonEmpty) {
+        loadRelations(em, byUuid, fields)
+      }
+
+      val next = if (rows.size > limit) {
+        abstracts.lastOption.map(a => PageKey(a.sortId, a.uuid))
+      } else {
+        None
+      }
+
+      AbstractPage(abstracts, next)
+    }
+  }
+
+  /**
+   * Load lazy relations of the queried abstracts with one IN query per relation,
+   * so they can be used after the entity manager is closed.
+   */
+  private def batchFetch(query: TypedQuery[Abstract], paths: String*) : Unit = {
+    paths.foreach(query.setHint("eclipselink.batch", _))
+    query.setHint("eclipselink.batch.type", "IN")
+  }
+
+  private def setColumn(abstr: Abstract, column: String, value: AnyRef) : Unit = {
+    column match {
+      case "title" => abstr.title = value.asInstanceOf[String]
+      case "topic" => abstr.topic = value.asInstanceOf[String]
+      case "text" => abstr.text = value.asInstanceOf[String]
+      case "doi" => abstr.doi = value.asInstanceOf[String]
+      case "conflictOfInterest" => abstr.conflictOfInterest = value.asInstanceOf[String]
+      case "acknowledgements" => abstr.acknowledgements = value.asInstanceOf[String]
+      case "isTalk" => abstr.isTalk = value == java.lang.Boolean.TRUE
+      case "reasonForTalk" => abstr.reasonForTalk = value.asInstanceOf[String]
+      case "state" => abstr.state = value match {
+        case s: AbstractState.State => s
+        case s: String => AbstractState.withName(s)
+        case _ => null
+      }
+      case "mtime" => abstr.mtime = value match {
+        case t: DateTime => t
+        case t: java.util.Date => new DateTime(t.getTime, DateTimeZone.UTC)
+        case _ => null
+      }
+    }
+  }
+
+  private def loadRelations(em: EntityManager, abstracts: Map[String, Abstract], fields: Set[String]) : Unit = {
+
+    def rows(queryStr: String) : List[Array[AnyRef]] = {
+      val query = em.createQuery(queryStr, classOf[Array[AnyRef]])
+      query.setParameter("uuids", asJavaCollection(abstracts.keys))
+      asScalaBuffer(query.getResultList).toList
+    }
+
+    def str(v: AnyRef) = v.asInstanceOf[String]
+    def int(v: AnyRef) = v.asInstanceOf[Number].intValue
+
+    if (fields.contains("authors")) {
+      val affiliations = rows(
+        """SELECT au.uuid, af.uuid, af.position FROM Author au
+           INNER JOIN au.affiliations af
+           INNER JOIN au.abstr a
+           WHERE a.uuid IN :uuids""").groupBy(r => str(r(0)))
+
+      rows(
+        """SELECT a.uuid, au.uuid, au.mail, au.firstName, au.middleName, au.lastName, au.position
+           FROM Author au INNER JOIN au.abstr a
+           WHERE a.uuid IN :uuids""").foreach { r =>
+        val author = new Author()
+        author.uuid = str(r(1))
+        author.mail = str(r(2))
+        author.firstName = str(r(3))
+        author.middleName = str(r(4))
+        author.lastName = str(r(5))
+        author.position = int(r(6))
+
+        affiliations.getOrElse(author.uuid, Nil).foreach { af =>
+          val affiliation = new Affiliation()
+          affiliation.uuid = str(af(1))
+          affiliation.position = int(af(2))
+          author.affiliations.add(affiliation)
+        }
+
+        abstracts(str(r(0))).authors.add(author)
+      }
+    }
+
+    if (fields.contains("affiliations")) {
+      rows(
+        """SELECT a.uuid, af.uuid, af.address, af.country, af.department, af.section, af.position
+           FROM Affiliation af INNER JOIN af.abstr a
+           WHERE a.uuid IN :uuids""").foreach { r =>
+        val affiliation = new Affiliation()
+        affiliation.uuid = str(r(1))
+        affiliation.address = str(r(2))
+        affiliation.country = str(r(3))
+        affiliation.department = str(r(4))
+        affiliation.section = str(r(5))
+        affiliation.position = int(r(6))
+        abstracts(str(r(0))).affiliations.add(affiliation)
+      }
+    }
+
+    if (fields.contains("references")) {
+      rows(
+        """SELECT a.uuid, r.uuid, r.text, r.link, r.doi, r.position
+           FROM Reference r INNER JOIN r.abstr a
+           WHERE a.uuid IN :uuids""").foreach { r =>
+        val reference = new Reference()
+        reference.uuid = str(r(1))
+        reference.text = str(r(2))
+        reference.link = str(r(3))
+        reference.doi = str(r(4))
+        reference.position = int(r(5))
+        abstracts(str(r(0))).references.add(reference)
+      }
+    }
+
+    if (fields.contains("figures")) {
+      rows(
+        """SELECT a.uuid, f.uuid, f.caption, f.position
+           FROM Figure f INNER JOIN f.abstr a
+           WHERE a.uuid IN :uuids""").foreach { r =>
+        val figure = new Figure()
+        figure.uuid = str(r(1))
+        figure.caption = str(r(2))
+        figure.position = int(r(3))
+        abstracts(str(r(0))).figures.add(figure)
+      }
+    }
+
+    if (fields.contains("abstrTypes")) {
+      rows(
+        """SELECT a.uuid, g.uuid, g.prefix, g.name, g.short
+           FROM Abstract a INNER JOIN a.abstrTypes g
+           WHERE a.uuid IN :uuids""").foreach { r =>
+        val group = new AbstractGroup()
+        group.uuid = str(r(1))
+        group.prefix = int(r(2))
+        group.name = str(r(3))
+        group.short = str(r(4))
+        abstracts(str(r(0))).abstrTypes.add(group)
+      }
     }
   }
 
@@ -626,6 +1583,185 @@ class AbstractService(figPath: String) extends PermissionsBase {
 
 object AbstractService {
 
+  /**
+   * Serialized lists of published abstracts by conference uuid.
+   */
+  val publishedList = ConferenceCache[CachedBody]()
+
+  /**
+   * Search indexes of the published abstracts by conference uuid.
+   */
+  val searchIndex = ConferenceCache[SearchIndex[AbstractDocument]]()
+
+  /**
+   * Scalar fields of abstracts that can be requested for pages.
+   */
+  val pageColumns = Seq("title", "topic", "text", "doi", "conflictOfInterest", "acknowledgements",
+    "isTalk", "reasonForTalk", "state", "mtime")
+
+  /**
+   * All fields of abstracts that can be requested for pages.
+   */
+  val pageFields = pageColumns.toSet ++ Set("uuid", "sortId", "conference", "owners", "favUsers",
+    "stateLog", "figures", "authors", "affiliations", "references", "abstrTypes")
+
+  /**
+   * Relations of abstracts that are serialized, see AbstractFormat.
+   */
+  val serializedRelations = Seq("a.figures", "a.authors", "a.authors.affiliations",
+    "a.affiliations", "a.references", "a.abstrTypes")
+
+  val defaultPageSize = 100
+  val maxPageSize = 1000
+
+  /**
+   * Maximum number of abstracts that can be changed by a single bulk operation.
+   */
+  val maxBulkSize = 1000
+
+  /**
+   * Time in milliseconds by which the cursor of a change list lies before the query.
+   */
+  val changesOverlap = 10000L
+
+  private lazy val documentFormat = new AbstractFormat()(DefaultRoutesResolver.resolver)
+
+  /**
+   * Serialize an abstract into its read model.
+   *
+   * @param abstr The abstract with all relations that are serialized.
+   *
+   * @return The document, not persisted.
+   */
+  def makeDocument(abstr: Abstract) : AbstractDocument = {
+    val document = new AbstractDocument()
+
+    document.uuid       = abstr.uuid
+    document.conference = abstr.conference.uuid
+    document.sortId     = abstr.sortId
+    // not null, the title is part of the page key
+    document.title      = Option(abstr.title).getOrElse("")
+    document.mtime      = abstr.mtime
+    document.json       = Json.stringify(documentFormat.writes(abstr))
+    document.hash       = DigestUtils.md5Hex(document.json)
+
+    document
+  }
+
+  /**
+   * Update the read models of changed abstracts and drop the cached lists,
+   * pages and search index of their conference. This must be called after
+   * every committed change of the abstracts or their figures. It does not
+   * fail, so a committed change is never reported as failed.
+   *
+   * @param conference The uuid of the conference of the abstracts.
+   * @param ids        The uuids of the changed abstracts.
+   */
+  def afterCommit(conference: String, ids: Seq[String]) : Unit = {
+    try {
+      refreshDocuments(ids)
+    } finally {
+      ConferenceCache.invalidate(conference)
+    }
+  }
+
+  /**
+   * Write the read models of abstracts: accepted abstracts get a new document,
+   * the documents of all other abstracts are removed. Concurrent refreshes of
+   * the same abstract, e.g. when many clients backfill the documents of a
+   * conference at once, can conflict on inserting the same document; the
+   * losing refresh is retried and then updates the existing document.
+   * If the documents still cannot be written they are removed, so they are
+   * created again when they are listed next, and the error is logged.
+   *
+   * @param ids The uuids of the changed abstracts.
+   */
+  def refreshDocuments(ids: Seq[String]) : Unit = {
+    ids.distinct.grouped(maxBulkSize).foreach { group =>
+      val written = (1 to documentAttempts).exists { attempt =>
+        try {
+          writeDocuments(group)
+          true
+        } catch {
+          case NonFatal(e) =>
+            Logger.warn(s"AbstractService: writing ${group.size} documents failed (attempt $attempt): $e")
+            false
+        }
+      }
+
+      if (!written) {
+        Try {
+          transaction { (em, tx) =>
+            em.createQuery("DELETE FROM AbstractDocument d WHERE d.uuid IN :uuids")
+              .setParameter("uuids", seqAsJavaList(group))
+              .executeUpdate()
+          }
+        }.failed.foreach { e =>
+          Logger.error(s"AbstractService: removing ${group.size} outdated documents failed", e)
+        }
+        Logger.error(s"AbstractService: writing ${group.size} documents failed, they are created when listed")
+      }
+    }
+  }
+
+  private def writeDocuments(group: Seq[String]) : Unit = {
+    transaction { (em, tx) =>
+      val queryStr =
+        """SELECT DISTINCT a FROM Abstract a
+           LEFT JOIN FETCH a.authors
+           LEFT JOIN FETCH a.affiliations
+           LEFT JOIN FETCH a.conference
+           LEFT JOIN FETCH a.figures
+           LEFT JOIN FETCH a.references
+           WHERE a.uuid IN :uuids"""
+
+      val query: TypedQuery[Abstract] = em.createQuery(queryStr, classOf[Abstract])
+      query.setParameter("uuids", seqAsJavaList(group))
+      val accepted = asScalaBuffer(query.getResultList).filter(_.state == AbstractState.Accepted)
+      val acceptedIds = accepted.map(_.uuid).toSet
+
+      val removed = group.filterNot(acceptedIds.contains)
+      if (removed.nonEmpty) {
+        em.createQuery("DELETE FROM AbstractDocument d WHERE d.uuid IN :uuids")
+          .setParameter("uuids", seqAsJavaList(removed))
+          .executeUpdate()
+      }
+
+      accepted.foreach { abstr =>
+        em.merge(makeDocument(abstr))
+      }
+    }
+  }
+
+  /**
+   * Write the read models of all abstracts of a conference, e.g. after
+   * the groups of the conference changed.
+   *
+   * @param conference The uuid of the conference.
+   */
+  def refreshConferenceDocuments(conference: String) : Unit = {
+    val ids = query { em =>
+      em.createQuery(
+        """SELECT a.uuid FROM Abstract a WHERE a.conference.uuid = :uuid AND a.state = :state""", classOf[String])
+        .setParameter("uuid", conference)
+        .setParameter("state", AbstractState.Accepted)
+        .getResultList
+    }
+
+    refreshDocuments(asScalaBuffer(ids).toList)
+  }
+
+  /**
+   * Number of abstracts per page of a streamed abstract list,
+   * each page is written as one chunk.
+   */
+  val streamPageSize = 100
+
+  /**
+   * Number of attempts to write the documents of changed abstracts.
+   */
+  val documentAttempts = 3
+
   def apply[A]() = {
     new AbstractService(Play.application().configuration().getString("file.fig_path", "./figures"))
   }
@@ -10,8 +10,11 @@ import com.mohiva.play.silhouette.core.services.IdentityService
 import com.mohiva.play.silhouette.core.utils.PasswordHasher
 import models.{Account, CredentialsLogin, Login}
 import org.joda.time.DateTime
+import play.api.Play
 import plugins.DBUtil._
+import plugins.MailSender
 import service.mail.MailerService
+import service.util.ExpiringCache
 import utils.DefaultRoutesResolver
 
 import scala.collection.JavaConversions._
@@ -89,43 +92,63 @@ class AccountStore(val pwHasher: PasswordHasher) {
       plainPassword.foreach { pw =>
         val token = UUID.randomUUID.toString
         account.logins.add(CredentialsLogin(pwHasher.hash(pw), isActive = false, token, account))
-        mailerService.sendConfirmation(account, resolver.activationUrl(token).toString)
+        mailerService.sendConfirmation(em, account, resolver.activationUrl(token).toString)
       }
 
       em.merge(account)
     }
 
+    if (plainPassword.isDefined) {
+      MailSender.wake()
+    }
+
     get(created.uuid, requireActive = false)
   }
 
   def update(account: Account): Account = {
-    val updated = transaction { (em, tx) =>
+    val (updated, oldMail) = transaction { (em, tx) =>
       val accountCecked = get(account.uuid)
 
       // prevent update of logins (this may not be necessary)
       account.logins = accountCecked.logins
       account.mtime = new DateTime()
-      em.merge(account)
+      (em.merge(account), accountCecked.mail)
     }
 
+    LoginStore.invalidate(oldMail)
+    LoginStore.invalidate(updated.mail)
+
     get(updated.uuid)
   }
 
   def delete(account: Account): Unit = {
-    transaction { (em, tx) =>
+    val mail = transaction { (em, tx) =>
       val accountCecked = em.find(classOf[Account], account.uuid)
 
       accountCecked.logins.foreach(em.remove(_))
       em.remove(accountCecked)
+
+      accountCecked.mail
     }
+
+    LoginStore.invalidate(mail)
   }
 }
 
 class LoginStore extends IdentityService[Login] {
 
+  /**
+   * Retrieve the active login for a provider key (the mail address).
+   * Logins are cached for a short time, see LoginStore.cache.
+   */
   override def retrieve(loginInfo: LoginInfo): Future[Option[Login]] = {
+    Future.successful(LoginStore.cache.getOrElseUpdate(LoginStore.key(loginInfo.providerKey)) {
+      load(loginInfo)
+    })
+  }
 
-    val login = query { em =>
+  private def load(loginInfo: LoginInfo): Option[Login] = {
+    query { em =>
       val queryStr =
         """SELECT DISTINCT l FROM CredentialsLogin l
            LEFT JOIN FETCH l.account a
@@ -139,8 +162,37 @@ class LoginStore extends IdentityService[Login] {
       case Success(l) => Some(l)
       case Failure(e) => None
     }
+  }
 
-    Future.successful(login)
+}
+
+object LoginStore {
+
+  /**
+   * Active logins by normalized provider key. The cache is bounded by
+   * "auth.identityCache.size" and entries expire after "auth.identityCache.ttl",
+   * which limits how long changes made by other application instances go unnoticed.
+   * Changes made by this instance invalidate the affected entries.
+   */
+  lazy val cache = {
+    val config = Play.current.configuration
+    new ExpiringCache[String, Login](config.getInt("auth.identityCache.size").getOrElse(1000),
+      config.getMilliseconds("auth.identityCache.ttl").getOrElse(60000L))
+  }
+
+  def key(providerKey: String): String = {
+    if (providerKey == null) null else providerKey.toLowerCase
+  }
+
+  /**
+   * Drop the cached login for a provider key. This must be called after
+   * an account or its credentials changed.
+   *
+   * @param providerKey The provider key (mail address) of the login.
+   */
+  def invalidate(providerKey: String): Unit = {
+    if (providerKey != null)
+      cache.invalidate(key(providerKey))
   }
 
 }
@@ -171,7 +223,10 @@ class CredentialsStore extends DelegableAuthInfoDAO[PasswordInfo] {
         em.merge(credentials)
       }
     } match {
-      case Success(login) => Future.successful(PasswordInfo(login.hasher, login.password, Option(login.salt)))
+      case Success(login) =>
+        LoginStore.invalidate(ologinInfo.providerKey)
+        LoginStore.invalidate(nloginInfo.providerKey)
+        Future.successful(PasswordInfo(login.hasher, login.password, Option(login.salt)))
       case Failure(e) => Future.failed(e)
     }
   }
@@ -198,7 +253,9 @@ class CredentialsStore extends DelegableAuthInfoDAO[PasswordInfo] {
         em.merge(credentials)
       }
     } match {
-      case Success(login) => Future.successful(PasswordInfo(login.hasher, login.password, Option(login.salt)))
+      case Success(login) =>
+        LoginStore.invalidate(loginInfo.providerKey)
+        Future.successful(PasswordInfo(login.hasher, login.password, Option(login.salt)))
       case Failure(e) => Future.failed(e)
     }
   }
@@ -245,6 +302,7 @@ class CredentialsStore extends DelegableAuthInfoDAO[PasswordInfo] {
       }
     } match {
       case Success(login) =>
+        LoginStore.invalidate(login.account.mail)
         Future.successful(PasswordInfo(login.hasher, login.password, Option(login.salt)))
       case Failure(e) =>
         Future.failed(e)
@@ -9,18 +9,15 @@
 package service
 
 import java.io.{File, FileNotFoundException}
-import java.nio.file.{Paths, NoSuchFileException}
 
 import javax.persistence._
 import models._
 import play.Play
 import play.api.libs.Files.TemporaryFile
 import plugins.DBUtil._
-import com.sksamuel.scrimage.Image
-import com.sksamuel.scrimage.nio.JpegWriter
-import com.drew.imaging.ImageProcessingException
-import Math.sqrt
-import scala.util.control.Breaks.{break, breakable}
+import service.util.{ConferenceCache, ImageProcessor}
+import utils.FileResults
+import scala.concurrent.Future
 
 /**
   * Service class for banners.
@@ -94,14 +91,19 @@ class BannerService(banPath: String, banMobilePath: String) {
       }
 
       data.moveTo(file, replace = true)
+      ban.hash = FileResults.contentHash(file)
 
       ban
     }
 
+    ConferenceCache.invalidate(banCreated.conference.uuid)
+
     get(banCreated.uuid)
   }
 
   /**
+    * The mobile image is created in the background by the ImageProcessor,
+    * until it exists the original image is served as mobile image.
     * Upload mobile file for a banner.
     * This action is restricted to all accounts owning the conference the
     * banner belongs to.
@@ -110,12 +112,14 @@ class BannerService(banPath: String, banMobilePath: String) {
     * @param conference   The conference the banner belongs to.
     * @param account The account uploading the banner.
     *
+    * @return A future that completes when the mobile image was written.
+    *
     * @throws EntityNotFoundException If the account does not exist or
     *                                 if the conference has no uuid.
     * @throws IllegalAccessException If the user is not a conference owner or admin.
     */
-  def uploadMobile(ban: Banner, conference: Conference, account: Account) : Unit = {
-    transaction { (em, tx) =>
+  def uploadMobile(ban: Banner, conference: Conference, account: Account) : Future[Unit] = {
+    query { em =>
 
       val accountChecked = em.find(classOf[Account], account.uuid)
       if (accountChecked == null)
@@ -127,52 +131,9 @@ class BannerService(banPath: String, banMobilePath: String) {
 
       if (!(conferenceChecked.isOwner(account) || account.isAdmin))
         throw new IllegalAccessException("No permissions for conference with uuid = " + conferenceChecked.uuid)
-
-      // In a docker environment '/target/universal/stage' is used when resolving '.'
-      // in a relative path. 'java.io.File' seems to properly resolve the relative paths
-      // even in a docker environment, but the third party library scrimage cannot work
-      // with these file descriptors and requires file descriptors created with absolute paths.
-      //   As a workaround the file not found exception is caught and the docker container
-      // root path is used to create file descriptior with absolut paths appropriate for
-      // the docker environment.
-      var figure_file = new File(banPath, ban.uuid)
-      var mobile_file = new File(banMobilePath, ban.uuid)
-
-      try {
-        var mobile_image = Image.fromFile(figure_file)
-      } catch {
-        case nofile: NoSuchFileException => {
-          val figure_path = Paths.get("/srv", "gca", banPath, ban.uuid).normalize.toString
-          val mobile_path = Paths.get("/srv", "gca", banMobilePath, ban.uuid).normalize.toString
-
-          figure_file = new File(figure_path)
-          mobile_file = new File(mobile_path)
-        }
-      }
-
-      var mobile_image = Image.fromFile(figure_file)
-
-      val mobile_parent = mobile_file.getParentFile
-      if (!mobile_parent.exists()) {
-        mobile_parent.mkdirs()
-      }
-
-      var current_size = mobile_image.bytes.length.toFloat
-      var scaleFactor = 1.0
-
-      breakable {
-        for (i <- 1 to 10) {
-          if (current_size > 2500000.0) {
-            scaleFactor = sqrt(1250000.0 / current_size)
-            mobile_image = mobile_image.scale(scaleFactor)
-            current_size = mobile_image.bytes.length.toFloat
-          } else {
-            break
-          }
-        }
-      }
-      mobile_image.output(mobile_file)(JpegWriter().withCompression(25))
     }
+
+    ImageProcessor.submitMobile(banPath, banMobilePath, ban.uuid)
   }
 
   /**
@@ -189,7 +150,7 @@ class BannerService(banPath: String, banMobilePath: String) {
     *                                 if the banner does not exist.
     */
   def delete(id: String, account: Account) : Unit = {
-    transaction { (em, tx) =>
+    val conferenceId = transaction { (em, tx) =>
 
       val accountChecked = em.find(classOf[Account], account.uuid)
       if (accountChecked == null)
@@ -212,12 +173,18 @@ class BannerService(banPath: String, banMobilePath: String) {
       if (mobile_file.exists())
         mobile_file.delete()
 
+      val conferenceId = banChecked.conference.uuid
+
       banChecked.conference.banner.remove(banChecked)
       banChecked.conference.touch()
       banChecked.conference = null
 
       em.remove(banChecked)
+
+      conferenceId
     }
+
+    ConferenceCache.invalidate(conferenceId)
   }
 
   /**
@@ -18,11 +18,24 @@ import javax.persistence._
 import play.api._
 import models._
 import plugins.DBUtil._
-import service.util.PermissionsBase
+import service.util.{CachedBody, CompressedBody, ConferenceCache, PermissionsBase, ScheduleIndex}
+import org.apache.commons.codec.digest.DigestUtils
 import org.joda.time.{DateTime, DateTimeZone}
 import play.Play
 
 import scala.collection.JavaConversions._
+import scala.collection.mutable.ArrayBuffer
+
+/**
+ * The ids of everything of a conference that is cached for offline use.
+ *
+ * @param short     The short name of the conference.
+ * @param banners   The uuids of the banners.
+ * @param abstracts The uuids of the published abstracts together with the uuids of their figures.
+ * @param images    The URLs of the logo and the thumbnail of the conference.
+ */
+case class OfflineContent(short: String, banners: Seq[String], abstracts: Seq[(String, Seq[String])],
+                          images: Seq[String])
 
 /**
  * Service class for that implements data access logic for conferences.
@@ -48,6 +61,7 @@ class ConferenceService(banPath: String) extends PermissionsBase {
 
 
       val query : TypedQuery[Conference] = em.createQuery(queryStr, classOf[Conference])
+      batchFetch(query, "c.topics", "c.confTexts", "c.banner")
       asScalaBuffer(query.getResultList)
     }
   }
@@ -79,6 +93,106 @@ class ConferenceService(banPath: String) extends PermissionsBase {
     }
   }
 
+  /**
+   * Compute an ETag for the list of all conferences (or all conferences of a
+   * group) with a single aggregate query, without loading the conferences.
+   *
+   * @param group The group of the conferences or null for all conferences.
+   *
+   * @return The ETag of the conference list.
+   */
+  def listETag(group: String = null) : String = {
+    query { em =>
+      val queryStr = if (group != null) {
+        "SELECT COUNT(c), MAX(c.mtime) FROM Conference c WHERE c.group = :group"
+      } else {
+        "SELECT COUNT(c), MAX(c.mtime) FROM Conference c"
+      }
+
+      val query = em.createQuery(queryStr, classOf[Array[AnyRef]])
+      if (group != null) {
+        query.setParameter("group", group)
+      }
+
+      val result = query.getSingleResult
+      DigestUtils.md5Hex(group + ":" + result(0) + ":" + result(1))
+    }
+  }
+
+  /**
+   * Get the id of the conference with the latest start date, which
+   * is the conference that is available offline.
+   *
+   * @return The id of the latest conference or None if there is no conference.
+   */
+  def latestId : Option[String] = {
+    query { em =>
+      val result = em.createQuery("SELECT c.uuid FROM Conference c ORDER BY c.startDate DESC", classOf[String])
+        .setMaxResults(1)
+        .getResultList
+
+      result.headOption
+    }
+  }
+
+  /**
+   * List the ids of the banners, published abstracts and figures and the
+   * logo and thumbnail of a conference without loading the entities.
+   * Abstracts are only listed if they are accepted and the conference is
+   * published, since the list is public.
+   *
+   * @param id The id of the conference.
+   *
+   * @return The ids of the offline content of the conference.
+   *
+   * @throws NoResultException If the conference was not found
+   */
+  def listOfflineContent(id: String) : OfflineContent = {
+    query { em =>
+      val conf = em.createQuery("SELECT c.short, c.isPublished FROM Conference c WHERE c.uuid = :uuid",
+        classOf[Array[AnyRef]])
+        .setParameter("uuid", id)
+        .getSingleResult
+      val short = conf(0).asInstanceOf[String]
+      val isPublished = conf(1) == java.lang.Boolean.TRUE
+
+      val images = em.createQuery(
+        """SELECT t.text FROM ConfText t
+           WHERE t.conference.uuid = :uuid AND t.ctType IN ('logo', 'thumbnail')
+           ORDER BY t.ctType""", classOf[String])
+        .setParameter("uuid", id)
+        .getResultList
+        .filter(text => text != null && text.nonEmpty)
+
+      val banners = em.createQuery(
+        "SELECT b.uuid FROM Banner b WHERE b.conference.uuid = :uuid ORDER BY b.uuid", classOf[String])
+        .setParameter("uuid", id)
+        .getResultList
+
+      val rows = if (!isPublished) Nil else em.createQuery(
+        """SELECT a.uuid, f.uuid FROM Abstract a
+           LEFT JOIN a.figures f
+           WHERE a.conference.uuid = :uuid AND a.state = :state
+           ORDER BY a.sortId, a.uuid, f.position""", classOf[Array[AnyRef]])
+        .setParameter("uuid", id)
+        .setParameter("state", AbstractState.Accepted)
+        .getResultList.toList
+
+      // rows are ordered by abstract, group the figures of each abstract
+      val abstracts = new ArrayBuffer[(String, ArrayBuffer[String])]()
+      rows.foreach { row =>
+        val abstr = row(0).asInstanceOf[String]
+        if (abstracts.isEmpty || abstracts.last._1 != abstr)
+          abstracts += ((abstr, new ArrayBuffer[String]()))
+
+        Option(row(1)).foreach(figure => abstracts.last._2 += figure.asInstanceOf[String])
+      }
+
+      OfflineContent(short, banners.toList, abstracts.map { case (abstr, figures) => (abstr, figures.toList) }.toList,
+        images.toList)
+    }
+  }
+
   def listWithGroup(group: String) : Seq[Conference] = {
     query { em =>
       val queryStr =
@@ -90,10 +204,10 @@ class ConferenceService(banPath: String) extends PermissionsBase {
         """
 
 
-      val result = em.createQuery(queryStr, classOf[Conference])
-        .setParameter("group", group)
-        .getResultList
-      asScalaBuffer(result)
+      val query : TypedQuery[Conference] = em.createQuery(queryStr, classOf[Conference])
+      query.setParameter("group", group)
+      batchFetch(query, "c.topics", "c.confTexts", "c.banner")
+      asScalaBuffer(query.getResultList)
     }
   }
 
@@ -109,6 +223,7 @@ class ConferenceService(banPath: String) extends PermissionsBase {
 
       val query : TypedQuery[Conference] = em.createQuery(queryStr, classOf[Conference])
       query.setParameter("uuid", account.uuid)
+      batchFetch(query, ConferenceService.serializedRelations: _*)
 
       asScalaBuffer(query.getResultList)
     }
@@ -125,6 +240,7 @@ class ConferenceService(banPath: String) extends PermissionsBase {
            ORDER BY c.startDate DESC"""
       val query : TypedQuery[Conference] = em.createQuery(queryStr, classOf[Conference])
       query.setParameter("uuid", account.uuid)
+      batchFetch(query, ConferenceService.serializedRelations: _*)
       asScalaBuffer(query.getResultList)
     }
   }
@@ -158,6 +274,68 @@ class ConferenceService(banPath: String) extends PermissionsBase {
     }
   }
 
+  /**
+   * Get the geo, schedule or info entry of a conference. Only the entry is loaded,
+   * encoded and compressed once and cached until the conference changes.
+   *
+   * @param id    The uuid or short name of the conference.
+   * @param field The name of the entry: geo, schedule or info.
+   *
+   * @return The entry or None if it is not set.
+   *
+   * @throws IllegalArgumentException If the field is not geo, schedule or info.
+   * @throws NoResultException If the conference does not exist.
+   */
+  def getField(id: String, field: String) : Option[CompressedBody] = {
+    if (!ConferenceService.cachedFields.contains(field))
+      throw new IllegalArgumentException("Unknown conference field: " + field)
+
+    ConferenceService.fieldBodies.getOrElseUpdate(id + ":" + field) {
+      val (uuid, value) = loadField(id, field)
+      (uuid, value.map(CompressedBody(_)))
+    }
+  }
+
+  /**
+   * Get the parsed schedule of a conference with an index over all events for
+   * time window queries. The index is built once and cached until the conference changes.
+   *
+   * @param id The uuid or short name of the conference.
+   *
+   * @return The schedule or None if it is not set.
+   *
+   * @throws IllegalArgumentException If the stored schedule is not valid.
+   * @throws NoResultException If the conference does not exist.
+   */
+  def getScheduleIndex(id: String) : Option[ScheduleIndex] = {
+    ConferenceService.scheduleIndexes.getOrElseUpdate(id) {
+      val (uuid, value) = loadField(id, "schedule")
+      (uuid, value.map(schedule => ScheduleIndex(schedule, CompressedBody(schedule).eTag)))
+    }
+  }
+
+  /**
+   * Batch read relations of the queried conferences that are used once the
+   * entity manager is closed, e.g. by the serializer.
+   */
+  private def batchFetch(query: TypedQuery[Conference], paths: String*) : Unit = {
+    paths.foreach(query.setHint("eclipselink.batch", _))
+    query.setHint("eclipselink.batch.type", "IN")
+  }
+
+  private def loadField(id: String, field: String) : (String, Option[String]) = {
+    query { em =>
+      val row = em.createQuery(
+        s"SELECT c.uuid, c.$field FROM Conference c WHERE c.uuid = :uuid OR c.short = :short",
+        classOf[Array[AnyRef]])
+        .setParameter("uuid", id)
+        .setParameter("short", URLDecoder.decode(id, "UTF-8"))
+        .getSingleResult
+
+      (row(0).asInstanceOf[String], Option(row(1).asInstanceOf[String]))
+    }
+  }
+
   /**
     * Get a conference specified by its id, if account is owner.
     *
@@ -338,9 +516,19 @@ class ConferenceService(banPath: String) extends PermissionsBase {
         }
       }
 
+      // the abstract lists contain the names of the groups
+      ConferenceService.bumpAbstractsVersion(em, merged.uuid)
+
       merged
     }
 
+    ConferenceService.evict(conf.uuid)
+    try {
+      AbstractService.refreshConferenceDocuments(conf.uuid)
+    } finally {
+      ConferenceCache.invalidate(conf.uuid)
+    }
+
     get(conf.uuid)
   }
 
@@ -382,7 +570,17 @@ class ConferenceService(banPath: String) extends PermissionsBase {
       })
 
       em.remove(confChecked)
+
+      em.createQuery("DELETE FROM Tombstone t WHERE t.conference = :uuid")
+        .setParameter("uuid", id)
+        .executeUpdate()
+
+      em.createQuery("DELETE FROM AbstractDocument d WHERE d.conference = :uuid")
+        .setParameter("uuid", id)
+        .executeUpdate()
     }
+
+    ConferenceCache.invalidate(id)
   }
 
   /**
@@ -393,12 +591,16 @@ class ConferenceService(banPath: String) extends PermissionsBase {
     * @param schedule Value that is to be used to update the schedule entry.
     * @param info Value that is to be used to update the info entry.
     *
-    * @throws IllegalArgumentException If the conference has no uuid.
+    * @throws IllegalArgumentException If the conference has no uuid or the schedule is not valid.
     * @throws EntityNotFoundException If the conference or the user does not exist.
     * @throws IllegalAccessException If account is not an owner.
     */
   def updateSpecificFields(conference: Conference, account: Account,
                   geo: String = null, schedule: String = null, info: String = null) : Unit = {
+    if (schedule != null) {
+      ScheduleIndex(schedule, null)
+    }
+
     val conf = transaction { (em, tx) =>
 
       if (conference.uuid == null)
@@ -429,6 +631,9 @@ class ConferenceService(banPath: String) extends PermissionsBase {
 
       em.merge(conference)
     }
+
+    ConferenceService.evict(conf.uuid)
+    ConferenceCache.invalidate(conf.uuid)
   }
 
 }
@@ -436,6 +641,64 @@ class ConferenceService(banPath: String) extends PermissionsBase {
 
 object ConferenceService {
 
+  /**
+   * Uuids of conferences by the id used in requests, the uuid or the short
+   * name, so cached values can be found under the uuid without a query.
+   */
+  val uuids = ConferenceCache[String]()
+
+  /**
+   * Offline manifest and resource list of the latest conference.
+   */
+  val offlineResources = ConferenceCache[CachedBody]()
+
+  /**
+   * The conference entries that are served from the cache.
+   */
+  val cachedFields = Set("geo", "schedule", "info")
+
+  /**
+   * Compressed geo, schedule and info entries by conference id and field name.
+   */
+  val fieldBodies = ConferenceCache[Option[CompressedBody]]()
+
+  /**
+   * Parsed and indexed schedules by conference id.
+   */
+  val scheduleIndexes = ConferenceCache[Option[ScheduleIndex]]()
+
+  /**
+   * Increment the abstracts version of a conference. This must be called within
+   * the transaction that creates, changes or deletes an abstract of the conference
+   * or one of its figures.
+   *
+   * @param em         The entity manager of the transaction.
+   * @param conference The uuid of the conference.
+   */
+  def bumpAbstractsVersion(em: EntityManager, conference: String) : Unit = {
+    em.createQuery("UPDATE Conference c SET c.abstractsVersion = c.abstractsVersion + 1 WHERE c.uuid = :uuid")
+      .setParameter("uuid", conference)
+      .executeUpdate()
+  }
+
+  /**
+   * Evict a conference from the shared cache after a commit. The cached copy
+   * of a merged conference keeps the abstracts version of the merged entity,
+   * which is not written and may be outdated.
+   *
+   * @param conference The uuid of the conference.
+   */
+  def evict(conference: String) : Unit = {
+    query { em =>
+      em.getEntityManagerFactory.getCache.evict(classOf[Conference], conference)
+    }
+  }
+
+  /**
+   * Relations of conferences that are serialized, see ConferenceFormat.
+   */
+  val serializedRelations = Seq("c.groups", "c.topics", "c.confTexts", "c.banner")
+
   def apply[A]() = {
     new ConferenceService(Play.application().configuration().getString("file.ban_path", "./banners"))
   }
@@ -0,0 +1,246 @@
+package service
+
+import java.io.{BufferedOutputStream, File, FileOutputStream, OutputStreamWriter}
+import java.nio.charset.StandardCharsets
+import java.nio.file.{Files, StandardCopyOption}
+import java.util.concurrent.{ConcurrentHashMap, RejectedExecutionException}
+import java.util.zip.{Deflater, ZipEntry, ZipOutputStream}
+
+import models.Conference
+import org.apache.commons.codec.digest.DigestUtils
+import play.Play
+import play.api.Logger
+import play.api.libs.concurrent.Execution.Implicits.defaultContext
+import play.api.libs.json.Json
+import utils.serializer.{AbstractFormat, ConferenceFormat}
+import utils.{BoundedExecutor, DefaultRoutesResolver}
+
+import scala.collection.JavaConversions._
+import scala.collection.mutable.ArrayBuffer
+import scala.concurrent.{Future, Promise}
+
+/**
+ * Builds export bundles of conferences: ZIP archives that contain the
+ * conference, all of its abstracts and the image files of its figures and
+ * banners. Bundles are written in the background to the export directory
+ * and kept until the conference or one of its abstracts changes, so they
+ * can be downloaded (and resumed) like any other file.
+ */
+class ExportService(exportPath: String, figPath: String, banPath: String) {
+
+  val abstractService = AbstractService(figPath)
+
+  private val confFormat = new ConferenceFormat()(DefaultRoutesResolver.resolver)
+  private val absFormat = new AbstractFormat()(DefaultRoutesResolver.resolver)
+
+  /**
+   * The bundle file of the current version of a conference. The file name
+   * contains a hash of the ETags of the conference and of its abstracts,
+   * so every change leads to a new bundle.
+   *
+   * @param conference The conference, as returned by ConferenceService.get.
+   *
+   * @return The bundle file, which may not exist yet.
+   */
+  def bundleFile(conference: Conference) : File = {
+    val version = DigestUtils.md5Hex(conference.eTag + ":" + conference.abstractsETag("export"))
+    new File(exportPath, conference.uuid + "-" + version + ".zip")
+  }
+
+  /**
+   * Get the bundle of the current version of a conference if it was built.
+   *
+   * @param conference The conference, as returned by ConferenceService.get.
+   *
+   * @return The bundle or None if it has to be built first.
+   */
+  def get(conference: Conference) : Option[File] = {
+    Some(bundleFile(conference)).filter(file => file.exists && file.canRead)
+  }
+
+  /**
+   * Build the bundle of the current version of a conference in the background.
+   * Only one build per bundle runs at a time, further calls return the
+   * running build.
+   *
+   * @param conference The conference, as returned by ConferenceService.get.
+   *
+   * @return A future that completes with the bundle, failed if the queue of
+   *         the export executor is full or the build failed.
+   */
+  def build(conference: Conference) : Future[File] = {
+    val target = bundleFile(conference)
+    val promise = Promise[File]()
+
+    val running = ExportService.building.putIfAbsent(target.getName, promise.future)
+    if (running != null) {
+      return running
+    }
+
+    // the application class loader is needed by JPA in dev mode
+    val loader = Thread.currentThread.getContextClassLoader
+
+    try {
+      promise.completeWith(Future {
+        val thread = Thread.currentThread
+        val previous = thread.getContextClassLoader
+        thread.setContextClassLoader(loader)
+
+        try {
+          write(conference, target)
+        } finally {
+          thread.setContextClassLoader(previous)
+        }
+      }(ExportService.executor))
+    } catch {
+      case e: RejectedExecutionException =>
+        Logger.warn(s"ExportService: queue full, no bundle for conference [${conference.uuid}]")
+        promise.failure(e)
+    }
+
+    promise.future.onComplete { result =>
+      ExportService.building.remove(target.getName)
+      result.failed.foreach {
+        case e: RejectedExecutionException =>
+        case e => Logger.error(s"ExportService: building the bundle of conference [${conference.uuid}] failed", e)
+      }
+    }
+
+    promise.future
+  }
+
+  /**
+   * Write the bundle of a conference. Abstracts are loaded page by page and
+   * written to the archive right away, image files are copied from disk, so
+   * every abstract and file is read once and only one page of abstracts is
+   * held in memory. The archive is written to a temporary file first and then
+   * moved to its final location, so a partially written bundle is never served.
+   * Bundles of older versions of the conference are removed afterwards.
+   *
+   * @param conference The conference, as returned by ConferenceService.get.
+   * @param target     The bundle file.
+   *
+   * @return The bundle file.
+   */
+  def write(conference: Conference, target: File) : File = {
+    val dir = target.getAbsoluteFile.getParentFile
+    if (!dir.exists()) {
+      dir.mkdirs()
+    }
+
+    val tmpFile = File.createTempFile(target.getName, ".part", dir)
+    try {
+      val zip = new ZipOutputStream(new BufferedOutputStream(new FileOutputStream(tmpFile)))
+      try {
+        zip.putNextEntry(new ZipEntry("conference.json"))
+        zip.write(Json.stringify(confFormat.writes(conference)).getBytes(StandardCharsets.UTF_8))
+        zip.closeEntry()
+
+        val figures = writeAbstracts(zip, conference)
+
+        // images are compressed already
+        zip.setLevel(Deflater.BEST_SPEED)
+        figures.foreach(uuid => writeFile(zip, "figures/" + uuid, new File(figPath, uuid)))
+        conference.banner.foreach(ban => writeFile(zip, "banners/" + ban.uuid, new File(banPath, ban.uuid)))
+      } finally {
+        zip.close()
+      }
+
+      Files.move(tmpFile.toPath, target.toPath, StandardCopyOption.REPLACE_EXISTING, StandardCopyOption.ATOMIC_MOVE)
+    } finally {
+      tmpFile.delete()
+    }
+
+    Option(dir.listFiles).getOrElse(Array.empty[File]).filter { file =>
+      file.getName.startsWith(conference.uuid + "-") && file.getName.endsWith(".zip") &&
+        file.getName != target.getName
+    }.foreach(_.delete())
+
+    target
+  }
+
+  /**
+   * Write all abstracts of a conference as JSON array to the entry "abstracts.json".
+   *
+   * @return The uuids of the figures of the abstracts.
+   */
+  private def writeAbstracts(zip: ZipOutputStream, conference: Conference) : Seq[String] = {
+    val figures = new ArrayBuffer[String]()
+
+    zip.putNextEntry(new ZipEntry("abstracts.json"))
+    // not closed, that would close the archive
+    val writer = new OutputStreamWriter(zip, StandardCharsets.UTF_8)
+    writer.write("[")
+
+    var after: Option[PageKey] = None
+    var first = true
+    do {
+      val page = abstractService.listAllPage(conference, after, AbstractService.defaultPageSize,
+        AbstractService.pageFields)
+
+      page.abstracts.foreach { abstr =>
+        if (!first) {
+          writer.write(",")
+        }
+        first = false
+
+        writer.write(Json.stringify(absFormat.writes(abstr)))
+        figures ++= abstr.figures.map(_.uuid)
+      }
+
+      after = page.next
+    } while (after.isDefined)
+
+    writer.write("]")
+    writer.flush()
+    zip.closeEntry()
+
+    figures
+  }
+
+  /**
+   * Copy a file to an entry of the archive; missing files are skipped.
+   */
+  private def writeFile(zip: ZipOutputStream, name: String, file: File) : Unit = {
+    if (!file.exists || !file.canRead) {
+      Logger.warn(s"ExportService: file [$file] is missing, not exported")
+      return
+    }
+
+    val entry = new ZipEntry(name)
+    entry.setTime(file.lastModified)
+    zip.putNextEntry(entry)
+    Files.copy(file.toPath, zip)
+    zip.closeEntry()
+  }
+
+}
+
+object ExportService {
+
+  lazy val executor = BoundedExecutor("export", 1, 10)
+
+  /**
+   * Running builds by bundle file name.
+   */
+  private val building = new ConcurrentHashMap[String, Future[File]]()
+
+  /**
+   * Create an export service that writes bundles to the path stored in the
+   * configuration under "file.export_path", as default the relative path
+   * "./exports" will be used. Figures and banners are read from "file.fig_path"
+   * and "file.ban_path".
+   *
+   * @return A new export service.
+   */
+  def apply[A]() : ExportService = {
+    new ExportService(Play.application().configuration().getString("file.export_path", "./exports"),
+      Play.application().configuration().getString("file.fig_path", "./figures"),
+      Play.application().configuration().getString("file.ban_path", "./banners"))
+  }
+
+  def apply(exportPath: String, figPath: String, banPath: String) = {
+    new ExportService(exportPath, figPath, banPath)
+  }
+
+}
@@ -1,25 +1,23 @@
 package service
 
 import java.io.{File, FileNotFoundException}
-import java.nio.file.{Paths, NoSuchFileException}
 
 import javax.persistence._
 import play.Play
 import play.api.libs.Files.TemporaryFile
 import models._
 import plugins.DBUtil._
-import com.sksamuel.scrimage.Image
-import com.sksamuel.scrimage.nio.JpegWriter
+import service.util.{ConferenceCache, ImageFormat, ImageProcessor}
 import org.apache.commons.io.FileUtils
-import com.drew.imaging.ImageProcessingException
-import Math.sqrt
+import utils.FileResults
 
-import scala.util.control.Breaks.{break, breakable}
+import scala.collection.JavaConversions._
+import scala.concurrent.Future
 
 /**
  * Service class for figures.
  */
-class FigureService(figPath: String, figMobilePath: String) {
+class FigureService(figPath: String, figMobilePath: String, figDerivativesPath: String) {
 
   /**
    * Get a figure by id.
@@ -76,6 +74,8 @@ class FigureService(figPath: String, figMobilePath: String) {
 
       em.persist(fig)
 
+      ConferenceService.bumpAbstractsVersion(em, abstractChecked.conference.uuid)
+
       val file = new File(figPath, fig.uuid)
       val parent = file.getParentFile
 
@@ -84,14 +84,19 @@ class FigureService(figPath: String, figMobilePath: String) {
       }
 
       data.moveTo(file, replace = true)
+      fig.hash = FileResults.contentHash(file)
 
       fig
     }
 
+    AbstractService.afterCommit(figCreated.abstr.conference.uuid, Seq(figCreated.abstr.uuid))
+
     get(figCreated.uuid)
   }
 
   /**
+    * The mobile image is created in the background by the ImageProcessor,
+    * until it exists the original image is served as mobile image.
     * Upload a new mobile image for already created figure.
     * This action is restricted to all accounts owning the abstract the
     * figure belongs to.
@@ -100,11 +105,13 @@ class FigureService(figPath: String, figMobilePath: String) {
     * @param abstr   The abstract the figure belongs to.
     * @param account The account uploading the figure.
     *
+    * @return A future that completes when the mobile image was written.
+    *
     * @throws EntityNotFoundException If the account does not exist
     * @throws IllegalArgumentException If the abstract has no uuid
     */
-  def uploadMobile(fig: Figure,  abstr: Abstract, account: Account) : Unit = {
-    transaction { (em, tx) =>
+  def uploadMobile(fig: Figure,  abstr: Abstract, account: Account) : Future[Unit] = {
+    query { em =>
 
       val accountChecked = em.find(classOf[Account], account.uuid)
       if (accountChecked == null)
@@ -113,53 +120,61 @@ class FigureService(figPath: String, figMobilePath: String) {
       val abstractChecked = em.find(classOf[Abstract], abstr.uuid)
       if (abstractChecked == null)
         throw new EntityNotFoundException("Unable to find abstract with uuid = " + abstr.uuid)
+    }
 
+    ImageProcessor.submitMobile(figPath, figMobilePath, fig.uuid)
+  }
 
-      // In a docker environment '/target/universal/stage' is used when resolving '.'
-      // in a relative path. 'java.io.File' seems to properly resolve the relative paths
-      // even in a docker environment, but the third party library scrimage cannot work
-      // with these file descriptors and requires file descriptors created with absolute paths.
-      //   As a workaround the file not found exception is caught and the docker container
-      // root path is used to create file descriptior with absolut paths appropriate for
-      // the docker environment.
-      var figure_file = new File(figPath, fig.uuid)
-      var mobile_file = new File(figMobilePath, fig.uuid)
-
-      try {
-        var mobile_image = Image.fromFile(figure_file)
-      } catch {
-        case nofile: NoSuchFileException => {
-          val figure_path = Paths.get("/srv", "gca", figPath, fig.uuid).normalize.toString
-          val mobile_path = Paths.get("/srv", "gca", figMobilePath, fig.uuid).normalize.toString
-
-          figure_file = new File(figure_path)
-          mobile_file = new File(mobile_path)
-        }
-      }
+  /**
+   * Create the derivatives of a figure in all configured widths and formats.
+   * The derivatives are created in the background by the ImageProcessor,
+   * until they exist the original image is served instead.
+   *
+   * @param fig The figure object.
+   *
+   * @return A future that completes when all derivatives were written.
+   */
+  def createDerivatives(fig: Figure) : Future[Unit] = {
+    if (fig.uuid == null)
+      throw new IllegalArgumentException("Unable to create derivatives for figure without uuid")
 
-      var mobile_image = Image.fromFile(figure_file)
+    ImageProcessor.submitDerivatives(figPath, figDerivativesPath, fig.uuid)
+  }
 
-      val mobile_parent = mobile_file.getParentFile
-      if (!mobile_parent.exists()) {
-        mobile_parent.mkdirs()
-      }
+  /**
+   * Create the mobile version and the derivatives of a newly uploaded figure
+   * in a single background job of the ImageProcessor, which decodes the
+   * original only once. Until they exist the original image is served instead.
+   *
+   * @param fig The figure object.
+   *
+   * @return A future that completes when all versions were written.
+   */
+  def createVersions(fig: Figure) : Future[Unit] = {
+    if (fig.uuid == null)
+      throw new IllegalArgumentException("Unable to create versions for figure without uuid")
 
-      var current_size = mobile_image.bytes.length.toFloat
-      var scaleFactor = 1.0
-
-      breakable {
-        for (i <- 1 to 10) {
-          if (current_size > 2500000.0) {
-            scaleFactor = sqrt(1250000.0 / current_size)
-            mobile_image = mobile_image.scale(scaleFactor)
-            current_size = mobile_image.bytes.length.toFloat
-          } else {
-            break
-          }
-        }
-      }
-      mobile_image.output(mobile_file)(JpegWriter().withCompression(25))
+    ImageProcessor.submitVersions(figPath, figMobilePath, figDerivativesPath, fig.uuid)
+  }
+
+  /**
+   * Create the mobile versions and derivatives of all figures that have no
+   * derivatives yet, e.g. figures uploaded before derivatives were introduced.
+   * The figures are processed one after another by a single background job.
+   *
+   * @return The number of figures that are processed and a future that
+   *         completes when all of them were processed.
+   */
+  def createMissingVersions() : (Int, Future[Unit]) = {
+    val uuids = query { em =>
+      em.createQuery("SELECT f.uuid FROM Figure f ORDER BY f.uuid", classOf[String]).getResultList.toList
     }
+
+    val missing = uuids.filter { uuid =>
+      new File(figPath, uuid).exists && !ImageProcessor.hasDerivatives(figDerivativesPath, uuid)
+    }
+
+    (missing.size, ImageProcessor.submitVersions(figPath, figMobilePath, figDerivativesPath, missing))
   }
 
   /**
@@ -190,10 +205,15 @@ class FigureService(figPath: String, figMobilePath: String) {
         throw new IllegalAccessException("No permissions for figure with uuid = " + fig.uuid)
 
       fig.abstr.touch()
+      fig.hash = figChecked.hash
+
+      ConferenceService.bumpAbstractsVersion(em, figChecked.abstr.conference.uuid)
 
       em.merge(fig)
     }
 
+    AbstractService.afterCommit(figUpdated.abstr.conference.uuid, Seq(figUpdated.abstr.uuid))
+
     get(figUpdated.uuid)
   }
 
@@ -208,7 +228,7 @@ class FigureService(figPath: String, figMobilePath: String) {
    * @return True if the figure was deleted, false otherwise.
    */
   def delete(id: String, account: Account) : Unit = {
-    transaction { (em, tx) =>
+    val (conferenceId, abstractId) = transaction { (em, tx) =>
 
       val accountChecked = em.find(classOf[Account], account.uuid)
       if (accountChecked == null)
@@ -232,12 +252,25 @@ class FigureService(figPath: String, figMobilePath: String) {
       if (mobile_file.exists())
         mobile_file.delete()
 
+      ImageProcessor.deleteDerivatives(figDerivativesPath, figChecked.uuid)
+
+      val conferenceId = figChecked.abstr.conference.uuid
+      val abstractId = figChecked.abstr.uuid
+
+      em.persist(Tombstone(figChecked.uuid, Tombstone.FIGURE, conferenceId))
+
       figChecked.abstr.figures.remove(figChecked)
       figChecked.abstr.touch()
       figChecked.abstr = null
 
       em.remove(figChecked)
+
+      ConferenceService.bumpAbstractsVersion(em, conferenceId)
+
+      (conferenceId, abstractId)
     }
+
+    AbstractService.afterCommit(conferenceId, Seq(abstractId))
   }
 
   /**
@@ -284,6 +317,27 @@ class FigureService(figPath: String, figMobilePath: String) {
     file
   }
 
+  /**
+   * Open the derivative of a figure that fits a requested width best;
+   * if no derivative is at least as wide as requested or the derivatives
+   * were not created yet, fallback to the original figure.
+   *
+   * @param fig     The figure to open.
+   * @param width   The requested width in pixels.
+   * @param formats The acceptable formats in order of preference.
+   *
+   * @return A file handler to the respective image file.
+   */
+  def openDerivative(fig: Figure, width: Int, formats: Seq[ImageFormat]) : File = {
+    if (fig.uuid == null)
+      throw new IllegalArgumentException("Unable to open file for figure without uuid")
+
+    if (width <= 0)
+      throw new IllegalArgumentException("The requested width must be positive")
+
+    ImageProcessor.findDerivative(figDerivativesPath, fig.uuid, width, formats).getOrElse(openFile(fig))
+  }
+
 }
 
 /**
@@ -296,16 +350,23 @@ object FigureService {
    * As default the relative path "./figures" will be used.
    * A mobile figure will be stored as well.
    * As default the relative path "./figures_mobile" will be used.
+   * Derivatives in multiple resolutions are stored under "file.fig_derivatives_path",
+   * as default the relative path "./figures_derivatives" will be used.
    *
    * @return A new figure service.
    */
   def apply[A]() : FigureService = {
     new FigureService(Play.application().configuration().getString("file.fig_path", "./figures"),
-      Play.application().configuration().getString("file.fig_mobile_path", "./figures_mobile"))
+      Play.application().configuration().getString("file.fig_mobile_path", "./figures_mobile"),
+      Play.application().configuration().getString("file.fig_derivatives_path", "./figures_derivatives"))
   }
 
   def apply(figPath: String, figMobilePath: String) = {
-    new FigureService(figPath, figMobilePath)
+    new FigureService(figPath, figMobilePath, "./figures_derivatives")
+  }
+
+  def apply(figPath: String, figMobilePath: String, figDerivativesPath: String) = {
+    new FigureService(figPath, figMobilePath, figDerivativesPath)
   }
 
 }
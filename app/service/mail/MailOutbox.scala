@@ -0,0 +1,221 @@
+package service.mail
+
+import javax.persistence.{EntityManager, EntityNotFoundException, TypedQuery}
+
+import models.OutboxMail
+import org.joda.time.{DateTimeZone, DateTime}
+import play.api.Play
+import plugins.DBUtil._
+import plugins.MailSender
+
+import scala.collection.JavaConversions._
+
+/**
+ * Persistent outbox for mails. Mails are stored as pending and delivered
+ * by the MailSender plugin, which claims due mails, sends them and records
+ * the outcome: sent, retried later with an exponential backoff or dead
+ * after the maximum number of attempts. Sent and dead mails are removed
+ * after the retention time.
+ */
+class MailOutbox(val maxAttempts: Int, val backoff: Long, val maxBackoff: Long, val retention: Long) {
+
+  /**
+   * Store a mail in the outbox within a running transaction.
+   * The sender must be woken up after the transaction was committed.
+   *
+   * @param em   The entity manager of the transaction.
+   * @param mail The mail to store.
+   *
+   * @return The stored mail.
+   */
+  def enqueue(em: EntityManager, mail: OutboxMail) : OutboxMail = {
+    em.persist(mail)
+    mail
+  }
+
+  /**
+   * Store a mail in the outbox and wake up the sender.
+   *
+   * @param mail The mail to store.
+   *
+   * @return The stored mail.
+   */
+  def enqueue(mail: OutboxMail) : OutboxMail = {
+    val stored = transaction { (em, tx) =>
+      enqueue(em, mail)
+    }
+
+    MailSender.wake()
+    stored
+  }
+
+  /**
+   * Get a mail of the outbox.
+   *
+   * @param id The id of the mail.
+   *
+   * @return The mail.
+   * @throws EntityNotFoundException If the mail does not exist.
+   */
+  def get(id: String) : OutboxMail = {
+    query { em =>
+      val mail = em.find(classOf[OutboxMail], id)
+      if (mail == null)
+        throw new EntityNotFoundException("Unable to find mail with uuid = " + id)
+      mail
+    }
+  }
+
+  /**
+   * List pending mails that are due, oldest first.
+   *
+   * @param limit The maximum number of mails.
+   *
+   * @return The due mails.
+   */
+  def listDue(limit: Int) : Seq[OutboxMail] = {
+    query { em =>
+      val queryStr =
+        """SELECT m FROM OutboxMail m
+           WHERE m.state = :state AND m.nextAttempt <= :now
+           ORDER BY m.nextAttempt"""
+
+      val query: TypedQuery[OutboxMail] = em.createQuery(queryStr, classOf[OutboxMail])
+      query.setParameter("state", OutboxMail.PENDING)
+      query.setParameter("now", new DateTime(DateTimeZone.UTC))
+      query.setMaxResults(limit)
+      asScalaBuffer(query.getResultList)
+    }
+  }
+
+  /**
+   * Claim a due mail for sending by counting the attempt and moving the next
+   * attempt to the end of the lease. Only one sender can claim an attempt;
+   * if the sender dies the mail is due again when the lease expires.
+   *
+   * @param mail  The mail as returned by listDue.
+   * @param lease The time after which the mail may be claimed again.
+   *
+   * @return True if the mail was claimed.
+   */
+  def claim(mail: OutboxMail, lease: DateTime) : Boolean = {
+    transaction { (em, tx) =>
+      val queryStr =
+        """UPDATE OutboxMail m SET m.attempts = m.attempts + 1, m.nextAttempt = :lease
+           WHERE m.uuid = :uuid AND m.state = :state AND m.attempts = :attempts"""
+
+      em.createQuery(queryStr)
+        .setParameter("lease", lease)
+        .setParameter("uuid", mail.uuid)
+        .setParameter("state", OutboxMail.PENDING)
+        .setParameter("attempts", mail.attempts)
+        .executeUpdate() == 1
+    }
+  }
+
+  /**
+   * Record that a mail was sent. The body is dropped, since it may contain
+   * activation links.
+   *
+   * @param id The id of the mail.
+   */
+  def markSent(id: String) : Unit = {
+    transaction { (em, tx) =>
+      val mail = em.find(classOf[OutboxMail], id)
+      if (mail != null) {
+        mail.state = OutboxMail.SENT
+        mail.sentAt = new DateTime(DateTimeZone.UTC)
+        mail.bodyText = null
+        mail.lastError = null
+      }
+    }
+  }
+
+  /**
+   * Record a failed attempt. The mail is retried after the backoff of its
+   * attempt or becomes dead if it reached the maximum number of attempts.
+   * The body of a dead mail is dropped like the body of a sent mail.
+   *
+   * @param id    The id of the mail.
+   * @param error The cause of the failure.
+   *
+   * @return The updated mail or None if it does not exist anymore.
+   */
+  def markFailed(id: String, error: String) : Option[OutboxMail] = {
+    transaction { (em, tx) =>
+      Option(em.find(classOf[OutboxMail], id)).map { mail =>
+        mail.lastError = Option(error).map(_.take(2500)).orNull
+
+        if (mail.attempts >= maxAttempts) {
+          mail.state = OutboxMail.DEAD
+          mail.bodyText = null
+        } else {
+          mail.nextAttempt = new DateTime(DateTimeZone.UTC).plus(delay(mail.attempts))
+        }
+
+        mail
+      }
+    }
+  }
+
+  /**
+   * The delay before the next attempt: backoff * 2^(attempts - 1), at most maxBackoff.
+   *
+   * @param attempts The number of attempts so far.
+   *
+   * @return The delay in milliseconds.
+   */
+  def delay(attempts: Int) : Long = {
+    val exponent = math.min(math.max(attempts - 1, 0), 30)
+    math.min(backoff << exponent, maxBackoff)
+  }
+
+  /**
+   * Remove sent and dead mails that were created before a point in time.
+   *
+   * @param before The point in time.
+   *
+   * @return The number of removed mails.
+   */
+  def purge(before: DateTime) : Int = {
+    transaction { (em, tx) =>
+      em.createQuery("DELETE FROM OutboxMail m WHERE m.state <> :state AND m.ctime < :before")
+        .setParameter("state", OutboxMail.PENDING)
+        .setParameter("before", before)
+        .executeUpdate()
+    }
+  }
+
+  /**
+   * The number of mails in the outbox by state.
+   */
+  def countByState : Map[String, Long] = {
+    query { em =>
+      val query = em.createQuery("SELECT m.state, COUNT(m) FROM OutboxMail m GROUP BY m.state",
+        classOf[Array[AnyRef]])
+
+      asScalaBuffer(query.getResultList).map { row =>
+        row(0).asInstanceOf[String] -> row(1).asInstanceOf[Number].longValue
+      }.toMap
+    }
+  }
+
+}
+
+object MailOutbox {
+
+  /**
+   * Create an outbox configured under "mail.outbox" with the keys
+   * "maxAttempts", "backoff", "maxBackoff" and "retention".
+   */
+  def apply() : MailOutbox = {
+    val config = Play.current.configuration
+    new MailOutbox(
+      config.getInt("mail.outbox.maxAttempts").getOrElse(8),
+      config.getMilliseconds("mail.outbox.backoff").getOrElse(30000L),
+      config.getMilliseconds("mail.outbox.maxBackoff").getOrElse(6 * 60 * 60 * 1000L),
+      config.getMilliseconds("mail.outbox.retention").getOrElse(30 * 24 * 60 * 60 * 1000L)
+    )
+  }
+
+}
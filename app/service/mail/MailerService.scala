@@ -1,33 +1,103 @@
 package service.mail
 
-import models.Account
+import java.util.UUID
+import javax.persistence.{EntityManager, EntityNotFoundException}
+
+import com.mohiva.play.silhouette.core.LoginInfo
+import conf.Global
+import models.{Account, OutboxMail}
 import play.api.Play.current
-import play.api.libs.mailer.{MailerPlugin, Email}
+import plugins.DBUtil._
+import utils.DefaultRoutesResolver
+
+import scala.concurrent.Await
+import scala.concurrent.duration._
 
 
+/**
+ * Composes the mails of the application and puts them into the outbox.
+ * Mails are sent in the background by the MailSender plugin.
+ */
 class MailerService {
 
   val from: String = current.configuration.getString("smtp.from").get
+  val outbox = MailOutbox()
 
-  def sendPasswordReset(account: Account, password: String, loginUrl: String): Unit = {
-    val mail = Email(
+  /**
+   * The password reset mail is stored without body, since the body contains
+   * the new password. It refers to the account and is rendered when it is sent.
+   */
+  def passwordReset(account: Account): OutboxMail = {
+    val mail = OutboxMail(
       subject = "Reset password",
-      from = from,
-      to = Seq(account.mail),
-      bodyText = Some(views.html.mail.pwreset(account, password, loginUrl).toString())
+      sender = from,
+      recipients = Seq(account.mail),
+      bodyText = null
     )
 
-    MailerPlugin.send(mail)
+    mail.template = MailerService.PasswordReset
+    mail.reference = account.uuid
+    mail
   }
 
-  def sendConfirmation(account: Account, tokenUrl: String): Unit = {
-    val mail = Email(
+  def confirmation(account: Account, tokenUrl: String): OutboxMail = {
+    OutboxMail(
       subject = "Please confirm your registration",
-      from = from,
-      to = Seq(account.mail),
-      bodyText = Some(views.html.mail.confirmation(account, tokenUrl).toString())
+      sender = from,
+      recipients = Seq(account.mail),
+      bodyText = views.html.mail.confirmation(account, tokenUrl).toString()
     )
+  }
+
+  def sendPasswordReset(account: Account): Unit = {
+    outbox.enqueue(passwordReset(account))
+  }
+
+  def sendConfirmation(account: Account, tokenUrl: String): Unit = {
+    outbox.enqueue(confirmation(account, tokenUrl))
+  }
 
-    MailerPlugin.send(mail)
+  /**
+   * Queue the confirmation mail within the transaction that creates the account.
+   */
+  def sendConfirmation(em: EntityManager, account: Account, tokenUrl: String): Unit = {
+    outbox.enqueue(em, confirmation(account, tokenUrl))
   }
+
+  /**
+   * Get the body of a mail that is about to be sent. For password reset
+   * mails a new password is created and saved first, so every attempt to
+   * send the mail sets a new password.
+   *
+   * @param mail The mail to send.
+   *
+   * @return The body of the mail.
+   */
+  def render(mail: OutboxMail): String = {
+    mail.template match {
+      case MailerService.PasswordReset =>
+        val account = query { em =>
+          val account = em.find(classOf[Account], mail.reference)
+          if (account == null)
+            throw new EntityNotFoundException("Unable to find account with uuid = " + mail.reference)
+          account
+        }
+
+        val env = Global.globalEnv
+        val newpass = UUID.randomUUID.toString.substring(0, 8)
+        val loginInfo = LoginInfo(env.credentialsProvider.id, account.mail)
+
+        Await.result(env.authInfoService.save(loginInfo, env.pwHasher.hash(newpass)), 5 seconds)
+
+        views.html.mail.pwreset(account, newpass, DefaultRoutesResolver.resolver.loginUrl.toString).toString()
+      case _ =>
+        mail.bodyText
+    }
+  }
+}
+
+object MailerService {
+
+  val PasswordReset = "passwordReset"
+
 }
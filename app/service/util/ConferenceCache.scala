@@ -0,0 +1,165 @@
+package service.util
+
+import java.io.ByteArrayOutputStream
+import java.util.concurrent.atomic.AtomicLong
+import java.util.concurrent.{ConcurrentHashMap, CopyOnWriteArrayList}
+import java.util.zip.GZIPOutputStream
+
+import org.apache.commons.codec.digest.DigestUtils
+
+import scala.collection.JavaConversions._
+
+/**
+ * A serialized response body together with its ETag.
+ *
+ * @param body The serialized body.
+ * @param eTag The ETag of the body.
+ */
+case class CachedBody(body: String, eTag: String)
+
+/**
+ * A response body that is stored encoded and gzip compressed together with its ETag,
+ * so that neither has to be computed per request.
+ *
+ * @param body    The UTF-8 encoded body.
+ * @param gzipped The gzip compressed body.
+ * @param eTag    The ETag of the body.
+ */
+case class CompressedBody(body: Array[Byte], gzipped: Array[Byte], eTag: String)
+
+object CompressedBody {
+
+  /**
+   * Encode and compress a body.
+   *
+   * @param text The body.
+   *
+   * @return The compressed body with the MD5 digest of the text as ETag.
+   */
+  def apply(text: String) : CompressedBody = {
+    val body = text.getBytes("UTF-8")
+
+    val bytes = new ByteArrayOutputStream(body.length / 4 + 64)
+    val gzip = new GZIPOutputStream(bytes)
+    try {
+      gzip.write(body)
+    } finally {
+      gzip.close()
+    }
+
+    CompressedBody(body, bytes.toByteArray, DigestUtils.md5Hex(text))
+  }
+
+}
+
+/**
+ * In-memory cache for values that are derived from the data of a single
+ * conference, e.g. a serialized list of abstracts.
+ *
+ * Values are stored under an arbitrary key (e.g. the conference id or the short
+ * name as used in the request) but always remember the uuid of the conference
+ * they were derived from. All values of a conference are dropped when the
+ * conference is invalidated via ConferenceCache.invalidate.
+ */
+class ConferenceCache[V] private () {
+
+  private case class Entry(conference: String, value: V)
+
+  private val entries = new ConcurrentHashMap[String, Entry]()
+  private val epoch = new AtomicLong(0)
+
+  /**
+   * Get a cached value.
+   *
+   * @param key The key of the value.
+   *
+   * @return The value or None if nothing is cached for the key.
+   */
+  def get(key: String) : Option[V] = {
+    Option(entries.get(key)).map(_.value)
+  }
+
+  /**
+   * Get a cached value or compute and store it.
+   *
+   * @param key     The key of the value.
+   * @param compute Computes the uuid of the conference the value belongs to
+   *                and the value itself.
+   *
+   * @return The cached or the newly computed value.
+   */
+  def getOrElseUpdate(key: String)(compute: => (String, V)) : V = {
+    get(key) match {
+      case Some(value) => value
+      case None =>
+        val started = epoch.get
+        val (conference, value) = compute
+        val entry = Entry(conference, value)
+
+        // values computed while an invalidation happened may already be stale
+        if (epoch.get == started) {
+          entries.put(key, entry)
+          if (epoch.get != started)
+            entries.remove(key, entry)
+        }
+
+        value
+    }
+  }
+
+  /**
+   * Drop all values that belong to a conference.
+   *
+   * @param conference The uuid of the conference.
+   */
+  def invalidate(conference: String) : Unit = {
+    epoch.incrementAndGet()
+    entries.entrySet().toList.foreach { e =>
+      if (e.getValue.conference == conference)
+        entries.remove(e.getKey, e.getValue)
+    }
+  }
+
+  /**
+   * Drop all values.
+   */
+  def clear() : Unit = {
+    epoch.incrementAndGet()
+    entries.clear()
+  }
+
+}
+
+object ConferenceCache {
+
+  private val caches = new CopyOnWriteArrayList[ConferenceCache[_]]()
+
+  /**
+   * Create a new cache that takes part in conference invalidation.
+   *
+   * @return A new and empty cache.
+   */
+  def apply[V]() : ConferenceCache[V] = {
+    val cache = new ConferenceCache[V]()
+    caches.add(cache)
+    cache
+  }
+
+  /**
+   * Drop the values of a conference from all caches. This must be called
+   * after a change of the conference or its abstracts has been committed.
+   *
+   * @param conference The uuid of the conference.
+   */
+  def invalidate(conference: String) : Unit = {
+    caches.foreach(_.invalidate(conference))
+  }
+
+  /**
+   * Drop all values from all caches.
+   */
+  def clear() : Unit = {
+    caches.foreach(_.clear())
+  }
+
+}
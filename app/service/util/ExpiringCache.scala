@@ -0,0 +1,98 @@
+package service.util
+
+import java.util.{LinkedHashMap => JLinkedHashMap, Map => JMap}
+
+/**
+ * A small in-memory cache with a bounded number of entries and a time to live.
+ * When the cache is full the least recently used entry is dropped.
+ *
+ * @param maxSize The maximum number of entries.
+ * @param ttl     The time to live of an entry in milliseconds.
+ */
+class ExpiringCache[K, V](val maxSize: Int, val ttl: Long) {
+
+  private case class Entry(value: V, expires: Long)
+
+  private var epoch = 0L
+
+  private val entries = new JLinkedHashMap[K, Entry](16, 0.75f, true) {
+    override def removeEldestEntry(eldest: JMap.Entry[K, Entry]) : Boolean = this.size > maxSize
+  }
+
+  /**
+   * Get a value that has not expired yet.
+   *
+   * @param key The key of the value.
+   *
+   * @return The value or None if there is no valid value for the key.
+   */
+  def get(key: K) : Option[V] = entries.synchronized {
+    Option(entries.get(key)) match {
+      case Some(entry) if entry.expires > System.currentTimeMillis() => Some(entry.value)
+      case Some(entry) =>
+        entries.remove(key)
+        None
+      case None => None
+    }
+  }
+
+  /**
+   * Store a value.
+   *
+   * @param key   The key of the value.
+   * @param value The value.
+   */
+  def put(key: K, value: V) : Unit = entries.synchronized {
+    entries.put(key, Entry(value, System.currentTimeMillis() + ttl))
+  }
+
+  /**
+   * Get a valid value or compute and store it. Values for which
+   * the computation returns None are not stored, neither are values
+   * computed while an invalidation happened, since they may be stale.
+   *
+   * @param key     The key of the value.
+   * @param compute Computes the value.
+   *
+   * @return The cached or the newly computed value.
+   */
+  def getOrElseUpdate(key: K)(compute: => Option[V]) : Option[V] = {
+    get(key) match {
+      case Some(value) => Some(value)
+      case None =>
+        val started = entries.synchronized(epoch)
+        val value = compute
+        entries.synchronized {
+          if (epoch == started)
+            value.foreach(put(key, _))
+        }
+        value
+    }
+  }
+
+  /**
+   * Drop the value of a key.
+   *
+   * @param key The key of the value.
+   */
+  def invalidate(key: K) : Unit = entries.synchronized {
+    epoch += 1
+    entries.remove(key)
+  }
+
+  /**
+   * Drop all values.
+   */
+  def clear() : Unit = entries.synchronized {
+    epoch += 1
+    entries.clear()
+  }
+
+  /**
+   * Number of entries, including expired entries that were not dropped yet.
+   */
+  def size : Int = entries.synchronized {
+    entries.size
+  }
+
+}
@@ -0,0 +1,330 @@
+package service.util
+
+import java.io.File
+import java.nio.file.{Files, NoSuchFileException, Paths, StandardCopyOption}
+import java.util.concurrent.RejectedExecutionException
+
+import com.sksamuel.scrimage.Image
+import com.sksamuel.scrimage.nio.{ImageWriter, JpegWriter, PngWriter}
+import play.api.{Logger, Play}
+import org.apache.commons.io.FileUtils
+import utils.BoundedExecutor
+
+import scala.collection.JavaConversions._
+import scala.concurrent.Future
+import scala.math.sqrt
+import scala.util.control.Breaks.{break, breakable}
+
+/**
+ * An encoding in which image derivatives can be written.
+ *
+ * @param name      The name of the format used in the configuration.
+ * @param mimeType  The content type of the encoded images.
+ * @param extension The file extension of the encoded images.
+ * @param writer    The scrimage writer for the format.
+ */
+case class ImageFormat(name: String, mimeType: String, extension: String, writer: ImageWriter)
+
+/**
+ * Creates downscaled derivatives of uploaded images (figures and banners)
+ * on a bounded pool of worker threads, outside of any request or transaction.
+ */
+object ImageProcessor {
+
+  lazy val executor = BoundedExecutor("images", 2, 100)
+
+  /**
+   * All formats derivatives can be written in.
+   */
+  val supportedFormats = Seq(
+    ImageFormat("jpeg", "image/jpeg", "jpg", JpegWriter().withCompression(80)),
+    ImageFormat("png", "image/png", "png", PngWriter(9))
+  )
+
+  /**
+   * The widths of the derivatives, configured by name under "images.derivatives".
+   */
+  lazy val derivativeWidths : Seq[Int] = {
+    Play.current.configuration.getConfig("images.derivatives").map { config =>
+      config.subKeys.toSeq.flatMap(config.getInt(_))
+    }.getOrElse(Seq(160, 480, 1024, 2048)).distinct.sorted
+  }
+
+  /**
+   * The formats derivatives are written in, in order of preference,
+   * configured under "images.formats".
+   */
+  lazy val derivativeFormats : Seq[ImageFormat] = {
+    val names = Play.current.configuration.getStringList("images.formats").map(_.toSeq).getOrElse(Seq("jpeg"))
+    names.flatMap { name =>
+      val format = supportedFormats.find(_.name == name)
+      if (format.isEmpty) {
+        Logger.warn(s"ImageProcessor: unsupported image format [$name] ignored")
+      }
+      format
+    }
+  }
+
+  /**
+   * Queue the creation of the mobile version of an image.
+   * If the queue is full the derivative is not created, which is fine since
+   * downloads of the mobile version fall back to the original image.
+   *
+   * @param sourceDir The directory of the original image.
+   * @param targetDir The directory of the mobile image.
+   * @param name      The file name of the image in both directories.
+   *
+   * @return A future that completes when the mobile image was written.
+   */
+  def submitMobile(sourceDir: String, targetDir: String, name: String) : Future[Unit] = {
+    try {
+      Future {
+        createMobile(sourceDir, targetDir, name)
+      }(executor)
+    } catch {
+      case e: RejectedExecutionException =>
+        Logger.warn(s"ImageProcessor: queue full, no mobile version for [$name]")
+        Future.failed(e)
+    }
+  }
+
+  /**
+   * Queue the creation of all derivatives of an image.
+   * If the queue is full no derivatives are created and the original
+   * image is served instead.
+   *
+   * @param sourceDir The directory of the original image.
+   * @param targetDir The directory in which the derivatives are stored.
+   * @param name      The file name of the original image.
+   *
+   * @return A future that completes when all derivatives were written.
+   */
+  def submitDerivatives(sourceDir: String, targetDir: String, name: String) : Future[Unit] = {
+    try {
+      Future {
+        createDerivatives(sourceDir, targetDir, name)
+      }(executor)
+    } catch {
+      case e: RejectedExecutionException =>
+        Logger.warn(s"ImageProcessor: queue full, no derivatives for [$name]")
+        Future.failed(e)
+    }
+  }
+
+  /**
+   * Queue the creation of the mobile version and of all derivatives of an
+   * image as a single job, so the original is decoded only once.
+   * If the queue is full nothing is created and the original image is
+   * served instead.
+   *
+   * @param sourceDir      The directory of the original image.
+   * @param mobileDir      The directory of the mobile image.
+   * @param derivativesDir The directory in which the derivatives are stored.
+   * @param name           The file name of the original image.
+   *
+   * @return A future that completes when all versions were written.
+   */
+  def submitVersions(sourceDir: String, mobileDir: String, derivativesDir: String, name: String) : Future[Unit] = {
+    try {
+      Future {
+        createVersions(sourceDir, mobileDir, derivativesDir, name)
+      }(executor)
+    } catch {
+      case e: RejectedExecutionException =>
+        Logger.warn(s"ImageProcessor: queue full, no versions for [$name]")
+        Future.failed(e)
+    }
+  }
+
+  /**
+   * Queue the creation of the mobile versions and derivatives of several
+   * images as a single job that processes one image after another, e.g.
+   * for images that were uploaded before derivatives were introduced.
+   * Images that cannot be decoded are skipped.
+   *
+   * @param sourceDir      The directory of the original images.
+   * @param mobileDir      The directory of the mobile images.
+   * @param derivativesDir The directory in which the derivatives are stored.
+   * @param names          The file names of the original images.
+   *
+   * @return A future that completes when all versions were written.
+   */
+  def submitVersions(sourceDir: String, mobileDir: String, derivativesDir: String,
+                     names: Seq[String]) : Future[Unit] = {
+    try {
+      Future {
+        names.foreach { name =>
+          try {
+            createVersions(sourceDir, mobileDir, derivativesDir, name)
+          } catch {
+            case e: Exception => Logger.warn(s"ImageProcessor: no versions for [$name]: $e")
+          }
+        }
+      }(executor)
+    } catch {
+      case e: RejectedExecutionException =>
+        Logger.warn(s"ImageProcessor: queue full, no versions for ${names.size} images")
+        Future.failed(e)
+    }
+  }
+
+  /**
+   * Create the mobile version and the derivatives of an image from a single
+   * decode of the original.
+   *
+   * @param sourceDir      The directory of the original image.
+   * @param mobileDir      The directory of the mobile image.
+   * @param derivativesDir The directory in which the derivatives are stored.
+   * @param name           The file name of the original image.
+   */
+  def createVersions(sourceDir: String, mobileDir: String, derivativesDir: String, name: String) : Unit = {
+    val (image, dirs) = load(sourceDir, Seq(mobileDir, derivativesDir), name)
+    writeMobile(image, dirs.head, name)
+    writeDerivatives(image, dirs(1), name)
+  }
+
+  /**
+   * Create the derivatives of an image for all configured widths and formats.
+   * The original is decoded only once. Derivatives that would not be smaller
+   * than the original are skipped, since the original is served for them.
+   *
+   * @param sourceDir The directory of the original image.
+   * @param targetDir The directory in which the derivatives are stored.
+   * @param name      The file name of the original image.
+   */
+  def createDerivatives(sourceDir: String, targetDir: String, name: String) : Unit = {
+    val (image, dirs) = load(sourceDir, Seq(targetDir), name)
+    writeDerivatives(image, dirs.head, name)
+  }
+
+  /**
+   * Check whether the derivatives of an image were created.
+   *
+   * @param targetDir The directory in which the derivatives are stored.
+   * @param name      The file name of the original image.
+   */
+  def hasDerivatives(targetDir: String, name: String) : Boolean = {
+    new File(targetDir, name).isDirectory
+  }
+
+  /**
+   * Find the derivative of an image that fits a requested width best:
+   * the smallest derivative that is at least as wide as requested in the
+   * first of the given formats that is available.
+   *
+   * @param targetDir The directory in which the derivatives are stored.
+   * @param name      The file name of the original image.
+   * @param width     The requested width.
+   * @param formats   The acceptable formats in order of preference.
+   *
+   * @return The derivative or None if the original should be served.
+   */
+  def findDerivative(targetDir: String, name: String, width: Int, formats: Seq[ImageFormat]) : Option[File] = {
+    derivativeWidths.find(_ >= width).flatMap { w =>
+      formats.view.map(f => new File(new File(targetDir, name), w + "." + f.extension)).find { file =>
+        file.exists && file.canRead
+      }
+    }
+  }
+
+  /**
+   * Remove all derivatives of an image.
+   *
+   * @param targetDir The directory in which the derivatives are stored.
+   * @param name      The file name of the original image.
+   */
+  def deleteDerivatives(targetDir: String, name: String) : Unit = {
+    FileUtils.deleteQuietly(new File(targetDir, name))
+  }
+
+  /**
+   * Create the mobile version of an image: the image is scaled down until
+   * its raw size is below 2.5 MB and written as JPEG. The derivative is
+   * first written to a temporary file and then moved to its final location,
+   * so that a partially written derivative is never served.
+   *
+   * @param sourceDir The directory of the original image.
+   * @param targetDir The directory of the mobile image.
+   * @param name      The file name of the image in both directories.
+   */
+  def createMobile(sourceDir: String, targetDir: String, name: String) : Unit = {
+    val (image, dirs) = load(sourceDir, Seq(targetDir), name)
+    writeMobile(image, dirs.head, name)
+  }
+
+  private def writeDerivatives(image: Image, dir: File, name: String) : Unit = {
+    val derivativeDir = new File(dir, name)
+
+    // the directory marks the image as processed, even if it is too small for any derivative
+    derivativeDir.mkdirs()
+
+    derivativeWidths.filter(_ < image.width).foreach { width =>
+      val scaled = image.scaleToWidth(width)
+      derivativeFormats.foreach { format =>
+        write(scaled, new File(derivativeDir, width + "." + format.extension), format.writer)
+      }
+    }
+  }
+
+  private def writeMobile(original: Image, dir: File, name: String) : Unit = {
+    var image = original
+    var currentSize = image.bytes.length.toFloat
+
+    breakable {
+      for (i <- 1 to 10) {
+        if (currentSize > 2500000.0) {
+          image = image.scale(sqrt(1250000.0 / currentSize))
+          currentSize = image.bytes.length.toFloat
+        } else {
+          break
+        }
+      }
+    }
+
+    write(image, new File(dir, name), JpegWriter().withCompression(25))
+  }
+
+  /**
+   * Decode an original image.
+   *
+   * @return The image and the directories in which its versions are stored.
+   */
+  private def load(sourceDir: String, targetDirs: Seq[String], name: String) : (Image, Seq[File]) = {
+
+    // In a docker environment '/target/universal/stage' is used when resolving '.'
+    // in a relative path. 'java.io.File' seems to properly resolve the relative paths
+    // even in a docker environment, but the third party library scrimage cannot work
+    // with these file descriptors and requires file descriptors created with absolute paths.
+    //   As a workaround the file not found exception is caught and the docker container
+    // root path is used to create file descriptior with absolut paths appropriate for
+    // the docker environment.
+    try {
+      (Image.fromFile(new File(sourceDir, name)), targetDirs.map(new File(_)))
+    } catch {
+      case nofile: NoSuchFileException =>
+        (Image.fromFile(new File(Paths.get("/srv", "gca", sourceDir, name).normalize.toString)),
+          targetDirs.map(dir => new File(Paths.get("/srv", "gca", dir).normalize.toString)))
+    }
+  }
+
+  /**
+   * Write an image to a temporary file first and then move it to its final
+   * location, so that a partially written image is never served.
+   */
+  private def write(image: Image, targetFile: File, writer: ImageWriter) : Unit = {
+    val targetParent = targetFile.getParentFile
+    if (!targetParent.exists()) {
+      targetParent.mkdirs()
+    }
+
+    val tmpFile = File.createTempFile(targetFile.getName, ".tmp", targetParent)
+    try {
+      image.output(tmpFile)(writer)
+      Files.move(tmpFile.toPath, targetFile.toPath,
+        StandardCopyOption.REPLACE_EXISTING, StandardCopyOption.ATOMIC_MOVE)
+    } finally {
+      tmpFile.delete()
+    }
+  }
+
+}
@@ -0,0 +1,213 @@
+package service.util
+
+import org.joda.time.format.{DateTimeFormat, ISODateTimeFormat}
+import org.joda.time.{DateTimeZone, LocalDate, LocalDateTime, LocalTime}
+import play.api.libs.json._
+
+import scala.collection.mutable.ArrayBuffer
+import scala.util.Try
+
+/**
+ * A single event of a conference schedule together with its position in the schedule.
+ *
+ * @param entry The index of the top level entry (session, track or event).
+ * @param track The index of the track within a session, or -1.
+ * @param event The index of the event within its track, or -1.
+ * @param title The title of the track the event belongs to, if any.
+ * @param start The start of the event in milliseconds (local conference time).
+ * @param end   The end of the event in milliseconds (local conference time).
+ */
+case class ScheduleEvent(entry: Int, track: Int, event: Int, title: Option[String], start: Long, end: Long)
+
+/**
+ * A parsed and validated conference schedule with an interval index over all events.
+ *
+ * The schedule is a list of sessions (with "tracks"), tracks (with "events") and events.
+ * Every event has a "date" (yyyy-MM-dd) and an optional "start" and "end" (HH:mm); events
+ * without start begin at 00:00, events without end last until 23:59.
+ *
+ * @param entries The top level entries of the schedule.
+ * @param events  All events sorted by start.
+ * @param eTag    The ETag of the schedule the index was built from.
+ */
+class ScheduleIndex private (val entries: IndexedSeq[JsObject], val events: IndexedSeq[ScheduleEvent], val eTag: String) {
+
+  private val starts = events.map(_.start).toArray
+  private val maxDuration = if (events.isEmpty) 0L else events.map(e => e.end - e.start).max
+
+  /**
+   * Find all events that overlap a time window. Since events are sorted by start and no
+   * event is longer than the longest event, only events starting within the window or at
+   * most the longest duration before it need to be looked at.
+   *
+   * @param from  The start of the window (inclusive) or None.
+   * @param to    The end of the window (exclusive) or None.
+   * @param track Only events of tracks with this title (case insensitive) or None.
+   *
+   * @return The matching events in the order of their start.
+   */
+  def find(from: Option[Long], to: Option[Long], track: Option[String]) : Seq[ScheduleEvent] = {
+    val first = from.map(f => lowerBound(f - maxDuration)).getOrElse(0)
+    val last = to.map(lowerBound).getOrElse(starts.length)
+
+    events.slice(first, last).filter { e =>
+      from.forall(f => e.end > f || e.start >= f) &&
+        track.forall(t => e.title.exists(_.equalsIgnoreCase(t)))
+    }
+  }
+
+  /**
+   * Select the parts of the schedule that overlap a time window. The result has the
+   * format of the schedule itself: sessions only contain the matching tracks and
+   * tracks only contain the matching events.
+   *
+   * @param from  The start of the window (inclusive) or None.
+   * @param to    The end of the window (exclusive) or None.
+   * @param track Only events of tracks with this title (case insensitive) or None.
+   *
+   * @return The selected part of the schedule.
+   */
+  def select(from: Option[Long], to: Option[Long], track: Option[String]) : JsArray = {
+    val selected = find(from, to, track).sortBy(e => (e.entry, e.track, e.event))
+
+    JsArray(selected.groupBy(_.entry).toSeq.sortBy(_._1).map { case (i, entryEvents) =>
+      val entry = entries(i)
+      if (entry.keys.contains("tracks")) {
+        val tracks = (entry \ "tracks").as[JsArray].value
+        entry + ("tracks" -> JsArray(entryEvents.groupBy(_.track).toSeq.sortBy(_._1).map { case (t, trackEvents) =>
+          selectEvents(tracks(t).as[JsObject], trackEvents)
+        }))
+      } else if (entry.keys.contains("events")) {
+        selectEvents(entry, entryEvents)
+      } else {
+        entry
+      }
+    })
+  }
+
+  private def selectEvents(track: JsObject, selected: Seq[ScheduleEvent]) : JsObject = {
+    val events = (track \ "events").as[JsArray].value
+    track + ("events" -> JsArray(selected.map(e => events(e.event))))
+  }
+
+  private def lowerBound(value: Long) : Int = {
+    var low = 0
+    var high = starts.length
+    while (low < high) {
+      val mid = (low + high) >>> 1
+      if (starts(mid) < value) low = mid + 1 else high = mid
+    }
+    low
+  }
+
+}
+
+object ScheduleIndex {
+
+  private val dateFormat = DateTimeFormat.forPattern("yyyy-MM-dd")
+  private val timeFormat = DateTimeFormat.forPattern("HH:mm")
+  private val dateTimeFormat = ISODateTimeFormat.localDateOptionalTimeParser()
+
+  /**
+   * Parse and validate a schedule.
+   *
+   * @param schedule The schedule as JSON string.
+   * @param eTag     The ETag of the schedule.
+   *
+   * @return The schedule with its index.
+   *
+   * @throws IllegalArgumentException If the schedule is not valid.
+   */
+  def apply(schedule: String, eTag: String) : ScheduleIndex = {
+    val json = Try(Json.parse(schedule)).getOrElse {
+      throw new IllegalArgumentException("Schedule is not valid JSON")
+    }
+
+    val entries = json match {
+      case JsArray(values) => values.zipWithIndex.map { case (value, i) => obj(value, s"entry $i") }.toIndexedSeq
+      case _ => throw new IllegalArgumentException("Schedule must be a list of sessions, tracks and events")
+    }
+
+    val events = new ArrayBuffer[ScheduleEvent]()
+    entries.zipWithIndex.foreach { case (entry, i) =>
+      if (entry.keys.contains("tracks")) {
+        list(entry, "tracks", s"session $i").zipWithIndex.foreach { case (value, t) =>
+          val track = obj(value, s"track $t of session $i")
+          list(track, "events", s"track $t of session $i").zipWithIndex.foreach { case (event, e) =>
+            events += parseEvent(event, s"event $e of track $t of session $i", i, t, e, title(track))
+          }
+        }
+      } else if (entry.keys.contains("events")) {
+        list(entry, "events", s"track $i").zipWithIndex.foreach { case (event, e) =>
+          events += parseEvent(event, s"event $e of track $i", i, -1, e, title(entry))
+        }
+      } else {
+        events += parseEvent(entry, s"event $i", i, -1, -1, None)
+      }
+    }
+
+    new ScheduleIndex(entries, events.sortBy(e => (e.start, e.end)).toIndexedSeq, eTag)
+  }
+
+  /**
+   * Parse the start or end of a time window: a date (yyyy-MM-dd) or a local
+   * date and time (yyyy-MM-ddTHH:mm).
+   *
+   * @param value     The value to parse.
+   * @param endOfDay  Whether a date without time means the end of the day.
+   *
+   * @return The time in milliseconds (local conference time).
+   *
+   * @throws IllegalArgumentException If the value can not be parsed.
+   */
+  def parseTime(value: String, endOfDay: Boolean = false) : Long = {
+    val time = Try(dateTimeFormat.parseLocalDateTime(value)).getOrElse {
+      throw new IllegalArgumentException("Invalid date or time: " + value)
+    }
+
+    val result = if (endOfDay && !value.contains("T")) time.plusDays(1) else time
+    millis(result)
+  }
+
+  private def parseEvent(value: JsValue, name: String, entry: Int, track: Int, event: Int,
+                         trackTitle: Option[String]) : ScheduleEvent = {
+    val obj = this.obj(value, name)
+    title(obj).getOrElse(throw new IllegalArgumentException(s"Schedule $name has no title"))
+
+    val date = (obj \ "date").asOpt[String].flatMap(d => Try(LocalDate.parse(d, dateFormat)).toOption).getOrElse {
+      throw new IllegalArgumentException(s"Schedule $name has no valid date (yyyy-MM-dd)")
+    }
+
+    val start = time(obj, "start", name).getOrElse(new LocalTime(0, 0))
+    val end = time(obj, "end", name).getOrElse(new LocalTime(23, 59))
+    if (end.isBefore(start))
+      throw new IllegalArgumentException(s"Schedule $name ends before it starts")
+
+    ScheduleEvent(entry, track, event, trackTitle, millis(date.toLocalDateTime(start)), millis(date.toLocalDateTime(end)))
+  }
+
+  private def time(obj: JsObject, field: String, name: String) : Option[LocalTime] = {
+    (obj \ field) match {
+      case JsString(value) if value.nonEmpty => Some(Try(LocalTime.parse(value, timeFormat)).getOrElse {
+        throw new IllegalArgumentException(s"Schedule $name has no valid $field (HH:mm)")
+      })
+      case JsString(_) | JsNull | _: JsUndefined => None
+      case _ => throw new IllegalArgumentException(s"Schedule $name has no valid $field (HH:mm)")
+    }
+  }
+
+  private def title(obj: JsObject) : Option[String] = (obj \ "title").asOpt[String]
+
+  private def obj(value: JsValue, name: String) : JsObject = value match {
+    case o: JsObject => o
+    case _ => throw new IllegalArgumentException(s"Schedule $name is not an object")
+  }
+
+  private def list(obj: JsObject, field: String, name: String) : Seq[JsValue] = (obj \ field) match {
+    case JsArray(values) => values
+    case _ => throw new IllegalArgumentException(s"Schedule $name has no list of $field")
+  }
+
+  private def millis(time: LocalDateTime) : Long = time.toDateTime(DateTimeZone.UTC).getMillis
+
+}
@@ -0,0 +1,147 @@
+package service.util
+
+import java.text.Normalizer
+
+import scala.collection.mutable.{ArrayBuffer, HashMap => MHashMap}
+
+/**
+ * A search hit.
+ *
+ * @param doc   The matching document.
+ * @param score The score of the document, higher is better.
+ */
+case class SearchHit[D](doc: D, score: Double)
+
+/**
+ * An in-memory inverted index over documents with weighted text fields.
+ * Documents are ranked with BM25 where the term frequency of a document is
+ * the weighted sum of the term frequencies of its fields. The last term of
+ * a query also matches as a prefix, so that incomplete words while typing
+ * already find results.
+ *
+ * The index is immutable, changes of the documents require a new index.
+ */
+class SearchIndex[D] private (docs: IndexedSeq[D],
+                              lengths: Array[Double],
+                              postings: Map[String, Array[(Int, Double)]]) {
+
+  private val terms = postings.keys.toArray.sorted
+  private val avgLength = if (lengths.isEmpty) 1.0 else math.max(lengths.sum / lengths.length, 1.0)
+
+  /**
+   * Number of documents in the index.
+   */
+  def size : Int = docs.size
+
+  /**
+   * Search the index.
+   *
+   * @param query The query string.
+   *
+   * @return All matching documents, best matches first.
+   */
+  def search(query: String) : Seq[SearchHit[D]] = {
+    val tokens = SearchIndex.tokenize(query).distinct
+    if (tokens.isEmpty) {
+      return Nil
+    }
+
+    val scores = new MHashMap[Int, Double]()
+
+    tokens.zipWithIndex.foreach { case (token, i) =>
+      val matching = if (i == tokens.size - 1) prefixed(token) else Seq(token).filter(postings.contains)
+
+      // prefix matches of the same token must not add up, use the best one per document
+      val best = new MHashMap[Int, Double]()
+      matching.foreach { term =>
+        val list = postings(term)
+        val idf = math.log(1.0 + (docs.size - list.length + 0.5) / (list.length + 0.5))
+        val exact = if (term == token) 1.0 else SearchIndex.PREFIX_PENALTY
+
+        list.foreach { case (doc, tf) =>
+          val norm = SearchIndex.K1 * (1 - SearchIndex.B + SearchIndex.B * lengths(doc) / avgLength)
+          val score = exact * idf * tf * (SearchIndex.K1 + 1) / (tf + norm)
+          best.put(doc, math.max(best.getOrElse(doc, 0.0), score))
+        }
+      }
+
+      best.foreach { case (doc, score) =>
+        scores.put(doc, scores.getOrElse(doc, 0.0) + score)
+      }
+    }
+
+    scores.toSeq.sortBy { case (doc, score) => (-score, doc) }.map { case (doc, score) =>
+      SearchHit(docs(doc), score)
+    }
+  }
+
+  private def prefixed(prefix: String) : Seq[String] = {
+    val start = java.util.Arrays.binarySearch(terms.asInstanceOf[Array[AnyRef]], prefix) match {
+      case i if i >= 0 => i
+      case i => -(i + 1)
+    }
+
+    terms.view.drop(start).takeWhile(_.startsWith(prefix)).take(SearchIndex.MAX_PREFIX_TERMS).force
+  }
+
+}
+
+object SearchIndex {
+
+  val K1 = 1.2
+  val B = 0.75
+  val PREFIX_PENALTY = 0.8
+  val MAX_PREFIX_TERMS = 50
+
+  /**
+   * Build a new index.
+   *
+   * @param docs   The documents to index.
+   * @param fields Extracts the weighted text fields of a document.
+   *
+   * @return The index.
+   */
+  def apply[D](docs: Seq[D])(fields: D => Seq[(String, Double)]) : SearchIndex[D] = {
+    val indexed = docs.toIndexedSeq
+    val lengths = new Array[Double](indexed.size)
+    val postings = new MHashMap[String, ArrayBuffer[(Int, Double)]]()
+
+    indexed.zipWithIndex.foreach { case (doc, i) =>
+      val frequencies = new MHashMap[String, Double]()
+
+      fields(doc).foreach { case (text, weight) =>
+        val tokens = tokenize(text)
+        lengths(i) += tokens.size
+        tokens.foreach { token =>
+          frequencies.put(token, frequencies.getOrElse(token, 0.0) + weight)
+        }
+      }
+
+      frequencies.foreach { case (token, tf) =>
+        postings.getOrElseUpdate(token, new ArrayBuffer[(Int, Double)]()) += ((i, tf))
+      }
+    }
+
+    new SearchIndex[D](indexed, lengths, postings.mapValues(_.toArray).toMap)
+  }
+
+  /**
+   * Split a text into lower case terms without diacritics.
+   *
+   * @param text The text to split, may be null.
+   *
+   * @return The terms of the text.
+   */
+  def tokenize(text: String) : Seq[String] = {
+    if (text == null) {
+      Nil
+    } else {
+      Normalizer.normalize(text.toLowerCase, Normalizer.Form.NFD)
+        .replaceAll("\\p{M}+", "")
+        .split("[^\\p{L}\\p{N}]+")
+        .filter(_.nonEmpty)
+        .toSeq
+    }
+  }
+
+}
@@ -0,0 +1,113 @@
+package utils
+
+import java.util.concurrent.RejectedExecutionException
+
+import play.api.Logger
+import play.api.http.HeaderNames.RETRY_AFTER
+import play.api.libs.json.Json
+import play.api.mvc.Results.ServiceUnavailable
+import play.api.mvc.{RequestHeader, Result}
+import plugins.QueryStats
+
+import scala.concurrent.Future
+
+/**
+ * Runs the blocking work of controller actions outside of Play's default
+ * dispatcher, which then only serves cheap requests like cached lists and
+ * assets. Database work runs on the "jdbc" executor, file and image work
+ * on the "files" executor. Both have a bounded queue; when it is full the
+ * request is answered with 503 Service Unavailable and a Retry-After header
+ * instead of queueing without limit.
+ */
+object BlockingIO {
+
+  lazy val jdbcExecutor = BoundedExecutor("jdbc", 16, 256)
+  lazy val filesExecutor = BoundedExecutor("files", 4, 64)
+
+  /**
+   * Run a block that accesses the database on the jdbc executor.
+   *
+   * @param block   The body of the action.
+   * @param request The request the block is run for.
+   *
+   * @return The future result of the block.
+   */
+  def jdbc(block: => Result)(implicit request: RequestHeader) : Future[Result] = {
+    submit(jdbcExecutor)(block)
+  }
+
+  /**
+   * Run a block that reads or writes files or processes images on the files executor.
+   *
+   * @param block   The body of the action.
+   * @param request The request the block is run for.
+   *
+   * @return The future result of the block.
+   */
+  def files(block: => Result)(implicit request: RequestHeader) : Future[Result] = {
+    submit(filesExecutor)(block)
+  }
+
+  /**
+   * Run the body of an action on an executor. The block runs in a request
+   * scope of QueryStats, which is attached to the request.
+   *
+   * @param executor The executor to run the block on.
+   * @param block    The body of the action.
+   * @param request  The request the block is run for.
+   *
+   * @return The future result of the block or 503 if the queue of the executor is full.
+   */
+  def submit(executor: BoundedExecutor)(block: => Result)(implicit request: RequestHeader) : Future[Result] = {
+    try {
+      run(executor, Some(request))(block)
+    } catch {
+      case e: RejectedExecutionException =>
+        Logger.warn(s"BlockingIO: ${executor.name} queue full, rejected ${request.method} ${request.path}")
+        Future.successful(ServiceUnavailable(Json.obj(
+          "error" -> true,
+          "message" -> "The server is busy, please try again later"
+        )).withHeaders(RETRY_AFTER -> "1"))
+    }
+  }
+
+  /**
+   * Run a block on an executor after the result of a request was returned,
+   * e.g. to load the pages of a streamed response. The database statistics
+   * of the block are not added to any request.
+   *
+   * @param executor The executor to run the block on.
+   * @param block    The block to run.
+   *
+   * @return The future value of the block, failed if the queue of the executor is full.
+   */
+  def later[A](executor: BoundedExecutor)(block: => A) : Future[A] = {
+    try {
+      run(executor, None)(block)
+    } catch {
+      case e: RejectedExecutionException =>
+        Logger.warn(s"BlockingIO: ${executor.name} queue full, rejected background work")
+        Future.failed(e)
+    }
+  }
+
+  private def run[A](executor: BoundedExecutor, request: Option[RequestHeader])(block: => A) : Future[A] = {
+    // the application class loader is needed by JPA and templates in dev mode
+    val loader = Thread.currentThread.getContextClassLoader
+
+    Future {
+      val thread = Thread.currentThread
+      val previous = thread.getContextClassLoader
+      thread.setContextClassLoader(loader)
+      request.foreach(_ => QueryStats.openRequest())
+
+      try {
+        block
+      } finally {
+        request.foreach(r => QueryStats.attachTo(r.id))
+        thread.setContextClassLoader(previous)
+      }
+    }(executor)
+  }
+
+}
@@ -0,0 +1,104 @@
+package utils
+
+import java.util.concurrent._
+import java.util.concurrent.atomic.{AtomicInteger, AtomicLong}
+
+import play.api.{Logger, Play}
+
+import scala.collection.JavaConversions._
+import scala.concurrent.ExecutionContext
+
+/**
+ * Statistics of a bounded executor.
+ *
+ * @param threads    Maximum number of worker threads.
+ * @param active     Number of tasks that are currently running.
+ * @param queued     Number of tasks waiting in the queue.
+ * @param queueSize  Capacity of the queue.
+ * @param completed  Number of completed tasks.
+ * @param rejected   Number of tasks that were rejected because the queue was full.
+ */
+case class ExecutorStatistics(threads: Int, active: Int, queued: Int, queueSize: Int,
+                              completed: Long, rejected: Long)
+
+/**
+ * Execution context with a fixed number of worker threads and a bounded
+ * job queue. Tasks submitted while the queue is full are rejected with a
+ * RejectedExecutionException instead of piling up.
+ *
+ * @param name      The name of the executor, used for thread names and metrics.
+ * @param threads   The number of worker threads.
+ * @param queueSize The capacity of the job queue.
+ */
+class BoundedExecutor(val name: String, threads: Int, queueSize: Int) extends ExecutionContext {
+
+  private val rejected = new AtomicLong(0)
+
+  private val factory = new ThreadFactory {
+    private val count = new AtomicInteger(0)
+
+    override def newThread(r: Runnable): Thread = {
+      val thread = new Thread(r, s"$name-${count.incrementAndGet()}")
+      thread.setDaemon(true)
+      thread
+    }
+  }
+
+  private val executor = new ThreadPoolExecutor(threads, threads, 60L, TimeUnit.SECONDS,
+    new ArrayBlockingQueue[Runnable](queueSize), factory)
+  executor.allowCoreThreadTimeOut(true)
+
+  override def execute(runnable: Runnable): Unit = {
+    try {
+      executor.execute(runnable)
+    } catch {
+      case e: RejectedExecutionException =>
+        rejected.incrementAndGet()
+        throw e
+    }
+  }
+
+  override def reportFailure(cause: Throwable): Unit = {
+    Logger.error(s"BoundedExecutor [$name]: task failed", cause)
+  }
+
+  /**
+   * Current statistics of the executor.
+   */
+  def statistics : ExecutorStatistics = {
+    ExecutorStatistics(threads, executor.getActiveCount, executor.getQueue.size, queueSize,
+      executor.getCompletedTaskCount, rejected.get)
+  }
+
+}
+
+object BoundedExecutor {
+
+  private val executors = new CopyOnWriteArrayList[BoundedExecutor]()
+
+  /**
+   * Create an executor that is configured under "executors.<name>"
+   * with the keys "threads" and "queueSize".
+   *
+   * @param name             The name of the executor.
+   * @param defaultThreads   Number of threads if not configured.
+   * @param defaultQueueSize Queue capacity if not configured.
+   *
+   * @return A new executor.
+   */
+  def apply(name: String, defaultThreads: Int, defaultQueueSize: Int) : BoundedExecutor = {
+    val config = Play.current.configuration
+    val threads = config.getInt(s"executors.$name.threads").getOrElse(defaultThreads)
+    val queueSize = config.getInt(s"executors.$name.queueSize").getOrElse(defaultQueueSize)
+
+    val executor = new BoundedExecutor(name, threads, queueSize)
+    executors.add(executor)
+    executor
+  }
+
+  /**
+   * All executors created with BoundedExecutor.apply.
+   */
+  def all : Seq[BoundedExecutor] = executors.toList
+
+}
@@ -0,0 +1,154 @@
+package utils
+
+import java.io.{File, FileInputStream}
+import java.util.Locale
+
+import org.apache.commons.codec.digest.DigestUtils
+import org.apache.commons.io.input.BoundedInputStream
+import org.joda.time.DateTimeZone
+import org.joda.time.format.DateTimeFormat
+import play.api.http.{ContentTypes, HeaderNames, Status}
+import play.api.libs.MimeTypes
+import play.api.libs.concurrent.Execution.Implicits.defaultContext
+import play.api.libs.iteratee.Enumerator
+import play.api.mvc.{RequestHeader, ResponseHeader, Result, Results}
+
+import scala.util.Try
+
+/**
+ * Serves uploaded files (figures, banners) with validators for conditional
+ * requests, caching headers and support for single byte ranges.
+ */
+object FileResults extends HeaderNames with Status with Results {
+
+  val IMMUTABLE = "public, max-age=31536000, immutable"
+  val REVALIDATE = "public, no-cache"
+  val PRIVATE = "private, no-cache"
+
+  private val httpDate = DateTimeFormat.forPattern("EEE, dd MMM yyyy HH:mm:ss 'GMT'")
+    .withLocale(Locale.ENGLISH).withZone(DateTimeZone.UTC)
+
+  private val byteRange = """bytes=(\d*)-(\d*)""".r
+
+  /**
+   * Compute the content hash of a file.
+   *
+   * @param file The file to hash.
+   *
+   * @return The hex encoded MD5 digest of the file content.
+   */
+  def contentHash(file: File) : String = {
+    val in = new FileInputStream(file)
+    try {
+      DigestUtils.md5Hex(in)
+    } finally {
+      in.close()
+    }
+  }
+
+  /**
+   * Serve an uploaded file or a version derived from it.
+   *
+   * The ETag is the content hash of the original, for derived files combined
+   * with the path of the served file. Files uploaded before content hashes were
+   * stored get an ETag from their size and modification time. Responses to
+   * URLs that carry the content hash as "v" parameter are cacheable forever,
+   * unless a derived version was requested but the original is served because
+   * the derived version does not exist (yet). Other responses must be
+   * revalidated; files that are not public should be served with PRIVATE,
+   * so shared caches do not store them.
+   *
+   * @param file         The file to serve.
+   * @param original     The original uploaded file.
+   * @param hash         The content hash of the original, may be null.
+   * @param derived      True if a derived version of the original was requested.
+   * @param cacheControl The Cache-Control header of responses that are not immutable.
+   * @param request      The request.
+   *
+   * @return Ok, Partial Content, Not Modified or Requested Range Not Satisfiable.
+   */
+  def serve(file: File, original: File, hash: String, derived: Boolean, cacheControl: String = REVALIDATE)
+           (implicit request: RequestHeader) : Result = {
+
+    val lastModified = file.lastModified / 1000 * 1000
+    val length = file.length
+
+    val etag = "\"" + (if (hash == null) {
+      DigestUtils.md5Hex(file.getPath + ":" + length + ":" + lastModified)
+    } else if (file == original) {
+      hash
+    } else {
+      DigestUtils.md5Hex(hash + ":" + file.getPath)
+    }) + "\""
+
+    val immutable = hash != null && request.getQueryString("v") == Some(hash) && !(derived && file == original)
+
+    val headers = Seq(
+      ETAG -> etag,
+      LAST_MODIFIED -> httpDate.print(lastModified),
+      CACHE_CONTROL -> (if (immutable) IMMUTABLE else cacheControl),
+      ACCEPT_RANGES -> "bytes"
+    )
+
+    // If-None-Match takes precedence over If-Modified-Since (RFC 7232)
+    val notModified = request.headers.get(IF_NONE_MATCH) match {
+      case Some(tags) => tags.split(",").map(_.trim).exists(t => t == "*" || t == etag || t == "W/" + etag)
+      case None => request.headers.get(IF_MODIFIED_SINCE).flatMap(parseDate).exists(lastModified <= _)
+    }
+
+    if (notModified) {
+      NotModified.withHeaders(headers: _*)
+    } else {
+      val ifRange = request.headers.get(IF_RANGE).forall { value =>
+        value == etag || parseDate(value).exists(_ == lastModified)
+      }
+
+      request.headers.get(RANGE).filter(_ => ifRange).flatMap(parseRange(_, length)) match {
+        case Some(Some((start, end))) =>
+          val in = new FileInputStream(file)
+          in.getChannel.position(start)
+
+          val contentType = MimeTypes.forFileName(file.getName).getOrElse(ContentTypes.BINARY)
+          Result(
+            ResponseHeader(PARTIAL_CONTENT, Map(
+              CONTENT_TYPE -> contentType,
+              CONTENT_LENGTH -> (end - start + 1).toString,
+              CONTENT_RANGE -> s"bytes $start-$end/$length"
+            ) ++ headers),
+            Enumerator.fromStream(new BoundedInputStream(in, end - start + 1))
+          )
+        case Some(None) =>
+          Status(REQUESTED_RANGE_NOT_SATISFIABLE).withHeaders(headers :+ (CONTENT_RANGE -> s"bytes */$length"): _*)
+        case None =>
+          Ok.sendFile(file).withHeaders(headers: _*)
+      }
+    }
+  }
+
+  /**
+   * Parse a Range header. Only a single byte range is supported,
+   * other range requests are answered with the whole file.
+   *
+   * @return None if the header is ignored, Some(None) if the range
+   *         cannot be satisfied, otherwise the first and last byte.
+   */
+  private def parseRange(value: String, length: Long) : Option[Option[(Long, Long)]] = Try {
+    value.trim match {
+      case byteRange("", "") => None
+      case byteRange("", suffix) =>
+        val n = math.min(suffix.toLong, length)
+        Some(if (n > 0) Some((length - n, length - 1)) else None)
+      case byteRange(first, last) =>
+        val start = first.toLong
+        val end = if (last.isEmpty) length - 1 else math.min(last.toLong, length - 1)
+        if (last.nonEmpty && last.toLong < start) None
+        else Some(if (start < length) Some((start, end)) else None)
+      case _ => None
+    }
+  }.getOrElse(None)
+
+  private def parseDate(value: String) : Option[Long] = {
+    Try(httpDate.parseMillis(value)).toOption
+  }
+
+}
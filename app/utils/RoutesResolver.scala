@@ -65,22 +65,24 @@ class RoutesResolver {
     * Builds an URL to banner file.
     *
     * @param id an ID of a Banner object to insert into the URL
+    * @param hash the content hash of the banner, appended as version if not null
     *
-    * @return URL for file, like "/api/banner/HNOPSADMHV/image"
+    * @return URL for file, like "/api/banner/HNOPSADMHV/image?v=0cc175b9c0f1b6a831c399e269772661"
     */
-  def bannerFileUrl(id: String) = {
-    new URL(baseUrl + s"/api/banner/$id/image")
+  def bannerFileUrl(id: String, hash: String = null) = {
+    new URL(baseUrl + s"/api/banner/$id/image" + (if (hash == null) "" else s"?v=$hash"))
   }
 
   /**
    * Builds an URL to figure file.
    *
    * @param id an ID of a Figure object to insert into the URL
+   * @param hash the content hash of the figure, appended as version if not null
    *
-   * @return URL for file, like "/api/figures/HNOPSADMHV/image"
+   * @return URL for file, like "/api/figures/HNOPSADMHV/image?v=0cc175b9c0f1b6a831c399e269772661"
    */
-  def figureFileUrl(id: String) = {
-    new URL(baseUrl + s"/api/figures/$id/image")
+  def figureFileUrl(id: String, hash: String = null) = {
+    new URL(baseUrl + s"/api/figures/$id/image" + (if (hash == null) "" else s"?v=$hash"))
   }
 
   /**
@@ -116,6 +118,15 @@ class RoutesResolver {
     new URL(baseUrl + s"/activate/$token")
   }
 
+  /**
+   * Builds an URL to the login page
+   *
+   * @return URL for the login page
+   */
+  def loginUrl = {
+    new URL(baseUrl + "/login")
+  }
+
   /**
     * Builds an URL to fetch or manipulate the geo entry of a conference for a given conference UUID.
     *
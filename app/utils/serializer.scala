@@ -121,7 +121,7 @@ package object serializer {
         Json.obj(
           "uuid" -> ban.uuid,
           "bType" -> ban.bType,
-          "URL" -> routesResolver.bannerFileUrl(ban.uuid)
+          "URL" -> routesResolver.bannerFileUrl(ban.uuid, ban.hash)
         )
       }
     }
@@ -311,7 +311,7 @@ package object serializer {
           "uuid" -> a.uuid,
           "caption" -> a.caption,
           "position" -> a.position,
-          "URL" -> routesResolver.figureFileUrl(a.uuid)
+          "URL" -> routesResolver.figureFileUrl(a.uuid, a.hash)
         )
       }
     }
@@ -386,4 +386,20 @@ package object serializer {
         "stateLog" -> routesResolver.stateLogUrl(a.uuid))
     }
   }
+
+  /**
+   * Abstract serializer that only writes a subset of the fields.
+   *
+   * @param fields The fields to write, the uuid is always written.
+   */
+  class AbstractProjectionWrites(fields: Set[String])(implicit routesResolver: RoutesResolver)
+    extends Writes[Abstract] {
+
+    val absFormat = new AbstractFormat()
+
+    override def writes(a: Abstract): JsValue = {
+      val full = absFormat.writes(a).as[JsObject]
+      JsObject(full.fields.filter { case (name, _) => name == "uuid" || fields.contains(name) })
+    }
+  }
 }
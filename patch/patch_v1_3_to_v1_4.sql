@@ -0,0 +1,66 @@
+/*
+SQL script to update the database schema when migrating from GCA-Web v1.3 to v1.4.
+*/
+
+-- Version counter of the abstracts of a conference; used to compute
+-- the ETag of the conference abstract lists.
+ALTER TABLE conference ADD COLUMN IF NOT EXISTS abstractsversion BIGINT NOT NULL DEFAULT 0;
+
+-- Content hashes of uploaded images; used as ETag and version of the image URLs.
+-- Images uploaded before get an ETag from their file size and modification time.
+ALTER TABLE figure ADD COLUMN IF NOT EXISTS hash VARCHAR(32);
+ALTER TABLE banner ADD COLUMN IF NOT EXISTS hash VARCHAR(32);
+
+-- Logins are looked up by the normalized mail address of their account.
+CREATE INDEX IF NOT EXISTS account_lower_mail_idx ON account (LOWER(mail));
+CREATE INDEX IF NOT EXISTS credentialslogin_account_idx ON credentialslogin (account_uuid);
+
+-- Deleted abstracts and figures; offline clients synchronize the
+-- changes of a conference since a point in time.
+CREATE TABLE IF NOT EXISTS tombstone (
+  uuid VARCHAR(255) NOT NULL,
+  conference VARCHAR(255),
+  deleted TIMESTAMP,
+  kind VARCHAR(255),
+  PRIMARY KEY (uuid)
+);
+CREATE INDEX IF NOT EXISTS tombstone_conference_idx ON tombstone (conference, deleted);
+CREATE INDEX IF NOT EXISTS abstract_conference_mtime_idx ON abstract (conference_uuid, mtime);
+
+-- Serialized accepted abstracts; published abstracts are read from a single row.
+-- The documents are created on first access after the update.
+CREATE TABLE IF NOT EXISTS abstractdocument (
+  uuid VARCHAR(255) NOT NULL,
+  conference VARCHAR(255),
+  json TEXT,
+  hash VARCHAR(32),
+  mtime TIMESTAMP,
+  sortid INTEGER,
+  title VARCHAR(255),
+  PRIMARY KEY (uuid)
+);
+CREATE INDEX IF NOT EXISTS abstractdocument_conference_idx ON abstractdocument (conference, sortid);
+
+-- Denormalized number of favourite users of an abstract.
+ALTER TABLE abstract ADD COLUMN IF NOT EXISTS favcount INTEGER NOT NULL DEFAULT 0;
+UPDATE abstract SET favcount = (SELECT COUNT(*) FROM abstract_favusers f WHERE f.favabstracts_uuid = abstract.uuid);
+CREATE INDEX IF NOT EXISTS abstract_favusers_account_idx ON abstract_favusers (favusers_uuid);
+
+-- Outbox of mails that are sent in the background.
+CREATE TABLE IF NOT EXISTS outboxmail (
+  uuid VARCHAR(255) NOT NULL,
+  subject VARCHAR(255),
+  sender VARCHAR(255),
+  recipients VARCHAR(2500),
+  bodytext TEXT,
+  template VARCHAR(255),
+  reference VARCHAR(255),
+  state VARCHAR(255),
+  attempts INTEGER,
+  lasterror VARCHAR(2500),
+  ctime TIMESTAMP,
+  nextattempt TIMESTAMP,
+  sentat TIMESTAMP,
+  PRIMARY KEY (uuid)
+);
+CREATE INDEX IF NOT EXISTS outboxmail_state_idx ON outboxmail (state, nextattempt);
@@ -1,4 +1,4 @@
-self._cacheVersion = "v21";
+self._cacheVersion = "v22";
 
 self.resourcesToCache = [
     // Views
@@ -161,84 +161,15 @@ self.addEventListener("install", function(event) {
     );
 });
 
-// Get a promise containing the first served conference and abstract views.
+// Get a promise containing the views and images of the latest conference.
+// The list is rendered and cached by the server, see /cache/resources.
 self.loadDynamicViews = function () {
-    return new Promise(function (resolve, reject) {
-        var dynamicViews = [];
-        var accordingAbstracts = [];
-        fetch("/api/conferences").then(function (response) {
-            return response.json();
-        }).then(function (conferences) {
-            var conf = conferences[0];
-            if (conf) {
-                dynamicViews.push("/conference/" + conf.short);
-                dynamicViews.push("/conference/" + conf.short + "/schedule");
-                dynamicViews.push("/conference/" + conf.short + "/submission");
-                dynamicViews.push("/conference/" + conf.short + "/floorplans");
-                dynamicViews.push("/conference/" + conf.short + "/locations");
-                dynamicViews.push("/conference/" + conf.short + "/abstracts");
-                dynamicViews.push(conf.logo);
-                dynamicViews.push(conf.thumbnail);
-                if (conf.banner) {
-                    conf.banner.forEach(function (banner) {
-                        if (banner) {
-                            dynamicAbstracts.push("/api/banner/"+banner.uuid+"/imagemobile");
-                        }
-                    });
-                }
-                accordingAbstracts.push(self.loadDynamicAbstracts(conf.abstracts));
-            };
-            Promise.all(accordingAbstracts).then(function (allAbstracts) {
-                allAbstracts.forEach(function (abstracts) {
-                    if (abstracts) {
-                        abstracts.forEach(function (abs) {
-                            if (abs) {
-                                dynamicViews.push(abs);
-                            }
-                        });
-                    }
-                });
-                resolve(dynamicViews);
-            });
-        }).catch(function (reason) {
-            console.log("Could not fetch /api/conferences for the following reason: "
-                + reason);
-            reject(reason);
-        });
-    });
-};
-
-// Get a promise containing all abstracts for the given URL.
-self.loadDynamicAbstracts = function (abstractsURL) {
-    return new Promise(function (resolve, reject) {
-        var dynamicAbstracts = [];
-        fetch(abstractsURL).then(function (response) {
-            return response.json();
-        }).then(function (abstracts) {
-            if (abstracts) {
-                abstracts.forEach(function (abs) {
-                    if (abs) {
-                        // Add the abstract URL.
-                        dynamicAbstracts.push("/abstracts/" + abs.uuid);
-                        // Add all the figure URLs.
-                        if (abs.figures) {
-                            abs.figures.forEach(function (figure) {
-                                if (figure) {
-                                    //dynamicAbstracts.push(figure.URL);
-                                    dynamicAbstracts.push("/api/figures/"+figure.uuid+"/imagemobile");
-                                }
-                            });
-                        }
-                    }
-                });
-            }
-            resolve(dynamicAbstracts);
-        }).catch(function (reason) {
-            console.log("Could not fetch " + abstractsURL + " for the following reason: "
+    return fetch("/cache/resources").then(function (response) {
+        return response.json();
+    }).catch(function (reason) {
+        console.log("Could not fetch /cache/resources for the following reason: "
             + reason);
-            // This must resolve anyhow and not get rejected for the rest of the code to work.
-            resolve(false);
-        });
+        return Promise.reject(reason);
     });
 };
 
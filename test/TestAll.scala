@@ -8,10 +8,11 @@
 // LICENSE file in the root of the Project.
 
 import org.scalatest.Suites
-import service.{FigureServiceTest, BannerServiceTest, AccountStoreTest, ConferenceServiceTest, AbstractServiceTest}
+import service.{FigureServiceTest, BannerServiceTest, AccountStoreTest, ConferenceServiceTest, AbstractServiceTest, MailOutboxTest}
+import util.BlockingIOTest
 import util.serializer.SerializerTest
-import controller.{AccountsCtrlTest, FigureCtrlTest, BannerCtrlTest, AbstractsCtrlTest, ConferenceCtrlTest}
-import models.ConferenceTest
+import controller.{AccountsCtrlTest, FigureCtrlTest, BannerCtrlTest, AbstractsCtrlTest, ConferenceCtrlTest, MetadataCtrlTest, MetricsCtrlTest, PagesCtrlTest}
+import models.{ConferenceTest, ModelMetadataTest}
 
 
 /**
@@ -20,16 +21,22 @@ import models.ConferenceTest
 class TestAll extends Suites(
 
   new SerializerTest,
+  new BlockingIOTest,
   new AbstractServiceTest,
   new ConferenceServiceTest,
   new FigureServiceTest,
   new BannerServiceTest,
   new AccountStoreTest,
+  new MailOutboxTest,
   new ConferenceCtrlTest,
   new AbstractsCtrlTest,
   new FigureCtrlTest,
   new BannerCtrlTest,
   new AccountsCtrlTest,
-  new ConferenceTest
+  new MetadataCtrlTest,
+  new MetricsCtrlTest,
+  new PagesCtrlTest,
+  new ConferenceTest,
+  new ModelMetadataTest
 
 )
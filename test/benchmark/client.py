@@ -0,0 +1,83 @@
+import http.cookiejar
+import json
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Do not follow redirects, e.g. after a login only the login itself is measured"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class Response:
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body.decode("utf-8"))
+
+
+class Client:
+    """
+    Minimal HTTP client for GCA-Web with its own cookie jar, so that every
+    client represents one user session.
+    """
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookies), NoRedirect
+        )
+
+    def request(self, method, path, body=None, headers=None):
+        req = urllib.request.Request(self.base_url + path, data=body, method=method, headers=headers or {})
+        try:
+            with self.opener.open(req, timeout=self.timeout) as res:
+                return Response(res.status, res.headers, res.read())
+        except urllib.error.HTTPError as err:
+            return Response(err.code, err.headers, err.read())
+
+    def get(self, path, headers=None):
+        return self.request("GET", path, headers=headers)
+
+    def send_json(self, method, path, data):
+        body = json.dumps(data).encode("utf-8")
+        return self.request(method, path, body, {"Content-Type": "application/json"})
+
+    def upload(self, path, fields, file_name, file_content, content_type):
+        boundary = uuid.uuid4().hex
+        parts = []
+        for name, value in fields.items():
+            parts.append(("--%s\r\nContent-Disposition: form-data; name=\"%s\"\r\n\r\n%s\r\n"
+                          % (boundary, name, value)).encode("utf-8"))
+        parts.append(("--%s\r\nContent-Disposition: form-data; name=\"file\"; filename=\"%s\"\r\n"
+                      "Content-Type: %s\r\n\r\n" % (boundary, file_name, content_type)).encode("utf-8"))
+        parts.append(file_content)
+        parts.append(("\r\n--%s--\r\n" % boundary).encode("utf-8"))
+
+        headers = {"Content-Type": "multipart/form-data; boundary=%s" % boundary}
+        return self.request("POST", path, b"".join(parts), headers)
+
+    def login(self, user, password):
+        body = urllib.parse.urlencode({"identifier": user, "password": password}).encode("utf-8")
+        return self.request("POST", "/authenticate/credentials", body,
+                            {"Content-Type": "application/x-www-form-urlencoded"})
+
+    @property
+    def logged_in(self):
+        return any(cookie.name == "id" for cookie in self.cookies)
+
+
+def expect(res, status, what):
+    if res.status != status:
+        raise RuntimeError("%s failed with status %d: %s" % (what, res.status, res.body[:500]))
+    return res
@@ -0,0 +1,193 @@
+"""
+Drive concurrent load against the public API of a running GCA-Web instance
+and report latency percentiles, throughput and errors as JSON.
+
+    python loadtest.py --seed seed.json --concurrency 8 --duration 30 --out run.json
+    python loadtest.py --seed seed.json --baseline run.json
+
+The seed file is created by seed.py. If a baseline report is given, the
+relative change of every metric against the baseline is added to the report.
+"""
+
+import argparse
+import itertools
+import json
+import math
+import platform
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from client import Client
+
+
+def abstract_list(client, seed, rnd):
+    return client.get("/api/conferences/%s/abstracts" % seed["conference"])
+
+
+def abstract(client, seed, rnd):
+    return client.get("/api/abstracts/%s" % rnd.choice(seed["abstracts"]))
+
+
+def figure_mobile(client, seed, rnd):
+    return client.get("/api/figures/%s/imagemobile" % rnd.choice(seed["figures"]))
+
+
+def login(client, seed, rnd):
+    user, password = rnd.choice(seed["users"])
+    session = Client(client.base_url, client.timeout)
+    res = session.login(user, password)
+    if not session.logged_in:
+        res.status = 401
+    return res
+
+
+SCENARIOS = {
+    "abstract_list": abstract_list,
+    "abstract": abstract,
+    "figure_mobile": figure_mobile,
+    "login": login,
+}
+
+
+def percentile(values, p):
+    """Nearest rank percentile of sorted values"""
+    if not values:
+        return None
+    rank = int(math.ceil(p / 100.0 * len(values)))
+    return values[min(max(rank, 1), len(values)) - 1]
+
+
+def summarize(results, elapsed):
+    latencies = sorted(ms for _, ms in results)
+    statuses = {}
+    for status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    errors = sum(count for status, count in statuses.items() if not status.startswith(("2", "3")))
+
+    return {
+        "requests": len(results),
+        "errors": errors,
+        "error_rate": errors / float(len(results)) if results else 0.0,
+        "throughput": len(results) / elapsed if elapsed > 0 else 0.0,
+        "status": statuses,
+        "latency_ms": {
+            "min": latencies[0] if latencies else None,
+            "mean": sum(latencies) / len(latencies) if latencies else None,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": latencies[-1] if latencies else None,
+        },
+    }
+
+
+def run(name, func, seed, args):
+    """Run one scenario with a fixed number of workers for a fixed time or number of requests"""
+    results = []
+    lock = threading.Lock()
+    counter = itertools.count()
+    measure_from = time.time() + args.warmup
+    deadline = measure_from + args.duration
+
+    def worker(n):
+        client = Client(seed["url"] if args.url is None else args.url, args.timeout)
+        rnd = random.Random(args.random_seed + n)
+        while time.time() < deadline and (args.requests is None or next(counter) < args.requests):
+            started = time.time()
+            try:
+                status = func(client, seed, rnd).status
+            except Exception:
+                status = 599
+            finished = time.time()
+            if started >= measure_from:
+                with lock:
+                    results.append((status, (finished - started) * 1000.0))
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(worker, range(args.concurrency)))
+    elapsed = time.time() - measure_from
+
+    summary = summarize(results, elapsed)
+    print("%-14s %6d requests %8.1f req/s  p50 %7.1f ms  p95 %7.1f ms  p99 %7.1f ms  %d errors" % (
+        name, summary["requests"], summary["throughput"], summary["latency_ms"]["p50"] or 0,
+        summary["latency_ms"]["p95"] or 0, summary["latency_ms"]["p99"] or 0, summary["errors"]
+    ), file=sys.stderr)
+    return summary
+
+
+def compare(report, baseline):
+    """Relative change of the throughput and latencies of every scenario against a baseline"""
+    changes = {}
+    for name, summary in report["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if base is None:
+            continue
+
+        def change(new, old):
+            return None if new is None or not old else (new - old) / float(old)
+
+        changes[name] = {
+            "throughput": change(summary["throughput"], base["throughput"]),
+            "error_rate": summary["error_rate"] - base["error_rate"],
+            "latency_ms": {k: change(v, base["latency_ms"].get(k)) for k, v in summary["latency_ms"].items()},
+        }
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the public API of GCA-Web")
+    parser.add_argument("--seed", default="seed.json", help="seed file written by seed.py")
+    parser.add_argument("--url", default=None, help="base URL of GCA-Web, defaults to the URL of the seed")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma separated scenarios to run")
+    parser.add_argument("--concurrency", type=int, default=8, help="number of concurrent clients")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds per scenario that are not measured")
+    parser.add_argument("--requests", type=int, default=None, help="stop a scenario after this many requests")
+    parser.add_argument("--timeout", type=float, default=30, help="timeout of a single request in seconds")
+    parser.add_argument("--random-seed", type=int, default=42, help="seed for choosing abstracts and users")
+    parser.add_argument("--baseline", default=None, help="previous report to compare against")
+    parser.add_argument("--out", default=None, help="file the report is written to, default stdout")
+    args = parser.parse_args()
+
+    with open(args.seed) as f:
+        seed = json.load(f)
+
+    names = [name for name in args.scenarios.split(",") if name]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        sys.exit("Unknown scenarios: %s" % ", ".join(unknown))
+    if "figure_mobile" in names and not seed["figures"]:
+        names.remove("figure_mobile")
+
+    report = {
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "url": args.url or seed["url"],
+        "host": platform.node(),
+        "config": {
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "requests": args.requests,
+            "abstracts": len(seed["abstracts"]),
+            "figures": len(seed["figures"]),
+        },
+        "scenarios": {name: run(name, SCENARIOS[name], seed, args) for name in names},
+    }
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["baseline"] = {"file": args.baseline, "changes": compare(report, json.load(f))}
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Seed a synthetic conference for the benchmarks.
+
+A published conference with N accepted abstracts is created through the API of a
+running GCA-Web instance, a part of the abstracts gets a figure. Everything is
+stored in the local H2 database the instance runs on. The ids of the created
+entities are written to a seed file that is read by loadtest.py.
+
+    python seed.py --abstracts 500 --figures 100 --out seed.json
+"""
+
+import argparse
+import json
+import struct
+import sys
+import time
+import zlib
+
+from client import Client, expect
+
+STATES = ["Submitted", "InReview", "Accepted"]
+BULK_SIZE = 500
+
+
+def png(width, height, seed):
+    """A simple RGB gradient as PNG, different for every seed"""
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+
+    rows = b"".join(
+        b"\x00" + b"".join(bytes(((x + seed) % 256, (y + seed) % 256, (x ^ y) % 256)) for x in range(width))
+        for y in range(height)
+    )
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) +
+            chunk(b"IDAT", zlib.compress(rows, 6)) + chunk(b"IEND", b""))
+
+
+def conference(short):
+    now = int(time.time() * 1000)
+    day = 24 * 60 * 60 * 1000
+    return {
+        "name": "Benchmark Conference %s" % short,
+        "short": short,
+        "group": "Benchmarks",
+        "cite": "The benchmark conference",
+        "link": "",
+        "isOpen": True,
+        "isPublished": True,
+        "isActive": True,
+        "hasPresentationPrefs": False,
+        "start": now + 30 * day,
+        "end": now + 33 * day,
+        "deadline": now + 10 * day,
+        "confTexts": [],
+        "groups": [],
+        "topics": [],
+    }
+
+
+def abstract(i, authors):
+    return {
+        "title": "Benchmark abstract %d on the dynamics of neural populations" % i,
+        "topic": "Benchmarks",
+        "text": " ".join(["Synthetic abstract text %d for load testing." % i] * 40),
+        "acknowledgements": "Thanks to everyone who ran benchmark %d." % i,
+        "authors": [{"mail": "author%d.%d@example.org" % (i, a), "firstName": "Author%d" % a,
+                     "lastName": "Number%d" % i, "affiliations": [a % 2]} for a in range(authors)],
+        "affiliations": [
+            {"address": "Munich", "country": "Germany", "department": "Department %d" % i, "section": "Neuro"},
+            {"address": "Berlin", "country": "Germany", "department": "Department B", "section": "Bio"},
+        ],
+        "references": [{"text": "Reference %d of abstract %d" % (r, i)} for r in range(3)],
+        "abstrTypes": [],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed a synthetic conference for benchmarks")
+    parser.add_argument("--url", default="http://localhost:9000", help="base URL of GCA-Web")
+    parser.add_argument("--admin", default="alice@foo.com", help="mail of a site admin")
+    parser.add_argument("--password", default="testtest", help="password of the site admin")
+    parser.add_argument("--abstracts", type=int, default=200, help="number of abstracts")
+    parser.add_argument("--figures", type=int, default=50, help="number of abstracts with a figure")
+    parser.add_argument("--authors", type=int, default=5, help="number of authors per abstract")
+    parser.add_argument("--users", default="alice@foo.com:testtest,bob@bar.com:testtest,eve@evil.com:testtest",
+                        help="comma separated mail:password pairs of existing accounts used for logins")
+    parser.add_argument("--out", default="seed.json", help="file the ids are written to")
+    args = parser.parse_args()
+
+    client = Client(args.url)
+    client.login(args.admin, args.password)
+    if not client.logged_in:
+        sys.exit("Login as %s failed" % args.admin)
+
+    short = "BENCH%d" % (int(time.time()) % 100000)
+    conf = expect(client.send_json("POST", "/api/conferences", conference(short)), 201, "Create conference").json()
+    print("Created conference %s (%s)" % (short, conf["uuid"]))
+
+    abstracts = []
+    for i in range(args.abstracts):
+        res = client.send_json("POST", "/api/conferences/%s/abstracts" % conf["uuid"], abstract(i, args.authors))
+        abstracts.append(expect(res, 201, "Create abstract %d" % i).json()["uuid"])
+    print("Created %d abstracts" % len(abstracts))
+
+    figures = []
+    for i, abstr in enumerate(abstracts[:args.figures]):
+        res = client.upload("/api/abstracts/%s/figures" % abstr, {"figure": json.dumps({"caption": "Figure %d" % i})},
+                            "figure%d.png" % i, png(640, 480, i), "image/png")
+        figures.append(expect(res, 201, "Upload figure %d" % i).json()["uuid"])
+    print("Uploaded %d figures" % len(figures))
+
+    for state in STATES:
+        for start in range(0, len(abstracts), BULK_SIZE):
+            changes = [{"abstract": a, "state": state} for a in abstracts[start:start + BULK_SIZE]]
+            res = expect(client.send_json("PUT", "/api/conferences/%s/abstracts/state" % conf["uuid"], changes),
+                         200, "Change state to %s" % state)
+            failed = [r for r in res.json() if r["error"]]
+            if failed:
+                sys.exit("Changing the state to %s failed: %s" % (state, failed[0]["message"]))
+    print("Accepted %d abstracts" % len(abstracts))
+
+    users = [pair.split(":", 1) for pair in args.users.split(",") if pair]
+    with open(args.out, "w") as f:
+        json.dump({
+            "url": args.url,
+            "conference": conf["uuid"],
+            "short": short,
+            "abstracts": abstracts,
+            "figures": figures,
+            "users": users,
+        }, f, indent=2)
+    print("Seed written to %s" % args.out)
+
+
+if __name__ == "__main__":
+    main()
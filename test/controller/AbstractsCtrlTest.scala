@@ -7,8 +7,12 @@ import play.api.test.Helpers._
 import utils.serializer.{AccountFormat, AbstractFormat}
 import play.api.libs.json.{JsArray, JsObject, JsValue, Json}
 import models.{AbstractState, Abstract}
-import play.api.mvc.Cookie
+import play.api.mvc.{Cookie, Result}
 import utils.DefaultRoutesResolver._
+import service.{AbstractService, ConferenceService}
+import service.util.ConferenceCache
+
+import scala.concurrent.Future
 
 class AbstractsCtrlTest extends BaseCtrlTest {
 
@@ -155,6 +159,32 @@ class AbstractsCtrlTest extends BaseCtrlTest {
 
   }
 
+  @Test
+  def testDashboard() {
+
+    val req = FakeRequest(GET, "/api/user/self/dashboard")
+    assert(status(route(AbstractsCtrlTest.app, req).get) == UNAUTHORIZED)
+
+    val result = route(AbstractsCtrlTest.app, req.withCookies(cookie)).get
+    assert(status(result) == OK)
+
+    val conferences = contentAsJson(result).as[Seq[JsObject]]
+    assert(conferences.nonEmpty)
+    val abstracts = conferences.flatMap(c => (c \ "abstracts").as[Seq[JsObject]])
+    assert(abstracts.size == assets.abstracts.length)
+    assert(abstracts.forall(a => (a \ "title").asOpt[String].isDefined && (a \ "state").asOpt[String].isDefined))
+
+    val etag = header(ETAG, result)
+    assert(etag.isDefined)
+
+    val cached = req.withCookies(cookie).withHeaders("If-None-Match" -> etag.get)
+    assert(status(route(AbstractsCtrlTest.app, cached).get) == NOT_MODIFIED)
+
+    val eveResult = route(AbstractsCtrlTest.app, req.withCookies(getCookie(assets.eve, "testtest"))).get
+    assert(status(eveResult) == OK)
+    assert(contentAsJson(eveResult).as[Seq[JsObject]].isEmpty)
+  }
+
   @Test
   def testListFavByAccount() {
 
@@ -197,6 +227,127 @@ class AbstractsCtrlTest extends BaseCtrlTest {
     assert(status(resETag) ==  NOT_MODIFIED)
   }
 
+  @Test
+  def testListAllByConferencePaged() {
+    val cid = assets.conferences(0).uuid
+    val req = FakeRequest(GET, s"/api/conferences/$cid/allAbstracts?limit=1&fields=title,state")
+      .withCookies(cookie)
+
+    val result = route(AbstractsCtrlTest.app, req).get
+    assert(status(result) == OK)
+
+    val page = contentAsJson(result).as[Seq[JsObject]]
+    assert(page.size == 1)
+    assert(page.head.keys == Set("uuid", "title", "state"))
+
+    val link = header("Link", result)
+    assert(link.isDefined && link.get.contains("after="))
+
+    val invalid = FakeRequest(GET, s"/api/conferences/$cid/allAbstracts?after=foo").withCookies(cookie)
+    assert(status(routeWithErrors(AbstractsCtrlTest.app, invalid).get) == BAD_REQUEST)
+
+    // the ETag does not depend on the order of the requested fields
+    val fieldsETags = Seq("title,state,topic", "topic,state,title", "state,topic,title").map { fields =>
+      header(ETAG, route(AbstractsCtrlTest.app,
+        FakeRequest(GET, s"/api/conferences/$cid/allAbstracts?limit=1&fields=$fields").withCookies(cookie)).get)
+    }
+    assert(fieldsETags.forall(_.isDefined) && fieldsETags.distinct.size == 1)
+    assert(fieldsETags.head != header(ETAG, result))
+  }
+
+  @Test
+  def testListAllByConferenceStreamed() {
+    val cid = assets.conferences(0).uuid
+    val req = FakeRequest(GET, s"/api/conferences/$cid/allAbstracts").withCookies(cookie)
+    val reqStream = FakeRequest(GET, s"/api/conferences/$cid/allAbstracts?stream=true").withCookies(cookie)
+
+    val result = route(AbstractsCtrlTest.app, req).get
+    val streamed = route(AbstractsCtrlTest.app, reqStream).get
+
+    // streamed pages are ordered by sortId and uuid
+    def byUuid(result: Future[Result]) = contentAsJson(result).as[Seq[JsObject]].sortBy(a => (a \ "uuid").as[String])
+
+    assert(status(streamed) == OK)
+    assert(header(TRANSFER_ENCODING, streamed).contains(CHUNKED))
+    assert(header(ETAG, streamed) == header(ETAG, result))
+    assert(byUuid(streamed) == byUuid(result))
+
+    val published = route(AbstractsCtrlTest.app, FakeRequest(GET, s"/api/conferences/$cid/abstracts")).get
+    val publishedStreamed = route(AbstractsCtrlTest.app,
+      FakeRequest(GET, s"/api/conferences/$cid/abstracts?stream=true")).get
+    assert(header(TRANSFER_ENCODING, publishedStreamed).contains(CHUNKED))
+    // the cached and the streamed published list have the same order
+    assert(contentAsJson(publishedStreamed) == contentAsJson(published))
+
+    val own = route(AbstractsCtrlTest.app, FakeRequest(GET, "/api/user/self/abstracts").withCookies(cookie)).get
+    val ownStreamed = route(AbstractsCtrlTest.app,
+      FakeRequest(GET, "/api/user/self/abstracts?stream=true").withCookies(cookie)).get
+    assert(header(TRANSFER_ENCODING, ownStreamed).contains(CHUNKED))
+    assert(byUuid(ownStreamed).map(_ \ "uuid") == byUuid(own).map(_ \ "uuid"))
+
+    val ownCached = FakeRequest(GET, "/api/user/self/abstracts?stream=true").withCookies(cookie)
+      .withHeaders("If-None-Match" -> header(ETAG, ownStreamed).get)
+    assert(status(route(AbstractsCtrlTest.app, ownCached).get) == NOT_MODIFIED)
+  }
+
+  @Test
+  def testListByConferenceCache() {
+    val conference = assets.conferences(0)
+    ConferenceCache.invalidate(conference.uuid)
+
+    val byShort = route(AbstractsCtrlTest.app, FakeRequest(GET, s"/api/conferences/${conference.short}/abstracts")).get
+    assert(status(byShort) == OK)
+
+    // the list is cached under the uuid, also when requested by short name
+    assert(ConferenceService.uuids.get(conference.short) == Some(conference.uuid))
+    assert(AbstractService.publishedList.get(conference.uuid).isDefined)
+
+    val byUuid = route(AbstractsCtrlTest.app, FakeRequest(GET, s"/api/conferences/${conference.uuid}/abstracts")).get
+    assert(contentAsString(byUuid) == contentAsString(byShort))
+
+    ConferenceCache.invalidate(conference.uuid)
+    assert(ConferenceService.uuids.get(conference.short).isEmpty)
+    assert(AbstractService.publishedList.get(conference.uuid).isEmpty)
+  }
+
+  @Test
+  def testSearch() {
+    val cid = assets.conferences(0).uuid
+    val req = FakeRequest(GET, s"/api/conferences/$cid/abstracts/search?q=munich&limit=5")
+
+    val result = route(AbstractsCtrlTest.app, req).get
+    assert(status(result) == OK)
+
+    val json = contentAsJson(result)
+    assert((json \ "total").as[Int] == 1)
+
+    val hits = (json \ "hits").as[Seq[JsObject]]
+    assert((hits.head \ "uuid").as[String] == assets.abstracts(0).uuid)
+    assert((hits.head \ "score").as[Double] > 0)
+  }
+
+  @Test
+  def testListChanges() {
+    val cid = assets.conferences(0).uuid
+
+    val full = route(AbstractsCtrlTest.app, FakeRequest(GET, s"/api/conferences/$cid/changes")).get
+    assert(status(full) == OK)
+
+    val json = contentAsJson(full)
+    assert((json \ "conference" \ "uuid").as[String] == cid)
+    assert((json \ "abstracts").as[Seq[JsObject]].length ==
+      assets.abstracts.count{ _.state == AbstractState.Accepted })
+
+    val cursor = (json \ "cursor").as[Long]
+    val req = FakeRequest(GET, s"/api/conferences/$cid/changes?since=$cursor")
+    val changes = contentAsJson(route(AbstractsCtrlTest.app, req).get)
+    assert((changes \ "cursor").as[Long] >= cursor)
+    assert((changes \ "deleted" \ "abstracts").as[Seq[String]].isEmpty)
+
+    val invalid = routeWithErrors(AbstractsCtrlTest.app, FakeRequest(GET, s"/api/conferences/$cid/changes?since=-1")).get
+    assert(status(invalid) == BAD_REQUEST)
+  }
+
   @Test
   def testListFavByConf() {
 
@@ -249,6 +400,36 @@ class AbstractsCtrlTest extends BaseCtrlTest {
     assert(loadedJSONBob.length == assets.abstracts.size)
   }
 
+  @Test
+  def testListByConferenceInvalidation() {
+
+    val cid = assets.conferences(0).uuid
+    val reqList = FakeRequest(GET, s"/api/conferences/$cid/abstracts")
+
+    val first = route(AbstractsCtrlTest.app, reqList).get
+    assert(status(first) == OK)
+    val firstAbs = contentAsJson(first).as[Seq[Abstract]]
+    val eTag = header(ETAG, first).get
+
+    // a warm request must return the very same list
+    val cached = route(AbstractsCtrlTest.app, reqList).get
+    assert(status(cached) == OK)
+    assert(header(ETAG, cached).get == eTag)
+
+    val absUUID = assets.abstracts(0).uuid
+    val reqDelete = FakeRequest(DELETE, s"/api/abstracts/$absUUID").withCookies(cookie)
+    assert(status(route(AbstractsCtrlTest.app, reqDelete).get) == OK)
+
+    // deleting an abstract must invalidate the cached list
+    val second = route(AbstractsCtrlTest.app, reqList.withHeaders("If-None-Match" -> eTag)).get
+    assert(status(second) == OK)
+    assert(header(ETAG, second).get != eTag)
+
+    val secondAbs = contentAsJson(second).as[Seq[Abstract]]
+    assert(secondAbs.length == firstAbs.length - 1)
+    assert(!secondAbs.exists(_.uuid == absUUID))
+  }
+
   @Test
   def testAddFavUser() {
     //Add
@@ -291,6 +472,27 @@ class AbstractsCtrlTest extends BaseCtrlTest {
     assert(loadedJSONAlice.length == 0)
   }
 
+  @Test
+  def testFavCounts() {
+    val cid = assets.conferences(0).uuid
+    val reqCounts = FakeRequest(GET, s"/api/conferences/$cid/favcounts")
+
+    val reqCountsResult = route(AbstractsCtrlTest.app, reqCounts).get
+    assert(status(reqCountsResult) == OK)
+    val counts = contentAsJson(reqCountsResult).as[Map[String, Int]]
+
+    // every abstract is liked by bob, only published ones are counted
+    assert(counts.nonEmpty && counts.values.forall(_ == 1))
+    val accepted = assets.abstracts.filter(_.state == AbstractState.Accepted).map(_.uuid)
+    assert(counts.keySet == accepted.toSet)
+
+    val reqAdd = FakeRequest(PUT, s"/api/abstracts/${accepted(0)}/addfavuser").withCookies(cookie)
+    assert(status(route(AbstractsCtrlTest.app, reqAdd).get) == OK)
+
+    val updated = contentAsJson(route(AbstractsCtrlTest.app, reqCounts).get).as[Map[String, Int]]
+    assert(updated(accepted(0)) == 2)
+  }
+
   @Test
   def testDelete() {
     val absUUID = assets.abstracts(0).uuid
@@ -415,6 +617,37 @@ class AbstractsCtrlTest extends BaseCtrlTest {
     assert(loadedAbs.doi == "10.12751/nncn.test.0042")
   }
 
+  @Test
+  def testBulkStateAndPatch() {
+    val confId = assets.conferences(0).uuid
+    val changes = Json.arr(
+      Json.obj("abstract" -> assets.abstracts(1).uuid, "state" -> "Accepted", "note" -> "bulk"),
+      Json.obj("abstract" -> assets.abstracts(0).uuid, "state" -> "Submitted"))
+
+    val reqState = FakeRequest(PUT, s"/api/conferences/$confId/abstracts/state").withJsonBody(changes)
+    assert(status(routeWithErrors(AbstractsCtrlTest.app, reqState).get) == UNAUTHORIZED)
+
+    val stateResult = route(AbstractsCtrlTest.app, reqState.withCookies(cookie)).get
+    assert(status(stateResult) == OK)
+
+    val states = contentAsJson(stateResult).as[List[JsObject]]
+    assert(!(states(0) \ "error").as[Boolean])
+    assert((states(0) \ "state").as[String] == "Accepted")
+    assert((states(1) \ "error").as[Boolean])
+    assert((states(1) \ "status").as[Int] == FORBIDDEN)
+
+    val patches = Json.arr(Json.obj("abstract" -> assets.abstracts(1).uuid,
+      "patches" -> Json.arr(Json.obj("op" -> "add", "path" -> "/sortId", "value" -> 5))))
+
+    val reqPatch = FakeRequest("PATCH", s"/api/conferences/$confId/abstracts").withJsonBody(patches)
+    val bobResult = route(AbstractsCtrlTest.app, reqPatch.withCookies(getCookie(assets.bob, "testtest"))).get
+    assert((contentAsJson(bobResult)(0) \ "status").as[Int] == FORBIDDEN)
+
+    val patchResult = route(AbstractsCtrlTest.app, reqPatch.withCookies(cookie)).get
+    assert(status(patchResult) == OK)
+    assert((contentAsJson(patchResult)(0) \ "sortId").as[Int] == 5)
+  }
+
 }
 
 object AbstractsCtrlTest {
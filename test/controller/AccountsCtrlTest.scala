@@ -1,5 +1,7 @@
 package controller
 
+import java.util.concurrent.Executor
+
 import org.junit._
 import play.api.test._
 import play.api.test.Helpers._
@@ -9,6 +11,8 @@ import utils.serializer.AccountFormat
 import scala.Some
 import play.api.libs.json.JsObject
 import utils.DefaultRoutesResolver._
+import plugins.DBUtil._
+import plugins.MailSender
 import play.api.Play
 import play.api.test.FakeApplication
 import play.api.libs.json.JsObject
@@ -110,12 +114,22 @@ class AccountsCtrlTest extends BaseCtrlTest {
     var response = route(AccountsCtrlTest.app, reqNoAuth).get
     assert(status(response) == OK)
 
+    transaction { (em, tx) =>
+      em.createQuery("DELETE FROM OutboxMail m").executeUpdate()
+    }
+
     val postR = FakeRequest(POST, "/forgotpassword")
       .withFormUrlEncodedBody("email" -> "alice@foo.com")
 
     response = route(AccountsCtrlTest.app, postR).get
     assert(status(response) == SEE_OTHER || status(response) == OK)
 
+    // the new password is set when the mail is sent
+    val sender = new MailSender()(AccountsCtrlTest.app)
+    assert(sender.poll(new Executor {
+      override def execute(command: Runnable): Unit = command.run()
+    }) == 1)
+
     try {
       val new_cookie = getCookie(assets.alice, "testtest")
       fail("Password was not reset properly")
@@ -165,7 +179,7 @@ object AccountsCtrlTest {
 
   @BeforeClass
   def beforeClass() = {
-    app = new FakeApplication()
+    app = new FakeApplication(additionalConfiguration = Map("mail.outbox.worker" -> false))
     Play.start(app)
   }
 
@@ -1,14 +1,21 @@
 package controller
 
+import java.io.ByteArrayInputStream
+import java.util.zip.ZipInputStream
+
 import org.junit._
 import play.api.Play
 import play.api.libs.json._
 import play.api.mvc.Cookie
 import play.api.test.Helpers._
 import play.api.test._
+import service.{ConferenceService, ExportService}
 import utils.DefaultRoutesResolver._
 import utils.serializer.{AccountFormat, ConferenceFormat}
 
+import scala.concurrent.Await
+import scala.concurrent.duration._
+
 
 /**
  * Test
@@ -84,6 +91,26 @@ class ConferenceCtrlTest extends BaseCtrlTest {
 
   }
 
+  @Test
+  def testOfflineResources(): Unit = {
+    val result = route(ConferenceCtrlTest.app, FakeRequest(GET, "/cache/resources")).get
+    assert(status(result) == OK)
+
+    val resources = contentAsJson(result).as[List[String]]
+    assert(assets.conferences.exists(c => resources.contains(s"/conference/${c.short}")))
+
+    val etag = header(ETAG, result)
+    assert(etag.isDefined)
+
+    val cached = FakeRequest(GET, "/cache/resources").withHeaders("If-None-Match" -> etag.get)
+    assert(status(route(ConferenceCtrlTest.app, cached).get) == NOT_MODIFIED)
+
+    val manifest = route(ConferenceCtrlTest.app, FakeRequest(GET, "/cache/mobcache.appcache")).get
+    assert(status(manifest) == OK)
+    assert(contentAsString(manifest).startsWith("CACHE MANIFEST"))
+    resources.foreach(r => assert(contentAsString(manifest).contains(r)))
+  }
+
   @Test
   def testListWithGroup(): Unit = {
     val request = FakeRequest(GET, "/api/conferences?group=BCCN")
@@ -234,6 +261,29 @@ class ConferenceCtrlTest extends BaseCtrlTest {
       .values.head.asInstanceOf[JsString].value.equals("Geo entry not found."))
   }
 
+  @Test
+  def testGetGeoCompressed(): Unit = {
+    val conference = assets.conferences(0)
+    val req = FakeRequest(GET, s"/api/conferences/${conference.uuid}/geo")
+      .withHeaders(ACCEPT_ENCODING -> "gzip, deflate")
+
+    val response = route(ConferenceCtrlTest.app, req).get
+    assert(status(response) == OK)
+    assert(header(CONTENT_ENCODING, response) == Some("gzip"))
+    assert(header(VARY, response) == Some(ACCEPT_ENCODING))
+
+    val in = new java.util.zip.GZIPInputStream(new java.io.ByteArrayInputStream(contentAsBytes(response)))
+    assert(Json.parse(scala.io.Source.fromInputStream(in, "UTF-8").mkString) == Json.parse(conference.geo))
+
+    val eTag = header(ETAG, response).get
+    val reqETag = FakeRequest(GET, s"/api/conferences/${conference.uuid}/geo").withHeaders(IF_NONE_MATCH -> eTag)
+    assert(status(route(ConferenceCtrlTest.app, reqETag).get) == NOT_MODIFIED)
+
+    val reqIdentity = FakeRequest(GET, s"/api/conferences/${conference.uuid}/geo")
+      .withHeaders(ACCEPT_ENCODING -> "gzip;q=0, identity")
+    assert(header(CONTENT_ENCODING, route(ConferenceCtrlTest.app, reqIdentity).get).isEmpty)
+  }
+
   @Test
   def testSetGeo(): Unit = {
     val uuid = assets.conferences(2).uuid
@@ -321,7 +371,7 @@ class ConferenceCtrlTest extends BaseCtrlTest {
     val mainUrl = "api/conferences"
     val urlCap = "schedule"
 
-    val validJson = Json.toJson("""{"entryOne": 1, "entryTwo": 2}""")
+    val validJson = Json.parse("""[{"title": "Event", "start": "10:00", "end": "11:00", "date": "2014-09-02"}]""")
 
     val reqNoUser = FakeRequest(PUT, s"/$mainUrl/$uuid/$urlCap").withJsonBody(validJson)
     val responseNoUser = route(ConferenceCtrlTest.app, reqNoUser).get
@@ -345,6 +395,13 @@ class ConferenceCtrlTest extends BaseCtrlTest {
 
     assert(contentAsJson(getValidResponse).equals(validJson))
 
+    val invalidSchedule = Json.parse("""[{"title": "Event", "start": "11:00", "end": "10:00", "date": "2014-09-02"}]""")
+    val reqInvalidSchedule = FakeRequest(PUT, s"/$mainUrl/$uuid/$urlCap").withCookies(adminCookie)
+      .withJsonBody(invalidSchedule)
+    val responseInvalidSchedule = routeWithErrors(ConferenceCtrlTest.app, reqInvalidSchedule).get
+
+    assert(status(responseInvalidSchedule) == BAD_REQUEST)
+
     val invalidJson = """entryOne: 1, "entryTwo": 2}"""
     val reqInvalid = FakeRequest(PUT, s"/$mainUrl/$uuid/$urlCap").withCookies(adminCookie).withBody(invalidJson)
     val responseInvalid = route(ConferenceCtrlTest.app, reqInvalid).get
@@ -363,6 +420,28 @@ class ConferenceCtrlTest extends BaseCtrlTest {
     assert(status(responseEmpty) == BAD_REQUEST)
   }
 
+  @Test
+  def testGetScheduleWindow(): Unit = {
+    val uuid = assets.conferences(0).uuid
+
+    def titles(query: String) : Seq[String] = {
+      val response = route(ConferenceCtrlTest.app, FakeRequest(GET, s"/api/conferences/$uuid/schedule?$query")).get
+      assert(status(response) == OK)
+      contentAsJson(response).as[Seq[JsObject]].map(entry => (entry \ "title").as[String])
+    }
+
+    assert(titles("from=2014-09-02&to=2014-09-02") == Seq("Workshops"))
+    assert(titles("from=2014-09-03") == Seq("Workshops", "Opening", "Dinner"))
+    assert(titles("from=2014-09-03T12:30&to=2014-09-03T14:00") == Seq("Opening"))
+
+    val req = FakeRequest(GET, s"/api/conferences/$uuid/schedule?track=track%20b")
+    val session = contentAsJson(route(ConferenceCtrlTest.app, req).get).as[Seq[JsObject]].head
+    assert((session \ "tracks").as[Seq[JsObject]].map(t => (t \ "title").as[String]) == Seq("Track B"))
+
+    val reqInvalid = FakeRequest(GET, s"/api/conferences/$uuid/schedule?from=yesterday")
+    assert(status(routeWithErrors(ConferenceCtrlTest.app, reqInvalid).get) == BAD_REQUEST)
+  }
+
   @Test
   def testGetInfo(): Unit = {
     val existing = assets.conferences(0)
@@ -427,6 +506,43 @@ class ConferenceCtrlTest extends BaseCtrlTest {
     assert(contentAsString(getValidResponse).equals(infoContent))
   }
 
+  @Test
+  def testExport(): Unit = {
+    val conference = ConferenceService().get(assets.conferences(0).uuid)
+    val url = s"/api/conferences/${conference.uuid}/export"
+
+    val forbidden = routeWithErrors(ConferenceCtrlTest.app,
+      FakeRequest(GET, url).withCookies(getCookie(assets.bob, "testtest"))).get
+    assert(status(forbidden) == FORBIDDEN)
+
+    val accepted = route(ConferenceCtrlTest.app, FakeRequest(GET, url).withCookies(cookie)).get
+    if (status(accepted) == ACCEPTED) {
+      assert(header(RETRY_AFTER, accepted).isDefined)
+      Await.result(ExportService().build(conference), 30.seconds)
+    }
+
+    val response = route(ConferenceCtrlTest.app, FakeRequest(GET, url).withCookies(cookie)).get
+    assert(status(response) == OK)
+    assert(contentType(response) == Some("application/zip"))
+    assert(header(CONTENT_DISPOSITION, response).exists(_.contains(conference.short + ".zip")))
+    assert(header(CACHE_CONTROL, response) == Some("private, no-cache"))
+
+    val bytes = contentAsBytes(response)
+    val zip = new ZipInputStream(new ByteArrayInputStream(bytes))
+    val entries = Iterator.continually(zip.getNextEntry).takeWhile(_ != null).map { entry =>
+      entry.getName -> Stream.continually(zip.read()).takeWhile(_ != -1).map(_.toByte).toArray
+    }.toMap
+
+    assert((Json.parse(entries("conference.json")) \ "uuid") == JsString(conference.uuid))
+    val abstracts = Json.parse(entries("abstracts.json")).as[List[JsObject]]
+    assert(abstracts.size == assets.abstracts.count(_.conference.uuid == conference.uuid))
+
+    val ranged = route(ConferenceCtrlTest.app,
+      FakeRequest(GET, url).withCookies(cookie).withHeaders(RANGE -> "bytes=10-")).get
+    assert(status(ranged) == PARTIAL_CONTENT)
+    assert(contentAsBytes(ranged).toSeq == bytes.drop(10).toSeq)
+  }
+
 }
 
 
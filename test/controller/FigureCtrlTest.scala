@@ -131,6 +131,54 @@ class FigureCtrlTest extends BaseCtrlTest {
     // TODO here make some file assert
   }
 
+  @Test
+  def testDownloadConditional(): Unit = {
+    val uuid = assets.figures(0).uuid
+    FileUtils.writeStringToFile(new File("./figures", uuid), "0123456789abcdef")
+
+    val result = route(FigureCtrlTest.app, FakeRequest(GET, s"/api/figures/$uuid/image")).get
+    assert(status(result) == OK)
+    val etag = header(ETAG, result).get
+    assert(header(LAST_MODIFIED, result).isDefined)
+
+    val cached = FakeRequest(GET, s"/api/figures/$uuid/image").withHeaders(IF_NONE_MATCH -> etag)
+    assert(status(route(FigureCtrlTest.app, cached).get) == NOT_MODIFIED)
+
+    val since = FakeRequest(GET, s"/api/figures/$uuid/image")
+      .withHeaders(IF_MODIFIED_SINCE -> header(LAST_MODIFIED, result).get)
+    assert(status(route(FigureCtrlTest.app, since).get) == NOT_MODIFIED)
+
+    val ranged = route(FigureCtrlTest.app,
+      FakeRequest(GET, s"/api/figures/$uuid/image").withHeaders(RANGE -> "bytes=2-5")).get
+    assert(status(ranged) == PARTIAL_CONTENT)
+    assert(header(CONTENT_RANGE, ranged) == Some("bytes 2-5/16"))
+    assert(contentAsString(ranged) == "2345")
+
+    val suffix = route(FigureCtrlTest.app,
+      FakeRequest(GET, s"/api/figures/$uuid/image").withHeaders(RANGE -> "bytes=-4")).get
+    assert(contentAsString(suffix) == "cdef")
+
+    val outside = route(FigureCtrlTest.app,
+      FakeRequest(GET, s"/api/figures/$uuid/image").withHeaders(RANGE -> "bytes=100-")).get
+    assert(status(outside) == REQUESTED_RANGE_NOT_SATISFIABLE)
+
+    // unsupported ranges are ignored and the whole file is sent
+    val multiple = route(FigureCtrlTest.app,
+      FakeRequest(GET, s"/api/figures/$uuid/image").withHeaders(RANGE -> "bytes=0-1,4-5")).get
+    assert(status(multiple) == OK)
+    assert(contentAsString(multiple) == "0123456789abcdef")
+  }
+
+  @Test
+  def testDownloadWidth(): Unit = {
+    val uuid = assets.figures(0).uuid
+    val request = FakeRequest(GET, s"/api/figures/$uuid/image?w=480").withHeaders(ACCEPT -> "image/webp,image/*")
+    val result = route(FigureCtrlTest.app, request).get
+
+    assert(status(result) == OK)
+    assert(header(VARY, result) == Some(ACCEPT))
+  }
+
   @Test
   def testDownloadMobile(): Unit = {
     val uuid = assets.figures(0).uuid
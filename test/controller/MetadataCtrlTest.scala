@@ -0,0 +1,47 @@
+package controller
+
+import models.{Abstract, Conference, Model}
+import org.junit._
+import play.api.Play
+import play.api.test.Helpers._
+import play.api.test._
+
+/**
+ * Test for the metadata controller
+ */
+class MetadataCtrlTest extends BaseCtrlTest {
+
+  @Test
+  def testLimits(): Unit = {
+    val result = route(MetadataCtrlTest.app, FakeRequest(GET, "/api/metadata/limits")).get
+    assert(status(result) == OK)
+
+    val json = contentAsJson(result)
+    assert((json \ "Abstract" \ "acknowledgements").as[Int] == Model.getLimit[Abstract]("acknowledgements"))
+    assert((json \ "Conference" \ "name").as[Int] == Model.getLimit[Conference]("name"))
+
+    val etag = header(ETAG, result)
+    assert(etag.isDefined)
+
+    val cached = FakeRequest(GET, "/api/metadata/limits").withHeaders("If-None-Match" -> etag.get)
+    assert(status(route(MetadataCtrlTest.app, cached).get) == NOT_MODIFIED)
+  }
+
+}
+
+object MetadataCtrlTest {
+
+  var app: FakeApplication = null
+
+  @BeforeClass
+  def beforeClass() = {
+    app = new FakeApplication()
+    Play.start(app)
+  }
+
+  @AfterClass
+  def afterClass() = {
+    Play.stop()
+  }
+
+}
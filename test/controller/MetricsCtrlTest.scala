@@ -0,0 +1,73 @@
+package controller
+
+import org.junit._
+import play.api.Play
+import play.api.libs.json.JsObject
+import play.api.test.Helpers._
+import play.api.test._
+
+/**
+ * Test for the metrics controller
+ */
+class MetricsCtrlTest extends BaseCtrlTest {
+
+  @Test
+  def testGet(): Unit = {
+    val req = FakeRequest(GET, "/api/metrics")
+
+    val noAuth = route(MetricsCtrlTest.app, req).get
+    assert(status(noAuth) == UNAUTHORIZED)
+
+    val forbidden = routeWithErrors(MetricsCtrlTest.app,
+      req.withCookies(getCookie(assets.eve, "testtest"))).get
+    assert(status(forbidden) == FORBIDDEN)
+
+    val result = route(MetricsCtrlTest.app, req.withCookies(getCookie(assets.alice, "testtest"))).get
+    assert(status(result) == OK)
+
+    // all entity managers of previous requests must have been closed
+    val ems = (contentAsJson(result) \ "entityManagers").as[JsObject]
+    assert((ems \ "open").as[Int] <= 1)
+    assert((ems \ "created").as[Long] > 0)
+  }
+
+  @Test
+  def testQueries(): Unit = {
+    val conference = FakeRequest(GET, s"/api/conferences/${assets.conferences(0).uuid}")
+    val timed = route(MetricsCtrlTest.app, conference).get
+    assert(status(timed) == OK)
+    assert(header("Server-Timing", timed).exists(_.contains("statements")))
+
+    val req = FakeRequest(GET, "/api/metrics").withCookies(getCookie(assets.alice, "testtest"))
+    val result = route(MetricsCtrlTest.app, req).get
+    assert(status(result) == OK)
+
+    val queries = (contentAsJson(result) \ "queries").as[JsObject]
+    assert(queries.keys.contains("request"))
+    assert(queries.keys.contains("ConferenceService.get"))
+    assert((queries \ "ConferenceService.get" \ "count").as[Long] > 0)
+
+    // API requests run on the jdbc executor, its queue is reported
+    val executors = (contentAsJson(result) \ "executors").as[JsObject]
+    assert(executors.keys.contains("jdbc"))
+    assert((executors \ "jdbc" \ "queueSize").as[Int] > 0)
+  }
+
+}
+
+object MetricsCtrlTest {
+
+  var app: FakeApplication = null
+
+  @BeforeClass
+  def beforeClass() = {
+    app = new FakeApplication()
+    Play.start(app)
+  }
+
+  @AfterClass
+  def afterClass() = {
+    Play.stop()
+  }
+
+}
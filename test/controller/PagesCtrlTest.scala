@@ -0,0 +1,70 @@
+package controller
+
+import org.junit._
+import play.api.Play
+import play.api.test.Helpers._
+import play.api.test._
+
+/**
+ * Test for the pre-rendered public abstract pages
+ */
+class PagesCtrlTest extends BaseCtrlTest {
+
+  @Test
+  def testViewAbstract(): Unit = {
+    val abstr = assets.abstracts(0)
+
+    val result = route(PagesCtrlTest.app, FakeRequest(GET, s"/abstracts/${abstr.uuid}")).get
+    assert(status(result) == OK)
+    assert(contentAsString(result).contains(abstr.title))
+    assert(header(CACHE_CONTROL, result).exists(_.startsWith("public")))
+    assert(header(VARY, result) == Some("Cookie"))
+
+    val etag = header(ETAG, result)
+    assert(etag.isDefined)
+
+    val cached = FakeRequest(GET, s"/abstracts/${abstr.uuid}").withHeaders("If-None-Match" -> etag.get)
+    assert(status(route(PagesCtrlTest.app, cached).get) == NOT_MODIFIED)
+
+    val unpublished = FakeRequest(GET, s"/abstracts/${assets.abstracts(1).uuid}")
+    assert(status(routeWithErrors(PagesCtrlTest.app, unpublished).get) == NOT_FOUND)
+  }
+
+  @Test
+  def testAbstractList(): Unit = {
+    val conference = assets.conferences(0)
+
+    val result = route(PagesCtrlTest.app, FakeRequest(GET, s"/conference/${conference.short}/abstracts")).get
+    assert(status(result) == OK)
+    assert(contentAsString(result).contains(assets.abstracts(0).title))
+    assert(!contentAsString(result).contains(assets.abstracts(1).title))
+
+    val etag = header(ETAG, result)
+    assert(etag.isDefined)
+
+    val cached = FakeRequest(GET, s"/conference/${conference.short}/abstracts").withHeaders("If-None-Match" -> etag.get)
+    assert(status(route(PagesCtrlTest.app, cached).get) == NOT_MODIFIED)
+
+    val cookie = getCookie(assets.alice, "testtest")
+    val user = FakeRequest(GET, s"/conference/${conference.short}/abstracts").withCookies(cookie)
+    assert(header(ETAG, route(PagesCtrlTest.app, user).get).isEmpty)
+  }
+
+}
+
+object PagesCtrlTest {
+
+  var app: FakeApplication = null
+
+  @BeforeClass
+  def beforeClass() = {
+    app = new FakeApplication(additionalConfiguration = Map("pages.prerender" -> true))
+    Play.start(app)
+  }
+
+  @AfterClass
+  def afterClass() = {
+    Play.stop()
+  }
+
+}
@@ -0,0 +1,33 @@
+package models
+
+import org.junit._
+import org.scalatest.junit.JUnitSuite
+
+/**
+ * Test
+ */
+class ModelMetadataTest extends JUnitSuite {
+
+  @Test
+  def testGetLimit() : Unit = {
+    assert(Model.getLimit[Abstract]("text") == 250000)
+    assert(Model.getLimit[Abstract]("acknowledgements") == 300)
+    assert(Model.getLimit[Abstract]("title") == ModelMetadata.DEFAULT_LENGTH)
+    assert(Model.getLimit[ConfText]("text") == 512)
+    assert(Model.getLimit[Conference]("doesNotExist") == ModelMetadata.DEFAULT_LENGTH)
+
+    // inherited fields
+    assert(ModelMetadata.limits("Figure").contains("uuid"))
+  }
+
+  @Test
+  def testEntities() : Unit = {
+    val entities = ModelMetadata.entities.toSet
+    assert(entities.contains(classOf[Abstract]))
+    assert(entities.contains(classOf[OutboxMail]))
+    assert(!entities.contains(classOf[Model]))
+    assert(ModelMetadata.limits.keySet.contains("CredentialsLogin"))
+    assert(ModelMetadata.limits("OutboxMail")("bodyText") == 100000)
+  }
+
+}
@@ -15,7 +15,16 @@ import org.junit._
 import org.scalatest.junit.JUnitSuite
 import play.api.Play
 import play.api.test.FakeApplication
-import models.{AbstractState, Account}
+import models.{AbstractDocument, AbstractState, Account, Conference}
+import org.apache.commons.codec.digest.DigestUtils
+import org.joda.time.{DateTime, DateTimeZone}
+import play.api.libs.json.Json
+import plugins.DBUtil._
+
+import scala.collection.JavaConversions._
+import scala.concurrent.ExecutionContext.Implicits.global
+import scala.concurrent.duration._
+import scala.concurrent.{Await, Future}
 
 /**
  * Test for the abstracts service layer
@@ -38,6 +47,13 @@ class AbstractServiceTest extends JUnitSuite {
     var abstracts = srv.list(assets.conferences(0))
     assert(abstracts.size == assets.abstracts.count{ _.state == AbstractState.Accepted })
 
+    // serialized relations are loaded before the entity manager is closed
+    val util = query { em => em.getEntityManagerFactory.getPersistenceUnitUtil }
+    assert(abstracts.forall { abstr =>
+      Seq("figures", "authors", "affiliations", "references", "abstrTypes").forall(util.isLoaded(abstr, _)) &&
+        abstr.authors.forall(util.isLoaded(_, "affiliations"))
+    })
+
     abstracts = srv.list(assets.conferences(1))
     assert(abstracts.size == 0)
   }
@@ -51,6 +67,59 @@ class AbstractServiceTest extends JUnitSuite {
     assert(abstracts.size == 0)
   }
 
+  @Test
+  def testListAllPage() : Unit = {
+    val conference = assets.conferences(0)
+    val all = srv.listAll(conference)
+
+    var page = srv.listAllPage(conference, None, 1, Set("title", "authors"))
+    var uuids = page.abstracts.map(_.uuid)
+    while (page.next.isDefined) {
+      page = srv.listAllPage(conference, page.next, 1, Set("title", "authors"))
+      assert(page.abstracts.size == 1)
+      uuids ++= page.abstracts.map(_.uuid)
+    }
+
+    assert(uuids.size == all.size)
+    assert(uuids.toSet == all.map(_.uuid).toSet)
+
+    val first = srv.listAllPage(conference, None, all.size, Set("title", "authors")).abstracts
+    first.foreach { abstr =>
+      val original = all.find(_.uuid == abstr.uuid).get
+      assert(abstr.title == original.title)
+      assert(abstr.text == null)
+      assert(abstr.authors.size == original.authors.size)
+      assert(abstr.references.isEmpty)
+    }
+
+    intercept[IllegalArgumentException] {
+      srv.listAllPage(conference, None, 0, Set("title"))
+    }
+
+    intercept[IllegalArgumentException] {
+      srv.listAllPage(conference, None, 10, Set("nonexistent"))
+    }
+  }
+
+  @Test
+  def testSearch() : Unit = {
+    val conference = assets.conferences(0)
+
+    val hits = srv.search(conference, "Munich")
+    assert(hits.map(_.doc.uuid) == Seq(assets.abstracts(0).uuid))
+
+    // prefix match of the last term
+    assert(srv.search(conference, "title of abs").nonEmpty)
+    assert(srv.search(conference, "").isEmpty)
+
+    // abstracts that are not accepted are not found
+    assert(srv.search(conference, "Seatlle").isEmpty)
+
+    // the index is updated when an abstract changes
+    srv.setState(assets.abstracts(1), AbstractState.Accepted, assets.alice, None)
+    assert(srv.search(conference, "Seatlle").map(_.doc.uuid) == Seq(assets.abstracts(1).uuid))
+  }
+
   @Test
   def testListOwn() : Unit = {
     var abstracts = srv.listOwn(assets.alice)
@@ -63,6 +132,29 @@ class AbstractServiceTest extends JUnitSuite {
     assert(abstracts.size == 0)
   }
 
+  @Test
+  def testListOwnETags() : Unit = {
+    val eTags = srv.listOwnETags(assets.alice)
+    assert(eTags.sorted == srv.listOwn(assets.alice).map(_.eTag).sorted)
+  }
+
+  @Test
+  def testListDashboard() : Unit = {
+    val entries = srv.listDashboard(assets.alice)
+    assert(entries.flatMap(_._2).size == assets.abstracts.size)
+    assert(entries.map(_._1.uuid).distinct.size == entries.size)
+
+    entries.foreach { case (conf, abstracts) =>
+      assert(abstracts.forall(_.conference.uuid == conf.uuid))
+      assert(abstracts.forall(a => a.title != null && a.state != null))
+    }
+
+    val titles = srv.listOwn(assets.alice).map(a => a.uuid -> a.title).toMap
+    assert(entries.flatMap(_._2).forall(a => titles(a.uuid) == a.title))
+
+    assert(srv.listDashboard(assets.eve).isEmpty)
+  }
+
   @Test
   def testListFavourite() : Unit = {
     var abstracts = srv.listFavourite(assets.alice)
@@ -91,6 +183,77 @@ class AbstractServiceTest extends JUnitSuite {
     }
   }
 
+  @Test
+  def testDocuments() : Unit = {
+    val conference = assets.conferences(0)
+    val abstr = srv.get(assets.abstracts(0).uuid)
+
+    val documents = srv.listDocuments(conference)
+    assert(documents.map(_.uuid) == srv.list(conference).map(_.uuid))
+
+    var page = srv.listDocumentPage(conference, None, 1)
+    var uuids = page.documents.map(_.uuid)
+    while (page.next.isDefined) {
+      page = srv.listDocumentPage(conference, page.next, 1)
+      assert(page.documents.size == 1)
+      uuids ++= page.documents.map(_.uuid)
+    }
+    assert(uuids.sorted == documents.map(_.uuid).sorted)
+
+    val document = srv.getDocument(abstr.uuid)
+    assert(document.eTag == DigestUtils.md5Hex(document.json))
+    assert((Json.parse(document.json) \ "uuid").as[String] == abstr.uuid)
+
+    intercept[NoResultException] {
+      srv.getDocument(assets.abstracts(1).uuid)
+    }
+
+    srv.patch(abstr, List(PatchAddSortId(42)), assets.alice)
+    assert((Json.parse(srv.getDocument(abstr.uuid).json) \ "sortId").as[Int] == 42)
+
+    srv.setState(srv.get(abstr.uuid), AbstractState.Withdrawn, assets.alice, None)
+    intercept[NoResultException] {
+      srv.getDocument(abstr.uuid)
+    }
+    assert(!srv.listDocuments(conference).exists(_.uuid == abstr.uuid))
+  }
+
+  @Test
+  def testDocumentETag() : Unit = {
+    val abstr = assets.abstracts(0)
+    val document = srv.getDocument(abstr.uuid)
+
+    // a stale document, e.g. written before the conference changed
+    transaction { (em, tx) =>
+      val stale = em.find(classOf[AbstractDocument], abstr.uuid)
+      stale.json = "{}"
+      stale.hash = DigestUtils.md5Hex(stale.json)
+    }
+
+    // refreshing it changes the ETag, but not the modification time
+    AbstractService.refreshConferenceDocuments(abstr.conference.uuid)
+    val refreshed = srv.getDocument(abstr.uuid)
+    assert(refreshed.mtime == document.mtime)
+    assert(refreshed.eTag == document.eTag)
+    assert(refreshed.eTag != DigestUtils.md5Hex("{}"))
+  }
+
+  @Test
+  def testRefreshDocumentsConcurrently() : Unit = {
+    val conference = assets.conferences(0)
+    val ids = srv.listDocuments(conference).map(_.uuid)
+
+    transaction { (em, tx) =>
+      em.createQuery("DELETE FROM AbstractDocument d").executeUpdate()
+    }
+
+    // concurrent refreshes insert the same documents, none of them fails
+    val refreshes = (1 to 8).map(_ => Future(AbstractService.refreshDocuments(ids)))
+    Await.result(Future.sequence(refreshes), 30.seconds)
+
+    assert(srv.listDocumentPage(conference, None, AbstractService.maxPageSize).documents.map(_.uuid).toSet == ids.toSet)
+  }
+
   @Test
   def testGetOwn() : Unit = {
     srv.getOwn(assets.abstracts(0).uuid, assets.alice)
@@ -197,8 +360,9 @@ class AbstractServiceTest extends JUnitSuite {
   @Test
   def testAddFavUSer() : Unit = {
     val abstr = assets.abstracts(0)
-    srv.addFavUser(abstr, assets.alice)
-    assert(abstr.favUsers.contains(assets.alice))
+    val added = srv.addFavUser(abstr, assets.alice)
+    assert(added.favUsers.contains(assets.alice))
+    assert(added.favCount == added.favUsers.size)
 
     val illegal = assets.createAbstract()
     illegal.uuid = "wrongid"
@@ -215,8 +379,9 @@ class AbstractServiceTest extends JUnitSuite {
   def testRemoveFavUSer() : Unit = {
     val abstr = assets.abstracts(0)
     srv.addFavUser(abstr, assets.alice)
-    srv.removeFavUser(abstr, assets.alice)
-    assert(!abstr.favUsers.contains(assets.alice))
+    val removed = srv.removeFavUser(abstr, assets.alice)
+    assert(!removed.favUsers.contains(assets.alice))
+    assert(removed.favCount == removed.favUsers.size)
 
     val illegal = assets.createAbstract()
     illegal.uuid = "wrongid"
@@ -229,6 +394,43 @@ class AbstractServiceTest extends JUnitSuite {
     }
   }
 
+  @Test
+  def testSetFavourite() : Unit = {
+    val abstr = assets.abstracts(0)
+    val before = srv.get(abstr.uuid).favCount
+    assert(before == 1)
+
+    assert(srv.setFavourite(abstr.uuid, assets.alice, favourite = true) == before + 1)
+    // adding twice does not change the count
+    assert(srv.setFavourite(abstr.uuid, assets.alice, favourite = true) == before + 1)
+    assert(srv.getFavouriteUsers(abstr, assets.alice).contains(assets.alice))
+
+    assert(srv.setFavourite(abstr.uuid, assets.alice, favourite = false) == before)
+    assert(srv.setFavourite(abstr.uuid, assets.alice, favourite = false) == before)
+    assert(!srv.getFavouriteUsers(abstr, assets.alice).contains(assets.alice))
+
+    intercept[EntityNotFoundException] {
+      srv.setFavourite("wrongid", assets.alice, favourite = true)
+    }
+
+    intercept[EntityNotFoundException] {
+      srv.setFavourite(abstr.uuid, Account(Some("uuid"), Some("foo@bar.com")), favourite = true)
+    }
+  }
+
+  @Test
+  def testFavCounts() : Unit = {
+    val conference = assets.conferences(0)
+    val counts = srv.favCounts(conference)
+
+    val accepted = assets.abstracts.filter(_.state == AbstractState.Accepted)
+    assert(counts.keySet == accepted.map(_.uuid).toSet)
+    assert(counts.values.forall(_ == 1))
+
+    srv.setFavourite(accepted(0).uuid, assets.alice, favourite = true)
+    assert(srv.favCounts(conference)(accepted(0).uuid) == 2)
+  }
+
   @Test
   def testDelete() : Unit = {
     val original = assets.abstracts(0)
@@ -252,6 +454,47 @@ class AbstractServiceTest extends JUnitSuite {
     }
   }
 
+  @Test
+  def testListChanges() : Unit = {
+    val conference = assets.conferences(0)
+    val original = assets.abstracts(0)
+
+    val full = srv.listChanges(conference, None)
+    assert(full.conference.isDefined)
+    assert(full.abstracts.map(_.uuid) == srv.list(conference).map(_.uuid))
+    assert(full.removedAbstracts.isEmpty && full.removedFigures.isEmpty)
+
+    val since = new DateTime(DateTimeZone.UTC)
+    Thread.sleep(10)
+    srv.delete(original.uuid, assets.alice)
+
+    val changes = srv.listChanges(conference, Some(since))
+    assert(changes.cursor.isBefore(new DateTime(DateTimeZone.UTC)))
+    assert(!changes.abstracts.exists(_.uuid == original.uuid))
+    assert(changes.removedAbstracts.contains(original.uuid))
+    assert(changes.removedFigures.contains(assets.figures(0).uuid))
+
+    assert(srv.listChanges(assets.conferences(1), Some(since)).abstracts.isEmpty)
+  }
+
+  @Test
+  def testListChangesUnpublished() : Unit = {
+    val conference = assets.conferences(0)
+    val ids = srv.list(conference).map(_.uuid)
+    val since = new DateTime(DateTimeZone.UTC)
+
+    transaction { (em, tx) =>
+      em.find(classOf[Conference], conference.uuid).isPublished = false
+    }
+
+    // clients drop everything they got while the conference was published
+    val changes = srv.listChanges(conference, Some(since))
+    assert(changes.abstracts.isEmpty)
+    assert(ids.nonEmpty && ids.forall(changes.removedAbstracts.contains))
+
+    assert(srv.listChanges(conference, None).removedAbstracts.isEmpty)
+  }
+
   @Test
   def testPermissions() : Unit = {
     val abstr = assets.abstracts(0) // alice is the only owner
@@ -294,8 +537,8 @@ class AbstractServiceTest extends JUnitSuite {
     val abstr = assets.abstracts(0)
     val oldState = abstr.state
 
-    val stateLog = srv.setState(abstr, AbstractState.Accepted, assets.alice, Some("ServiceTest: Abstract accepted"))
-    assert(stateLog.head.state == AbstractState.Accepted)
+    val stateLog = srv.setState(abstr, AbstractState.InRevision, assets.alice, Some("ServiceTest: Abstract in revision"))
+    assert(stateLog.head.state == AbstractState.InRevision)
 
     val statesFromService = srv.listStates(abstr.uuid, assets.alice)
     assert(statesFromService.length == stateLog.length)
@@ -305,7 +548,18 @@ class AbstractServiceTest extends JUnitSuite {
       assert(a.uuid == b.uuid)
     }
 
+    // the transition is checked against the stored state
+    intercept[IllegalAccessException] {
+      srv.setState(abstr, AbstractState.Withdrawn, assets.alice, None)
+    }
+
+    // only conference owners and admins may use admin transitions
+    intercept[IllegalAccessException] {
+      srv.setState(abstr, AbstractState.InReview, assets.eve, None)
+    }
+
     //Set abstract back to old state
+    srv.setState(abstr, AbstractState.InReview, assets.alice, None)
     srv.setState(abstr, oldState, assets.alice, Some("ServiceTest: Abstract published again"))
 
   }
@@ -314,10 +568,83 @@ class AbstractServiceTest extends JUnitSuite {
   def testPatch() {
     val abstr = assets.abstracts(0)
     val updates = List(PatchAddSortId(1), PatchAddDOI("10.12751/nncn.test.0001"))
-    val newAbstr = srv.patch(abstr, updates)
+    val newAbstr = srv.patch(abstr, updates, assets.alice)
 
     assert(newAbstr.sortId == 1)
     assert(newAbstr.doi == "10.12751/nncn.test.0001")
+
+    intercept[IllegalAccessException] {
+      srv.patch(abstr, List(PatchAddSortId(2)), assets.eve)
+    }
+    assert(srv.get(abstr.uuid).sortId == 1)
+  }
+
+  @Test
+  def testSetStates() {
+    val conference = assets.conferences(0)
+    val changes = Seq(
+      StateChange(assets.abstracts(1).uuid, AbstractState.Accepted, Some("ServiceTest: bulk accept")),
+      StateChange(assets.abstracts(0).uuid, AbstractState.Submitted, None),
+      StateChange("NOTEXISTANT", AbstractState.Accepted, None)
+    )
+
+    val results = srv.setStates(conference.uuid, changes, assets.alice)
+    assert(results.map(_._1) == changes.map(_.abstr))
+
+    assert(results(0)._2.get.state == AbstractState.Accepted)
+    assert(results(1)._2.failed.get.isInstanceOf[IllegalAccessException])
+    assert(results(2)._2.failed.get.isInstanceOf[EntityNotFoundException])
+
+    val log = srv.listStates(assets.abstracts(1).uuid, assets.alice)
+    assert(log.head.state == AbstractState.Accepted)
+    assert(srv.get(assets.abstracts(0).uuid).state == AbstractState.Accepted)
+
+    intercept[EntityNotFoundException] {
+      srv.setStates("NOTEXISTANT", changes, assets.alice)
+    }
+  }
+
+  @Test
+  def testPatchAll() {
+    val conference = assets.conferences(0)
+    val patches = Seq(
+      assets.abstracts(0).uuid -> List(PatchAddSortId(7), PatchAddDOI("10.12751/nncn.test.0007")),
+      assets.abstracts(1).uuid -> List(PatchAddSortId(8))
+    )
+
+    val forbidden = srv.patchAll(conference.uuid, patches, assets.eve)
+    assert(forbidden.forall(_._2.failed.get.isInstanceOf[IllegalAccessException]))
+
+    val results = srv.patchAll(conference.uuid, patches, assets.alice)
+    assert(results.forall(_._2.isSuccess))
+
+    val patched = srv.get(assets.abstracts(0).uuid)
+    assert(patched.sortId == 7)
+    assert(patched.doi == "10.12751/nncn.test.0007")
+    assert(srv.getOwn(assets.abstracts(1).uuid, assets.alice).sortId == 8)
+  }
+
+  @Test
+  def testAbstractsVersion() {
+    val confSrv = ConferenceService()
+    val conference = assets.conferences(0)
+    val version = confSrv.get(conference.uuid).abstractsVersion
+
+    srv.create(assets.createAbstract(), conference, assets.alice)
+    assert(confSrv.get(conference.uuid).abstractsVersion == version + 1)
+
+    srv.patch(assets.abstracts(0), List(PatchAddSortId(2)), assets.alice)
+    assert(confSrv.get(conference.uuid).abstractsVersion == version + 2)
+
+    srv.delete(assets.abstracts(0).uuid, assets.alice)
+    assert(confSrv.get(conference.uuid).abstractsVersion == version + 3)
+
+    // updating the conference bumps the version, since the lists contain its groups;
+    // the stale copy that is merged must not reset it
+    val eTag = confSrv.get(conference.uuid).abstractsETag("all")
+    val updated = confSrv.update(conference, assets.alice)
+    assert(updated.abstractsVersion == version + 4)
+    assert(updated.abstractsETag("all") != eTag)
   }
 
 }
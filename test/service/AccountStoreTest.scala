@@ -120,6 +120,27 @@ class AccountStoreTest extends JUnitSuite {
     intercept[NoResultException](accountStore.update(accountNew))
   }
 
+  @Test
+  def testLoginCache(): Unit = {
+    val loginStore = new LoginStore()
+    val info = new LoginInfo("credentials", "Alice@foo.com")
+
+    val login = Await.result(loginStore.retrieve(info), Duration.Inf)
+    assert(login.exists(_.account.uuid == assets.alice.uuid))
+    assert(LoginStore.cache.get(LoginStore.key(info.providerKey)).isDefined)
+
+    val alice = assets.alice
+    alice.mail = "alice@bar.com"
+    accountStore.update(alice)
+
+    assert(LoginStore.cache.get(LoginStore.key(info.providerKey)).isEmpty)
+    assert(Await.result(loginStore.retrieve(info), Duration.Inf).isEmpty)
+    assert(Await.result(loginStore.retrieve(new LoginInfo("credentials", "alice@bar.com")), Duration.Inf).isDefined)
+
+    accountStore.delete(alice)
+    assert(Await.result(loginStore.retrieve(new LoginInfo("credentials", "alice@bar.com")), Duration.Inf).isEmpty)
+  }
+
   @Test
   def testDelete(): Unit = {
     accountStore.delete(assets.alice)
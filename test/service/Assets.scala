@@ -17,6 +17,7 @@ import play.Play
 import models.Model._
 import models._
 import plugins.DBUtil._
+import service.util.ConferenceCache
 
 import scala.collection.JavaConversions._
 import scala.{Option => ?}
@@ -236,6 +237,17 @@ class Assets() {
     Topic("topic three", None)
   ).addPosition()
 
+  val schedule =
+    """[{"title": "Workshops", "subtitle": null, "tracks": [
+      |  {"title": "Track A", "subtitle": null, "chair": [], "events": [
+      |    {"title": "Workshop A1", "start": "14:00", "end": "18:00", "date": "2014-09-02", "type": "workshop"},
+      |    {"title": "Workshop A2", "start": "09:00", "end": "12:00", "date": "2014-09-03", "type": "workshop"}]},
+      |  {"title": "Track B", "subtitle": null, "chair": [], "events": [
+      |    {"title": "Workshop B1", "start": "14:00", "end": "18:00", "date": "2014-09-02", "type": "workshop"}]}]},
+      |{"title": "Opening", "subtitle": null, "chair": [], "events": [
+      |  {"title": "Welcome", "start": "13:00", "end": "13:30", "date": "2014-09-03", "type": "talk"}]},
+      |{"title": "Dinner", "start": "19:00", "end": null, "date": "2014-09-03", "type": "social"}]""".stripMargin
+
   var conferences : Array[Conference] = Array(
     Conference(None, ?("Bernstein Conference 2014"), ?("BC14"), ?("BCCN"),
       ?("The C1 Conf, Somewhere, Sometime"), ?("http://www.nncn.de/en/bernstein-conference/2014"),
@@ -252,7 +264,7 @@ class Assets() {
       Seq(AbstractGroup(None, ?(1), ?("Talk"), ?("T")),
         AbstractGroup(None, ?(2), ?("Poster"), ?("P"))),Nil,Nil,Nil,
       ?("""[{"ExtendedData": "","name": "Central Lecture Hall (ZHG)","description": "Main Conference and Workshops","point": {"lat": 51.542262,"long": 9.935886},"type": 0,"zoomto": true, "floorplans" : ["https://www.uni-muenchen.de/studium/beratung/beratung_service/beratung_lmu/beratungsstelle-barrierefrei/bilderbaukasten/Barrierefreiheit/geschwister-scholl-platz-1-eg.jpg"]},{"ExtendedData": "","name": "Alte Mensa","description": "Public Lecture and Conference Dinner","point": {"lat": 51.533442,"long": 9.937631},"type": 0,"zoomto": true},{"ExtendedData": "","name": "Alte Mensa","description": "Conference Dinner","point": {"lat": 51.533442,"long": 9.937631},"type": 5,"zoomto": true},{"ExtendedData": "","name": "Göttingen Hbf","description": "main station","point": {"lat": 51.536548,"long": 9.926891},"type": 4,"zoomto": true}]"""),
-      ?("""{"schedule": "some schedule json"}"""), ?("# Some markdown text"),Some(5000),?(3)),
+      ?(schedule), ?("# Some markdown text"),Some(5000),?(3)),
     Conference(None, ?("The second conference"), ?("C2"), ?("BCCN"),
       ?("The C2 Conf, Somewhere, Sometime"), ?(""), ?(false), ?(true), ?(false), ?(true),
       ?(new DateTime(126283320000L)), ?(new DateTime(149870520000L)), ?(new DateTime(1321005600000L))
@@ -381,6 +393,15 @@ class Assets() {
         fig
       }
     }
+
+    // favourite counts are only written by AbstractService.setFavourite
+    transaction { (em, tx) =>
+      em.createNativeQuery(
+        """UPDATE abstract SET favcount =
+             (SELECT COUNT(*) FROM abstract_favusers f WHERE f.favabstracts_uuid = abstract.uuid)""")
+        .executeUpdate()
+      em.getEntityManagerFactory.getCache.evict(classOf[Abstract])
+    }
   }
 
   def killDB() : Unit = {
@@ -424,9 +445,14 @@ class Assets() {
       em.createQuery("DELETE FROM AbstractGroup").executeUpdate()
       em.createQuery("DELETE FROM Banner").executeUpdate()
       em.createQuery("DELETE FROM Conference").executeUpdate()
+      em.createQuery("DELETE FROM Tombstone").executeUpdate()
+      em.createQuery("DELETE FROM AbstractDocument").executeUpdate()
       em.createQuery("DELETE FROM CredentialsLogin").executeUpdate()
       em.createQuery("DELETE FROM Account").executeUpdate()      
     }
+
+    ConferenceCache.clear()
+    LoginStore.cache.clear()
   }
 
 }
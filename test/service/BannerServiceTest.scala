@@ -19,6 +19,9 @@ import play.api.Play
 import play.api.libs.Files.TemporaryFile
 import play.api.test.FakeApplication
 
+import scala.concurrent.Await
+import scala.concurrent.duration._
+
 
 class BannerServiceTest extends JUnitSuite {
 
@@ -76,7 +79,8 @@ class BannerServiceTest extends JUnitSuite {
       val logoOrig = Banner(None, Some("logo"))
       srv.create(logoOrig, tmpLogo, assets.conferences(0), assets.alice)
 
-      srv.uploadMobile(logoOrig, assets.conferences(0), assets.alice)
+      Await.result(srv.uploadMobile(logoOrig, assets.conferences(0), assets.alice), 30.seconds)
+      assert(new File("./banners_mobile", logoOrig.uuid).exists())
     }
   }
 
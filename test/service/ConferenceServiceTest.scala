@@ -16,6 +16,8 @@ import org.scalatest.junit.JUnitSuite
 import play.api.Play
 import play.api.test.FakeApplication
 import models._
+import plugins.DBUtil._
+import service.util.ScheduleIndex
 
 import scala.collection.JavaConversions._
 
@@ -39,6 +41,10 @@ class ConferenceServiceTest extends JUnitSuite {
   def testList() : Unit = {
     val list = srv.list()
     assert(list.size == 3)
+
+    // serialized relations are loaded before the entity manager is closed
+    val util = query { em => em.getEntityManagerFactory.getPersistenceUnitUtil }
+    assert(list.forall(c => Seq("groups", "topics", "confTexts", "banner").forall(util.isLoaded(c, _))))
   }
 
   @Test
@@ -67,6 +73,81 @@ class ConferenceServiceTest extends JUnitSuite {
     }
   }
 
+  @Test
+  def testListOfflineContent() : Unit = {
+    assert(srv.latestId == Some(srv.list().head.uuid))
+
+    val conference = assets.conferences(0)
+    val content = srv.listOfflineContent(conference.uuid)
+    assert(content.short == conference.short)
+    assert(content.banners.toSet == conference.banner.map(_.uuid).toSet)
+
+    // only accepted abstracts of published conferences are listed
+    val abstracts = assets.abstracts.filter { abstr =>
+      abstr.conference.uuid == conference.uuid && abstr.state == AbstractState.Accepted && conference.isPublished
+    }
+    assert(content.abstracts.map(_._1).toSet == abstracts.map(_.uuid).toSet)
+    assert(!content.abstracts.exists(_._1 == assets.abstracts(1).uuid))
+
+    assert(content.images.toSet == conference.confTexts.filter { t =>
+      t.ctType == "logo" || t.ctType == "thumbnail"
+    }.map(_.text).toSet)
+    abstracts.foreach { abstr =>
+      val figures = content.abstracts.find(_._1 == abstr.uuid).get._2
+      assert(figures.toSet == abstr.figures.map(_.uuid).toSet)
+    }
+
+    intercept[NoResultException] {
+      srv.listOfflineContent("uuid")
+    }
+  }
+
+  @Test
+  def testGetField() : Unit = {
+    val conference = assets.conferences(0)
+
+    val geo = srv.getField(conference.uuid, "geo").get
+    assert(new String(geo.body, "UTF-8") == conference.geo)
+    assert(srv.getField(conference.short, "geo").get.eTag == geo.eTag)
+    assert(srv.getField(assets.conferences(1).uuid, "geo").isEmpty)
+
+    srv.updateSpecificFields(srv.get(conference.uuid), assets.alice, geo = "{\"changed\": true}")
+    assert(srv.getField(conference.uuid, "geo").get.eTag != geo.eTag)
+
+    intercept[IllegalArgumentException] {
+      srv.getField(conference.uuid, "name")
+    }
+
+    intercept[NoResultException] {
+      srv.getField("uuid", "geo")
+    }
+  }
+
+  @Test
+  def testScheduleIndex() : Unit = {
+    val schedule = srv.getScheduleIndex(assets.conferences(0).uuid).get
+    assert(schedule.entries.size == 3)
+    assert(schedule.events.map(_.start) == schedule.events.map(_.start).sorted)
+
+    val day = ScheduleIndex.parseTime("2014-09-02")
+    val endOfDay = ScheduleIndex.parseTime("2014-09-02", endOfDay = true)
+    assert(endOfDay - day == 24 * 60 * 60 * 1000L)
+
+    val workshops = schedule.find(Some(day), Some(endOfDay), None)
+    assert(workshops.size == 2 && workshops.forall(_.entry == 0))
+    assert(schedule.find(None, None, Some("Track A")).map(_.event) == Seq(0, 1))
+
+    assert(srv.getScheduleIndex(assets.conferences(1).uuid).isEmpty)
+
+    intercept[IllegalArgumentException] {
+      ScheduleIndex("""[{"title": "No date"}]""", null)
+    }
+
+    intercept[IllegalArgumentException] {
+      srv.updateSpecificFields(srv.get(assets.conferences(0).uuid), assets.alice, schedule = """{"schedule": 1}""")
+    }
+  }
+
   @Test
   def testCreate() : Unit = {
     val c = srv.create(Conference(None, Some("fooconf"), Some("F1"), Some("G"), Some("F"),
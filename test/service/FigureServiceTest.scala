@@ -18,8 +18,13 @@ import play.api.Play
 import play.api.libs.Files.TemporaryFile
 import play.api.test.FakeApplication
 import models.Figure
+import service.util.ImageProcessor
+import utils.FileResults
 import org.apache.commons.io.FileUtils
 
+import scala.concurrent.Await
+import scala.concurrent.duration._
+
 
 class FigureServiceTest extends JUnitSuite {
 
@@ -56,6 +61,7 @@ class FigureServiceTest extends JUnitSuite {
 
     assert(fig.uuid != null)
     assert(fig.caption == "caption")
+    assert(fig.hash == FileResults.contentHash(srv.openFile(fig)))
   }
 
 
@@ -72,10 +78,61 @@ class FigureServiceTest extends JUnitSuite {
       val figOrig = Figure(None, Some("logo"))
       srv.create(figOrig, tmpFig, assets.abstracts(3), assets.alice)
 
-      srv.uploadMobile(figOrig, assets.abstracts(3), assets.alice)
+      Await.result(srv.uploadMobile(figOrig, assets.abstracts(3), assets.alice), 30.seconds)
+      assert(new File("./figures_mobile", figOrig.uuid).exists())
     }
   }
 
+  @Test
+  def testCreateDerivatives(): Unit = {
+    val pDir = new java.io.File(".").getCanonicalPath
+    val data = new File(pDir + "/test/utils/BC_header_jpg.jpg")
+
+    val fileFig = new File("tmp")
+    FileUtils.copyFile(data, fileFig)
+    val tmpFig = new TemporaryFile(fileFig)
+    val figOrig = Figure(None, Some("logo"))
+    val fig = srv.create(figOrig, tmpFig, assets.abstracts(3), assets.alice)
+
+    Await.result(srv.createDerivatives(fig), 30.seconds)
+
+    val jpeg = ImageProcessor.supportedFormats.filter(_.name == "jpeg")
+    val small = srv.openDerivative(fig, 100, jpeg)
+    assert(small.getName == ImageProcessor.derivativeWidths.head + ".jpg")
+
+    // no derivative is wider than the original, fall back to it
+    val large = srv.openDerivative(fig, 100000, jpeg)
+    assert(large == srv.openFile(fig))
+
+    // no acceptable format, fall back to the original
+    assert(srv.openDerivative(fig, 100, Nil) == srv.openFile(fig))
+
+    srv.delete(fig.uuid, assets.alice)
+    assert(!new File("./figures_derivatives", fig.uuid).exists())
+  }
+
+  @Test
+  def testCreateVersions(): Unit = {
+    val pDir = new java.io.File(".").getCanonicalPath
+    val data = new File(pDir + "/test/utils/BC_header_jpg.jpg")
+
+    val fileFig = new File("tmp")
+    FileUtils.copyFile(data, fileFig)
+    val tmpFig = new TemporaryFile(fileFig)
+    val fig = srv.create(Figure(None, Some("logo")), tmpFig, assets.abstracts(3), assets.alice)
+
+    Await.result(srv.createVersions(fig), 30.seconds)
+    assert(new File("./figures_mobile", fig.uuid).exists())
+    assert(ImageProcessor.hasDerivatives("./figures_derivatives", fig.uuid))
+
+    // figures without derivatives are processed again
+    ImageProcessor.deleteDerivatives("./figures_derivatives", fig.uuid)
+    val (count, done) = srv.createMissingVersions()
+    assert(count >= 1)
+    Await.result(done, 30.seconds)
+    assert(ImageProcessor.hasDerivatives("./figures_derivatives", fig.uuid))
+  }
+
   @Test
   def testUpdate(): Unit = {
     val fig = assets.figures(0)
@@ -0,0 +1,170 @@
+package service
+
+import java.util.concurrent.Executor
+import javax.persistence.EntityNotFoundException
+
+import models.OutboxMail
+import org.joda.time.{DateTimeZone, DateTime}
+import org.junit._
+import org.scalatest.junit.JUnitSuite
+import play.api.Play
+import play.api.test.FakeApplication
+import plugins.DBUtil._
+import plugins.MailSender
+import service.mail.{MailOutbox, MailerService}
+
+/**
+ * Test for the mail outbox and the mail sender
+ */
+class MailOutboxTest extends JUnitSuite {
+
+  var outbox: MailOutbox = _
+  var assets: Assets = _
+
+  val sameThread = new Executor {
+    override def execute(command: Runnable): Unit = command.run()
+  }
+
+  @Before
+  def before() : Unit = {
+    assets = new Assets()
+    assets.killDB()
+    assets.fillDB()
+
+    transaction { (em, tx) =>
+      em.createQuery("DELETE FROM OutboxMail m").executeUpdate()
+    }
+
+    outbox = MailOutbox()
+  }
+
+  @Test
+  def testEnqueueAndSend() : Unit = {
+    val mailer = new MailerService
+    mailer.sendConfirmation(assets.alice, "http://localhost/activate")
+
+    val due = outbox.listDue(10)
+    assert(due.size == 1)
+    assert(due.head.state == OutboxMail.PENDING)
+    assert(due.head.recipientList == Seq(assets.alice.mail))
+
+    // smtp.mock only logs the mail
+    val sender = new MailSender()(MailOutboxTest.app)
+    assert(sender.poll(sameThread) == 1)
+
+    val sent = outbox.get(due.head.uuid)
+    assert(sent.state == OutboxMail.SENT)
+    assert(sent.attempts == 1)
+    assert(sent.sentAt != null)
+    assert(sent.bodyText == null)
+
+    assert(outbox.listDue(10).isEmpty)
+    assert(sender.poll(sameThread) == 0)
+  }
+
+  @Test
+  def testPasswordReset() : Unit = {
+    val mailer = new MailerService
+    mailer.sendPasswordReset(assets.alice)
+
+    // the new password is not stored in the outbox
+    val due = outbox.listDue(10)
+    assert(due.size == 1)
+    assert(due.head.bodyText == null)
+    assert(due.head.reference == assets.alice.uuid)
+
+    def password = query { em =>
+      em.createQuery("SELECT l.password FROM CredentialsLogin l WHERE l.account.uuid = :uuid", classOf[String])
+        .setParameter("uuid", assets.alice.uuid)
+        .getSingleResult
+    }
+
+    val before = password
+    val sender = new MailSender()(MailOutboxTest.app)
+    assert(sender.poll(sameThread) == 1)
+
+    assert(password != before)
+    assert(outbox.get(due.head.uuid).state == OutboxMail.SENT)
+  }
+
+  @Test
+  def testClaim() : Unit = {
+    val mail = outbox.enqueue(OutboxMail("Subject", "from@example.org", Seq("to@example.org"), "Text"))
+    val due = outbox.listDue(10).head
+
+    val lease = new DateTime(DateTimeZone.UTC).plusMinutes(5)
+    assert(outbox.claim(due, lease))
+    // the same attempt can only be claimed once
+    assert(!outbox.claim(due, lease))
+    assert(outbox.listDue(10).isEmpty)
+    assert(outbox.get(mail.uuid).attempts == 1)
+  }
+
+  @Test
+  def testRetryAndDeadLetter() : Unit = {
+    val mail = outbox.enqueue(OutboxMail("Subject", "from@example.org", Seq("to@example.org"), "Text"))
+    val lease = new DateTime(DateTimeZone.UTC).plusMinutes(5)
+
+    (1 until outbox.maxAttempts).foreach { attempt =>
+      assert(outbox.claim(outbox.get(mail.uuid), lease))
+      val failed = outbox.markFailed(mail.uuid, "Connection refused").get
+
+      assert(failed.state == OutboxMail.PENDING)
+      assert(failed.attempts == attempt)
+      assert(failed.lastError == "Connection refused")
+      assert(failed.nextAttempt.isAfter(new DateTime(DateTimeZone.UTC).plus(outbox.delay(attempt) - 1000)))
+    }
+
+    assert(outbox.claim(outbox.get(mail.uuid), lease))
+    val dead = outbox.markFailed(mail.uuid, "Connection refused").get
+    assert(dead.state == OutboxMail.DEAD)
+    assert(dead.bodyText == null)
+
+    assert(outbox.countByState.get(OutboxMail.DEAD).contains(1L))
+  }
+
+  @Test
+  def testPurge() : Unit = {
+    val sent = outbox.enqueue(OutboxMail("Subject", "from@example.org", Seq("to@example.org"), "Text"))
+    val pending = outbox.enqueue(OutboxMail("Subject", "from@example.org", Seq("to@example.org"), "Text"))
+    outbox.markSent(sent.uuid)
+
+    assert(outbox.purge(new DateTime(DateTimeZone.UTC).minusDays(1)) == 0)
+    assert(outbox.purge(new DateTime(DateTimeZone.UTC).plusMinutes(1)) == 1)
+
+    // pending mails are kept regardless of their age
+    assert(outbox.get(pending.uuid).state == OutboxMail.PENDING)
+    intercept[EntityNotFoundException] {
+      outbox.get(sent.uuid)
+    }
+  }
+
+  @Test
+  def testDelay() : Unit = {
+    assert(outbox.delay(1) == outbox.backoff)
+    assert(outbox.delay(2) == 2 * outbox.backoff)
+    assert(outbox.delay(3) == 4 * outbox.backoff)
+    assert(outbox.delay(100) == outbox.maxBackoff)
+  }
+
+}
+
+object MailOutboxTest {
+
+  var app: FakeApplication = null
+
+  @BeforeClass
+  def beforeClass() = {
+    app = new FakeApplication(additionalConfiguration = Map(
+      "mail.outbox.worker" -> false,
+      "mail.outbox.maxAttempts" -> 3
+    ))
+    Play.start(app)
+  }
+
+  @AfterClass
+  def afterClass() = {
+    Play.stop()
+  }
+
+}
@@ -0,0 +1,113 @@
+package util
+
+import java.util.concurrent.{CountDownLatch, TimeUnit}
+
+import org.junit._
+import org.scalatest.junit.JUnitSuite
+import play.api.Play
+import play.api.mvc.Results.Ok
+import play.api.test.Helpers._
+import play.api.test.{FakeApplication, FakeRequest}
+import plugins.DBUtil._
+import plugins.QueryStats
+import utils.{BlockingIO, BoundedExecutor}
+
+import scala.concurrent.Await
+import scala.concurrent.duration._
+
+/**
+ * Test for running blocking work of actions on bounded executors
+ */
+class BlockingIOTest extends JUnitSuite {
+
+  implicit val request = FakeRequest(GET, "/api/conferences")
+
+  @Test
+  def testSubmit(): Unit = {
+    val executor = new BoundedExecutor("test-submit", 1, 1)
+
+    val result = BlockingIO.submit(executor) {
+      assert(Thread.currentThread.getName.startsWith("test-submit"))
+      Ok("done")
+    }
+
+    assert(contentAsString(result) == "done")
+  }
+
+  @Test
+  def testFailure(): Unit = {
+    val executor = new BoundedExecutor("test-failure", 1, 1)
+
+    val result = BlockingIO.submit(executor) {
+      throw new IllegalArgumentException("Invalid")
+    }
+
+    intercept[IllegalArgumentException] {
+      Await.result(result, 5.seconds)
+    }
+  }
+
+  @Test
+  def testQueryStats(): Unit = {
+    val executor = new BoundedExecutor("test-stats", 1, 1)
+    // drop the statistics of the other tests, which use the same request
+    QueryStats.takeRequest(request.id)
+
+    // queries outside of a request scope are not added to any request
+    query { em => em.createQuery("SELECT COUNT(c) FROM Conference c").getSingleResult }
+    assert(QueryStats.takeRequest().isEmpty)
+
+    val result = BlockingIO.submit(executor) {
+      query { em => em.createQuery("SELECT COUNT(c) FROM Conference c").getSingleResult }
+      Ok("done")
+    }
+    assert(contentAsString(result) == "done")
+
+    val stats = QueryStats.takeRequest(request.id)
+    assert(stats.exists(_.statements >= 1))
+    assert(QueryStats.takeRequest(request.id).isEmpty)
+  }
+
+  @Test
+  def testBackpressure(): Unit = {
+    val executor = new BoundedExecutor("test-backpressure", 1, 1)
+    val release = new CountDownLatch(1)
+    val started = new CountDownLatch(1)
+
+    // one running and one queued block fill the executor
+    val running = BlockingIO.submit(executor) {
+      started.countDown()
+      release.await(5, TimeUnit.SECONDS)
+      Ok("running")
+    }
+    started.await(5, TimeUnit.SECONDS)
+    val queued = BlockingIO.submit(executor)(Ok("queued"))
+
+    val rejected = BlockingIO.submit(executor)(Ok("rejected"))
+    assert(status(rejected) == SERVICE_UNAVAILABLE)
+    assert(header(RETRY_AFTER, rejected).isDefined)
+    assert(executor.statistics.rejected == 1)
+
+    release.countDown()
+    assert(contentAsString(running) == "running")
+    assert(contentAsString(queued) == "queued")
+  }
+
+}
+
+object BlockingIOTest {
+
+  var app: FakeApplication = null
+
+  @BeforeClass
+  def beforeClass() = {
+    app = new FakeApplication()
+    Play.start(app)
+  }
+
+  @AfterClass
+  def afterClass() = {
+    Play.stop()
+  }
+
+}